@@ -4,7 +4,7 @@ from .models import Order, OrderItem
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 1
-    readonly_fields = ['price']
+    readonly_fields = ['price', 'product_name', 'product_sku']
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -17,6 +17,6 @@ class OrderAdmin(admin.ModelAdmin):
   
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ['order', 'product', 'quantity', 'price']
+    list_display = ['order', 'product_name', 'product_sku', 'quantity', 'price']
     list_filter = ['order__tenant']
-    list_select_related = ['order', 'product']  
\ No newline at end of file
+    list_select_related = ['order']  
\ No newline at end of file
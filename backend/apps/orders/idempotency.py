@@ -0,0 +1,160 @@
+"""
+Idempotency-Key support for endpoints that must not run twice.
+
+A client that may retry (mobile checkout on a flaky network) sends an
+``Idempotency-Key`` header. The first request with a key claims it by
+inserting an IdempotencyKey row (unique per scope, user and key) before
+the view runs, then stores the view's response on the row. Afterwards,
+until the row expires:
+
+- a retry with the same key and the same request gets the stored
+  response back (marked ``Idempotent-Replayed: true``) without running
+  the view again;
+- a duplicate that arrives while the first request is still running
+  waits for it to finish, then gets its response, rather than racing it;
+- reusing the key for a different request is refused with 422.
+
+Keys are namespaced per user. Anonymous requests share no user, so a view
+open to them names what their keys belong to (e.g. the order being paid)
+with ``namespace``; without one, anonymous requests run un-keyed rather
+than in a namespace every shopper shares.
+
+Server errors (5xx, including a failed upstream call reported as 502) and
+requests that end in an exception (including DRF validation errors, which
+had no effect) release the key so the client can retry. Expired rows are
+replaced when their key is reused and purged by the
+purge_idempotency_keys command.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpRequest
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+def _find_request(args):
+    for arg in args:
+        if isinstance(arg, (Request, HttpRequest)):
+            return arg
+    raise TypeError('idempotent needs a view that receives the request')
+
+
+def fingerprint(request):
+    """Hash of what makes two requests 'the same': method, path and body"""
+    data = getattr(request, 'data', None)
+    if hasattr(data, 'lists'):
+        data = {key: values for key, values in data.lists()}
+    raw = json.dumps([request.method, request.path, data], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _owner(request, namespace):
+    """Whose keys the request's key lives among, or None to run un-keyed"""
+    if request.user.is_authenticated:
+        return str(request.user.pk)
+    value = namespace(request) if namespace is not None else None
+    if not value:
+        return None
+    return 'anon:' + hashlib.sha256(str(value).encode()).hexdigest()[:48]
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(scope, owner, key, digest):
+    """
+    Insert the key's row. Returns (True, row) if this request owns the key,
+    or (False, row) for the row some earlier request already holds.
+    """
+    while True:
+        try:
+            with transaction.atomic():
+                return True, IdempotencyKey.objects.create(
+                    scope=scope, owner=owner, key=key, fingerprint=digest,
+                    expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                )
+        except IntegrityError:
+            pass
+        record = IdempotencyKey.objects.filter(scope=scope, owner=owner, key=key).first()
+        if record is None:
+            continue  # released in the meantime
+        if record.expires_at <= timezone.now():
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=timezone.now()).delete()
+            continue
+        return False, record
+
+
+def _wait_for(record):
+    """Poll until the request holding ``record`` stores its response; None on timeout or release"""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while record is not None and record.status_code is None:
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(POLL_INTERVAL)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+    return record
+
+
+def idempotent(scope, namespace=None):
+    """
+    Make a DRF view honour the Idempotency-Key header. Requests without
+    the header run as before. ``scope`` namespaces keys per endpoint;
+    ``namespace(request)`` returns what an anonymous request's key belongs to.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(*args, **kwargs):
+            request = _find_request(args)
+            key = request.META.get(HEADER)
+            if not key:
+                return view_func(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            owner = _owner(request, namespace)
+            if owner is None:
+                return view_func(*args, **kwargs)
+            digest = fingerprint(request)
+            claimed, record = _claim(scope, owner, key, digest)
+            if not claimed:
+                if record.fingerprint != digest:
+                    return Response({'error': 'Idempotency-Key was already used for a different request'},
+                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                record = _wait_for(record)
+                if record is None:
+                    return Response({'error': 'A request with this Idempotency-Key is still in progress'},
+                                    status=status.HTTP_409_CONFLICT)
+                return _replay(record)
+
+            try:
+                response = view_func(*args, **kwargs)
+            except BaseException:
+                record.delete()
+                raise
+            if response.status_code >= 500 or not hasattr(response, 'data'):
+                record.delete()
+                return response
+            record.status_code = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=['status_code', 'response_body'])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from apps.orders.models import Order
+from apps.payments.models import MpesaPayment
+
+
+class Command(BaseCommand):
+    help = ('Cancel pending orders whose stock reservation has timed out and give the stock back '
+            '(run periodically, e.g. from cron)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=settings.ORDER_RESERVATION_TIMEOUT)
+        recent_payment = MpesaPayment.objects.filter(order=OuterRef('pk'), created_at__gt=cutoff)
+        # Only orders waiting on an M-Pesa payment expire; cash and card
+        # orders are settled outside the STK flow and keep their stock
+        expired = Order.objects.filter(
+            status='pending', stock_reserved=True, payment_method='mpesa', updated_at__lte=cutoff,
+        ).exclude(Exists(recent_payment))
+
+        cancelled = 0
+        for order in expired.iterator():
+            # Claim the order first, so a payment confirmed meanwhile wins
+            if not Order.objects.filter(pk=order.pk, status='pending').update(
+                status='cancelled', updated_at=timezone.now(),
+            ):
+                continue
+            order.release_stock()
+            cancelled += 1
+        self.stdout.write(self.style.SUCCESS(f'Cancelled {cancelled} expired order(s)'))
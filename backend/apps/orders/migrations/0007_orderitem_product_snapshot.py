@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def snapshot_products(apps, schema_editor):
+    # Existing items take the product details as they are today
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    items = OrderItem.objects.filter(product__isnull=False).select_related('product').only(
+        'id', 'product__name', 'product__sku', 'product__image_urls',
+    )
+    batch = []
+    for item in items.iterator(chunk_size=500):
+        image_urls = item.product.image_urls or {}
+        item.product_name = item.product.name
+        item.product_sku = item.product.sku
+        item.product_image_url = image_urls.get('thumb') or image_urls.get('original') or ''
+        batch.append(item)
+        if len(batch) >= 500:
+            OrderItem.objects.bulk_update(batch, ['product_name', 'product_sku', 'product_image_url'])
+            batch = []
+    if batch:
+        OrderItem.objects.bulk_update(batch, ['product_name', 'product_sku', 'product_image_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_idempotency_keys'),
+        ('products', '0017_low_stock_alerts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image_url',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_sku',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.product'),
+        ),
+        migrations.RunPython(snapshot_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:56
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL, so building the indexes on a
+    large orders table never blocks checkout writes; a plain AddIndex on
+    other databases (local SQLite), which have no concurrent build.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('orders', '0007_orderitem_product_snapshot'),
+        ('tenants', '0008_storesettings_low_stock_threshold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='order',
+            index=models.Index(fields=['tenant', '-created_at', '-id'], name='order_tenant_created_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='order',
+            index=models.Index(fields=['tenant', 'status', '-created_at', '-id'], name='order_tenant_status_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='order',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_created_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 import uuid
 
 class Order(models.Model):
@@ -42,6 +43,9 @@ class Order(models.Model):
     # MPesa fields
     mpesa_checkout_request_id = models.CharField(max_length=100, blank=True)
     mpesa_transaction_id = models.CharField(max_length=100, blank=True)
+
+    # True while the order holds stock taken at checkout
+    stock_reserved = models.BooleanField(default=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -49,20 +53,80 @@ class Order(models.Model):
     class Meta:
         db_table = 'orders'
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of order lists: a store's dashboard (optionally
+            # by status) and a customer's history, newest first
+            models.Index(fields=['tenant', '-created_at', '-id'], name='order_tenant_created_idx'),
+            models.Index(fields=['tenant', 'status', '-created_at', '-id'], name='order_tenant_status_idx'),
+            models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - {self.customer_name}"
 
+    def release_stock(self):
+        """
+        Give the order's reserved stock back. Only the first caller releases,
+        so a cancel racing a failed payment cannot return stock twice.
+        """
+        from apps.products.inventory import release_stock
+
+        with transaction.atomic():
+            if not Order.objects.filter(pk=self.pk, stock_reserved=True).update(stock_reserved=False):
+                return False
+            self.stock_reserved = False
+            release_stock(
+                ((item.product, item.quantity) for item in self.items.select_related('product') if item.product),
+                reference=self.pk,
+            )
+        return True
+
 class OrderItem(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    product = models.ForeignKey('products.Product', on_delete=models.CASCADE)
+    # Kept as a link only; the item's own copy of the product details is what orders show
+    product = models.ForeignKey('products.Product', on_delete=models.SET_NULL, null=True)
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    # Snapshot of the product at purchase time, so renames, reprices and
+    # deletions never rewrite history and order reads never join products
+    product_name = models.CharField(max_length=255, blank=True)
+    product_sku = models.CharField(max_length=100, blank=True)
+    product_image_url = models.CharField(max_length=500, blank=True)
     
     class Meta:
         db_table = 'order_items'
         ordering = ['-id']
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.product_name}"
+
+    @classmethod
+    def for_product(cls, order, product, quantity):
+        """An unsaved item for ``product`` with its details copied as they are now"""
+        image_urls = product.image_urls or {}
+        return cls(
+            order=order, product=product, quantity=quantity, price=product.price,
+            product_name=product.name, product_sku=product.sku,
+            product_image_url=image_urls.get('thumb') or image_urls.get('original') or '',
+        )
+
+
+class IdempotencyKey(models.Model):
+    """A client's Idempotency-Key and the response it produced; see idempotency.py"""
+    scope = models.CharField(max_length=50)
+    owner = models.CharField(max_length=64, blank=True)  # user id, or 'anon:' + hash of the view's namespace
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # null while executing
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        unique_together = ['scope', 'owner', 'key']
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
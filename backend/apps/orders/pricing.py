@@ -0,0 +1,71 @@
+"""
+Server-side cart pricing.
+
+Every amount an order carries is computed here from the products' current
+prices and the store's shipping settings; nothing the client sends is
+trusted. The same function prices the cart page (the quote endpoint) and
+the order itself, so a quote and the order placed from it always agree.
+
+Shipping comes from StoreSettings through the cache (see
+apps.tenants.services.store_settings): free when the store has shipping
+disabled or the subtotal reaches the free-shipping threshold; otherwise the
+flat shipping_rate. Stores that have not set a rate use the platform's
+DEFAULT_SHIPPING_RATE and DEFAULT_FREE_SHIPPING_THRESHOLD.
+"""
+from decimal import Decimal
+
+from apps.tenants.services.store_settings import get_shipping_settings
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def shipping_cost(shipping, subtotal):
+    if not subtotal or not shipping['enabled'] or not shipping['rate']:
+        return ZERO
+    threshold = shipping['free_threshold']
+    if threshold is not None and subtotal >= threshold:
+        return ZERO
+    return shipping['rate'].quantize(CENT)
+
+
+def cart_tenant_id(tenant, lines):
+    """
+    The store a cart is priced and ordered from: the request's store, or,
+    without one (e.g. the main site), the one store all its products come
+    from. None when the products span several stores.
+    """
+    if tenant:
+        return tenant.pk
+    tenant_ids = {product.tenant_id for product, _ in lines}
+    return tenant_ids.pop() if len(tenant_ids) == 1 else None
+
+
+def price_cart(tenant_id, lines):
+    """
+    Price (product, quantity) lines for a store. Returns a dict with the
+    per-line breakdown, subtotal, shipping_cost and total_amount.
+    """
+    priced = []
+    subtotal = ZERO
+    for product, quantity in lines:
+        line_total = (product.price * quantity).quantize(CENT)
+        subtotal += line_total
+        priced.append({
+            'product': str(product.pk),
+            'name': product.name,
+            'unit_price': product.price,
+            'quantity': quantity,
+            'line_total': line_total,
+        })
+
+    shipping = get_shipping_settings(tenant_id)
+    shipping_amount = shipping_cost(shipping, subtotal)
+    threshold = shipping['free_threshold'] if shipping['enabled'] else None
+    return {
+        'lines': priced,
+        'subtotal': subtotal,
+        'shipping_cost': shipping_amount,
+        'free_shipping_threshold': threshold,
+        'total_amount': subtotal + shipping_amount,
+    }
@@ -1,26 +1,34 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Order, OrderItem
+from .pricing import cart_tenant_id, price_cart
+from apps.products.inventory import InsufficientStock, reserve_stock
 from apps.products.models import Product
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_name = serializers.CharField(source='product.name', read_only=True)
-    product_price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
+    # Read from the item's purchase-time snapshot, never from the live product
+    product_price = serializers.DecimalField(source='price', max_digits=10, decimal_places=2, read_only=True)
     total_price = serializers.SerializerMethodField()
       
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'product_name', 'product_price', 'quantity', 'price', 'total_price']
-        read_only_fields = ['id', 'price']
+        fields = [
+            'id', 'product', 'product_name', 'product_sku', 'product_image_url', 'product_price',
+            'quantity', 'price', 'total_price'
+        ]
+        read_only_fields = ['id', 'price', 'product_name', 'product_sku', 'product_image_url']
 
     def get_total_price(self, obj):
         return obj.quantity * obj.price
 
 class OrderItemCreateSerializer(serializers.ModelSerializer):
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
-    
+    # Resolved for the whole cart at once by OrderCreateSerializer.validate()
+    product = serializers.UUIDField(source='product_id')
+
     class Meta:
         model = OrderItem
         fields = ['product', 'quantity']
+        extra_kwargs = {'quantity': {'min_value': 1}}
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
@@ -38,9 +46,51 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+def load_cart(items, context):
+    """
+    Swap each item's product id for its Product, loading the whole cart in
+    one query scoped to the request's store. Raises ValidationError naming
+    products that do not exist there.
+    """
+    products = Product.objects.all()
+    tenant = getattr(context.get('request'), 'tenant', None)
+    if tenant:
+        products = products.filter(tenant=tenant)
+    products = products.in_bulk({item['product_id'] for item in items})
+
+    missing = sorted({str(item['product_id']) for item in items if item['product_id'] not in products})
+    if missing:
+        raise serializers.ValidationError({'items': [f'Product {pk} is not available.' for pk in missing]})
+    for item in items:
+        item['product'] = products[item.pop('product_id')]
+    return items
+
+
+class OrderQuoteSerializer(serializers.Serializer):
+    items = OrderItemCreateSerializer(many=True, allow_empty=False)
+
+    def validate(self, attrs):
+        load_cart(attrs['items'], self.context)
+        return attrs
+
+class PricedLineSerializer(serializers.Serializer):
+    product = serializers.CharField()
+    name = serializers.CharField()
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    quantity = serializers.IntegerField()
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class PricedCartSerializer(serializers.Serializer):
+    """Read-only view of a pricing.price_cart() result"""
+    lines = PricedLineSerializer(many=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    shipping_cost = serializers.DecimalField(max_digits=10, decimal_places=2)
+    free_shipping_threshold = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    total_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
 class OrderCreateSerializer(serializers.ModelSerializer):
-    items = OrderItemCreateSerializer(many=True)
-    
+    items = OrderItemCreateSerializer(many=True, allow_empty=False)
+
     class Meta:
         model = Order
         fields = [
@@ -48,31 +98,36 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             'payment_method', 'customer_name', 'customer_email', 
             'customer_phone', 'shipping_address', 'notes'
         ]
+        # Amounts are priced server-side (see pricing.py), never taken from the client
+        read_only_fields = ['subtotal', 'shipping_cost', 'total_amount']
+
+    def validate(self, attrs):
+        load_cart(attrs['items'], self.context)
+        return attrs
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        
-        # Create the order
-        order = Order.objects.create(**validated_data)
-
-        # Create order items and calculate total
-        calculated_total = 0
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            price = product.price
-
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price=price
+        lines = [(item['product'], item['quantity']) for item in items_data]
+        # Resolved exactly as the quote endpoint does, so both price alike
+        tenant_id = cart_tenant_id(validated_data.pop('tenant', None), lines)
+        if tenant_id is None:
+            raise serializers.ValidationError({'items': ['All items in an order must come from one store.']})
+        quote = price_cart(tenant_id, lines)
+
+        with transaction.atomic():
+            order = Order.objects.create(
+                tenant_id=tenant_id, subtotal=quote['subtotal'], shipping_cost=quote['shipping_cost'],
+                total_amount=quote['total_amount'], stock_reserved=True, **validated_data
             )
-            calculated_total += quantity * price
-        
-        # If total_amount wasn't provided, use calculated total
-        if not order.total_amount:
-            order.total_amount = calculated_total
-            order.save()
-        
-        return order
\ No newline at end of file
+
+            # Take stock; if any line is short the whole order rolls back
+            try:
+                reserve_stock(((item['product'], item['quantity']) for item in items_data), reference=order.pk)
+            except InsufficientStock as e:
+                raise serializers.ValidationError({'items': [f'Not enough stock for product {e.product_id}.']})
+
+            OrderItem.objects.bulk_create([
+                OrderItem.for_product(order, item['product'], item['quantity']) for item in items_data
+            ])
+
+        return order
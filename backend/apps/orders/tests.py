@@ -1,3 +1,358 @@
-from django.test import TestCase
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.products.inventory import InsufficientStock, reserve_stock
+from apps.products.models import Product
+from apps.products.stats import verify_stats
+from apps.tenants.models import StoreSettings, Tenant
+from .models import IdempotencyKey, Order, OrderItem
+
+
+def order_payload(*lines):
+    return {
+        'items': [{'product': str(product.pk), 'quantity': quantity} for product, quantity in lines],
+        'total_amount': '0',
+        'payment_method': 'mpesa',
+        'customer_name': 'Jane',
+        'customer_email': 'jane@example.com',
+        'customer_phone': '0700000000',
+        'shipping_address': 'Nairobi',
+    }
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class OrderStockReservationTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.user = get_user_model().objects.create_user(username='jane', email='jane@example.com', password='pw')
+        self.client.force_login(self.user)
+        self.lamp = Product.objects.create(tenant=self.tenant, name='Lamp', description='', price=10, stock_quantity=3)
+        self.ebook = Product.objects.create(tenant=self.tenant, name='Ebook', description='', price=5,
+                                            track_quantity=False, stock_quantity=0)
+
+    def checkout(self, *lines):
+        return self.client.post('/api/orders/orders/', order_payload(*lines),
+                                content_type='application/json', HTTP_HOST='shop.localhost')
+
+    def stock(self, product):
+        return Product.objects.values_list('stock_quantity', flat=True).get(pk=product.pk)
+
+    def test_checkout_reserves_and_refuses_oversell(self):
+        self.assertEqual(self.checkout((self.lamp, 2), (self.ebook, 5)).status_code, 201)
+        self.assertEqual(self.stock(self.lamp), 1)
+        self.assertEqual(self.stock(self.ebook), 0)
+
+        response = self.checkout((self.ebook, 1), (self.lamp, 2))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.stock(self.lamp), 1)
+
+    def test_cancel_releases_once(self):
+        self.checkout((self.lamp, 3))
+        order = Order.objects.get()
+        self.assertTrue(order.stock_reserved)
+        self.assertEqual(verify_stats(self.tenant.pk), {})
+
+        for _ in range(2):
+            self.client.post(f'/api/orders/orders/{order.pk}/cancel/', HTTP_HOST='shop.localhost')
+        self.assertEqual(self.stock(self.lamp), 3)
+        self.assertEqual(verify_stats(self.tenant.pk), {})
+
+    def test_backorder_may_go_negative(self):
+        Product.objects.filter(pk=self.lamp.pk).update(allow_backorder=True)
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.checkout((self.lamp, 5)).status_code, 201)
+        self.assertEqual(self.stock(self.lamp), -2)
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class OrderCreateTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.client.force_login(get_user_model().objects.create_user(username='jane', email='jane@example.com', password='pw'))
+        self.products = [
+            Product.objects.create(tenant=self.tenant, name=f'Item {i}', description='', price=10 + i, stock_quantity=100)
+            for i in range(30)
+        ]
+
+    def checkout(self, *lines, **extra):
+        return self.client.post('/api/orders/orders/', {**order_payload(*lines), **extra},
+                                content_type='application/json', HTTP_HOST='shop.localhost')
+
+    def test_totals_are_computed_server_side(self):
+        self.tenant.settings.shipping_rate = 7
+        self.tenant.settings.save()
+        response = self.checkout((self.products[0], 2), (self.products[1], 1), total_amount='1.00', shipping_cost='0')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual((order.subtotal, order.shipping_cost, order.total_amount), (31, 7, 38))
+        self.assertEqual(sorted(order.items.values_list('price', flat=True)), [10, 11])
+
+    def test_query_count_does_not_grow_with_lines(self):
+        def run(count):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.checkout(*[(p, 1) for p in self.products[:count]]).status_code, 201)
+            return len(queries)
+
+        run(1)  # creates the stats and facet rows
+        self.assertEqual(run(3), run(30))
+        self.assertEqual(OrderItem.objects.count(), 34)
+
+    def test_products_of_other_stores_are_rejected(self):
+        other = Tenant.objects.create(name='Other', subdomain='other', is_active=True)
+        foreign = Product.objects.create(tenant=other, name='Foreign', description='', price=1, stock_quantity=5)
+        response = self.checkout((self.products[0], 1), (foreign, 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock_quantity, 100)
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class OrderQuoteTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        settings = self.tenant.settings
+        settings.shipping_rate = Decimal('250')
+        settings.free_shipping_threshold = Decimal('1000')
+        settings.save()
+        self.mug = Product.objects.create(tenant=self.tenant, name='Mug', description='', price=Decimal('300.50'), stock_quantity=9)
+
+    def quote(self, quantity):
+        return self.client.post('/api/orders/orders/quote/', {'items': [{'product': str(self.mug.pk), 'quantity': quantity}]},
+                                content_type='application/json', HTTP_HOST='shop.localhost')
+
+    def test_shipping_rules(self):
+        data = self.quote(2).json()
+        self.assertEqual(data['lines'][0]['line_total'], '601.00')
+        self.assertEqual((data['subtotal'], data['shipping_cost'], data['total_amount']), ('601.00', '250.00', '851.00'))
+
+        data = self.quote(4).json()
+        self.assertEqual((data['shipping_cost'], data['total_amount']), ('0.00', '1202.00'))
+
+        self.tenant.settings.shipping_enabled = False
+        self.tenant.settings.save()
+        self.assertEqual(self.quote(1).json()['shipping_cost'], '0.00')
+
+    @override_settings(DEFAULT_SHIPPING_RATE=Decimal('199'), DEFAULT_FREE_SHIPPING_THRESHOLD=Decimal('1999'))
+    def test_default_shipping_and_store_from_products(self):
+        self.tenant.settings.shipping_rate = None
+        self.tenant.settings.save()
+        data = self.quote(1).json()
+        self.assertEqual((data['shipping_cost'], data['free_shipping_threshold']), ('199.00', '1999.00'))
+
+        self.tenant.settings.delete()
+        self.assertEqual(self.quote(1).json()['shipping_cost'], '199.00')
+
+        # Priced from the main site, the cart's store is taken from its products
+        self.tenant.settings = StoreSettings.objects.create(store=self.tenant, shipping_rate=Decimal('250'))
+        response = self.client.post('/api/orders/orders/quote/', {'items': [{'product': str(self.mug.pk), 'quantity': 1}]},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['shipping_cost'], '250.00')
+
+    def test_order_from_main_site_is_charged_the_quote(self):
+        payload = order_payload((self.mug, 2))
+        quote = self.client.post('/api/orders/orders/quote/', {'items': payload['items']},
+                                 content_type='application/json').json()
+        self.client.force_login(get_user_model().objects.create_user(username='jane', password='pw'))
+        response = self.client.post('/api/orders/orders/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get()
+        self.assertEqual(order.tenant_id, self.tenant.pk)
+        self.assertEqual((str(order.shipping_cost), str(order.total_amount)), (quote['shipping_cost'], quote['total_amount']))
+        self.assertEqual(quote['shipping_cost'], '250.00')
+
+    def test_quote_is_one_query_and_writes_nothing(self):
+        self.quote(1)  # warm the tenant and shipping caches
+        with self.assertNumQueries(1):
+            self.assertEqual(self.quote(3).status_code, 200)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.mug.pk).stock_quantity, 9)
+
+    def test_unknown_products_are_rejected(self):
+        response = self.client.post('/api/orders/orders/quote/', {'items': [{'product': str(uuid.uuid4()), 'quantity': 1}]},
+                                    content_type='application/json', HTTP_HOST='shop.localhost')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class OrderIdempotencyTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.client.force_login(get_user_model().objects.create_user(username='jane', email='jane@example.com', password='pw'))
+        self.lamp = Product.objects.create(tenant=self.tenant, name='Lamp', description='', price=10, stock_quantity=5)
+
+    def checkout(self, quantity, key='key-1'):
+        return self.client.post('/api/orders/orders/', order_payload((self.lamp, quantity)), content_type='application/json',
+                                HTTP_HOST='shop.localhost', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.checkout(2)
+        retry = self.checkout(2)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.lamp.pk).stock_quantity, 3)
+
+        self.assertEqual(self.checkout(2, key='key-2').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_for_another_request(self):
+        self.checkout(1)
+        self.assertEqual(self.checkout(3).status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_duplicate_waits_for_the_running_request(self):
+        first = self.checkout(1)
+        record = IdempotencyKey.objects.get()
+        stored = (record.status_code, record.response_body)
+        IdempotencyKey.objects.filter(pk=record.pk).update(status_code=None, response_body=None)
+
+        def finish(_):
+            IdempotencyKey.objects.filter(pk=record.pk).update(status_code=stored[0], response_body=stored[1])
+
+        with mock.patch('apps.orders.idempotency.time.sleep', side_effect=finish) as sleep:
+            retry = self.checkout(1)
+        sleep.assert_called_once()
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(status_code=None)
+        with override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0):
+            self.assertEqual(self.checkout(1).status_code, 409)
+
+    def test_expired_key_runs_again(self):
+        self.checkout(1)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.checkout(1).status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_rejected_requests_release_the_key(self):
+        self.assertEqual(self.checkout(50).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.checkout(50).status_code, 400)
+
+        with mock.patch('apps.orders.views.OrderViewSet.perform_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.checkout(1, key='boom')
+        self.assertFalse(IdempotencyKey.objects.filter(key='boom').exists())
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class OrderItemSnapshotTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.client.force_login(get_user_model().objects.create_user(username='jane', email='jane@example.com', password='pw'))
+        self.products = [
+            Product.objects.create(tenant=self.tenant, name=f'Item {i}', description='', price=10, stock_quantity=100)
+            for i in range(5)
+        ]
+        for i, product in enumerate(self.products):
+            product.image_urls = {'original': f'https://cdn.example.com/{i}.jpg', 'thumb': f'https://cdn.example.com/t/{i}.jpg'}
+            Product.objects.filter(pk=product.pk).update(image_urls=product.image_urls)
+
+    def place_orders(self, count):
+        for _ in range(count):
+            self.client.post('/api/orders/orders/', order_payload(*[(p, 1) for p in self.products]),
+                             content_type='application/json', HTTP_HOST='shop.localhost')
+
+    def list_orders(self):
+        return self.client.get('/api/orders/orders/', HTTP_HOST='shop.localhost')
+
+    def test_listing_does_not_touch_products(self):
+        self.place_orders(2)
+        self.list_orders()
+        with CaptureQueriesContext(connection) as few:
+            self.list_orders()
+        self.place_orders(6)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(len(self.list_orders().json()['results']), 8)
+        self.assertEqual(len(few), len(many))
+        self.assertFalse(any('"products"' in query['sql'] for query in many.captured_queries))
+
+    def test_history_survives_product_changes(self):
+        self.place_orders(1)
+        Product.objects.filter(pk=self.products[0].pk).update(name='Renamed', price=99)
+        self.products[1].delete()
+
+        items = {item['product_sku']: item for item in self.list_orders().json()['results'][0]['items']}
+        first = items[self.products[0].sku]
+        self.assertEqual((first['product_name'], first['product_price']), ('Item 0', '10.00'))
+        self.assertEqual(first['product_image_url'], 'https://cdn.example.com/t/0.jpg')
+        deleted = items[self.products[1].sku]
+        self.assertEqual((deleted['product'], deleted['product_name']), (None, 'Item 1'))
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class OrderListPaginationTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        user = get_user_model().objects.create_user(username='jane', email='jane@example.com', password='pw')
+        self.client.force_login(user)
+        orders = [
+            Order.objects.create(tenant=self.tenant, customer=user, total_amount=10, customer_name='Jane',
+                                 customer_email='jane@example.com', customer_phone='0700000000',
+                                 shipping_address='Nairobi', payment_method='mpesa')
+            for _ in range(5)
+        ]
+        # Force ties on created_at so the id tie-breaker matters
+        Order.objects.filter(pk__in=[o.pk for o in orders[:3]]).update(created_at=timezone.now() - timedelta(days=1))
+
+    def test_pages_through_orders_without_count(self):
+        expected = [str(pk) for pk in Order.objects.order_by('-created_at', '-id').values_list('id', flat=True)]
+        seen, url, params = [], '/api/orders/orders/', {'page_size': 2}
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                page = self.client.get(url, params, HTTP_HOST='shop.localhost').json()
+                self.assertNotIn('count', page)
+                seen += [order['id'] for order in page['results']]
+                url, params = page['next'], None
+        self.assertEqual(seen, expected)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Hundreds of checkouts race for a small stock; none may oversell"""
+    STOCK = 40
+    CHECKOUTS = 200
+
+    def setUp(self):
+        tenant = Tenant.objects.create(name='Sale', subdomain='sale', is_active=True)
+        self.product = Product.objects.create(tenant=tenant, name='Console', description='', price=100,
+                                              stock_quantity=self.STOCK)
+
+    def attempt(self, _):
+        try:
+            while True:
+                try:
+                    reserve_stock([(self.product, 1)])
+                    return True
+                except InsufficientStock:
+                    return False
+                except OperationalError:
+                    # SQLite's shared-cache test database reports lock
+                    # contention instead of waiting; back off and try again
+                    time.sleep(random.uniform(0, 0.002))
+        finally:
+            connection.close()
+
+    def test_no_oversell(self):
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(self.attempt, range(self.CHECKOUTS)))
+
+        self.assertEqual(sum(results), self.STOCK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 0)
@@ -3,13 +3,18 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from apps.products.pagination import KeysetPagination
 from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderCreateSerializer
+from .serializers import OrderSerializer, OrderCreateSerializer, OrderQuoteSerializer, PricedCartSerializer
+from .pricing import cart_tenant_id, price_cart
+from .idempotency import idempotent
 
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'customer']
+    # Newest first by (created_at, id) cursor; served by the Order indexes
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
         """
@@ -17,6 +22,9 @@ class OrderViewSet(viewsets.ModelViewSet):
         """
         if self.action == 'create':
             permission_classes = [permissions.IsAuthenticated]
+        elif self.action == 'quote':
+            # Cart pages re-price before the shopper signs in
+            permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
@@ -26,6 +34,8 @@ class OrderViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'create':
             return OrderCreateSerializer
+        if self.action == 'quote':
+            return OrderQuoteSerializer
         return OrderSerializer
     
     def get_queryset(self):
@@ -34,18 +44,36 @@ class OrderViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(tenant=self.request.tenant)
         return queryset
     
+    @idempotent('orders.create')
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         if hasattr(self.request, 'tenant') and self.request.tenant:
             serializer.save(tenant=self.request.tenant, customer=self.request.user)
         else:
             serializer.save(customer=self.request.user)
     
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        """
+        Price a cart without placing an order: line totals, subtotal,
+        shipping and total, exactly as order creation would compute them.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tenant = request.tenant if hasattr(request, 'tenant') and request.tenant else None
+        lines = [(item['product'], item['quantity']) for item in serializer.validated_data['items']]
+        return Response(PricedCartSerializer(price_cart(cart_tenant_id(tenant, lines), lines)).data)
+
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
         order = self.get_object()
         new_status = request.data.get('status')
         
         if new_status in dict(Order.STATUS_CHOICES):
+            if new_status == 'cancelled':
+                order.release_stock()
             order.status = new_status
             order.save()
             return Response({'message': f'Order status updated to {new_status}'})
@@ -54,6 +82,7 @@ class OrderViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         order = self.get_object()
+        order.release_stock()
         order.status = 'cancelled'
         order.save()
         return Response({'message': 'Order cancelled successfully'})
@@ -1,3 +1,142 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.tenants.models import Tenant
+from apps.orders.models import Order
+from apps.products.models import Product
+from .models import MpesaPayment
+
+
+class InitiatePaymentIdempotencyTests(TestCase):
+    def setUp(self):
+        tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        customer = get_user_model().objects.create_user(username='jane', email='jane@example.com', password='pw')
+        self.order = Order.objects.create(
+            tenant=tenant, customer=customer, total_amount=150, customer_name='Jane',
+            customer_email='jane@example.com', customer_phone='0700000000', shipping_address='Nairobi',
+        )
+
+    def initiate(self, key, phone='254700000000'):
+        return self.client.post('/api/payments/initiate-payment/', {'order_id': str(self.order.pk), 'phone_number': phone},
+                                content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    @mock.patch('apps.payments.views.MpesaService')
+    def test_retry_sends_one_stk_push(self, service):
+        service.return_value.stk_push.return_value = (
+            {'MerchantRequestID': 'm-1', 'CheckoutRequestID': 'c-1'}, None,
+        )
+        first = self.initiate('pay-1')
+        retry = self.initiate('pay-1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        service.return_value.stk_push.assert_called_once_with('254700000000', 150, f'ORDER_{self.order.pk}', mock.ANY)
+        self.assertEqual(MpesaPayment.objects.count(), 1)
+        self.assertEqual(self.initiate('pay-1', phone='254711111111').status_code, 422)
+
+    @mock.patch('apps.payments.views.MpesaService')
+    def test_upstream_failure_is_retried(self, service):
+        service.return_value.stk_push.side_effect = [
+            (None, 'Timeout'),
+            ({'MerchantRequestID': 'm-1', 'CheckoutRequestID': 'c-1'}, None),
+        ]
+        self.assertEqual(self.initiate('pay-1').status_code, 502)
+        retry = self.initiate('pay-1')
+        self.assertEqual(retry.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(service.return_value.stk_push.call_count, 2)
+
+    @mock.patch('apps.payments.views.MpesaService')
+    def test_anonymous_keys_are_scoped_to_the_order(self, service):
+        service.return_value.stk_push.side_effect = [
+            ({'MerchantRequestID': f'm-{i}', 'CheckoutRequestID': f'c-{i}'}, None) for i in range(2)
+        ]
+        other = Order.objects.create(
+            tenant=self.order.tenant, customer=self.order.customer, total_amount=80, customer_name='Joe',
+            customer_email='joe@example.com', customer_phone='0711111111', shipping_address='Mombasa',
+        )
+        self.initiate('pay-1')
+        response = self.client.post('/api/payments/initiate-payment/', {'order_id': str(other.pk), 'phone_number': '254711111111'},
+                                    content_type='application/json', HTTP_IDEMPOTENCY_KEY='pay-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['payment_id'], MpesaPayment.objects.get(order=self.order).pk)
+        self.assertEqual(MpesaPayment.objects.filter(order=other).count(), 1)
+
+
+def stk_callback(payment, result_code):
+    return {'Body': {'stkCallback': {
+        'MerchantRequestID': payment.merchant_request_id, 'CheckoutRequestID': payment.checkout_request_id,
+        'ResultCode': result_code, 'ResultDesc': 'Request cancelled by user' if result_code else 'Success',
+    }}}
+
+
+@override_settings(ALLOWED_HOSTS=['*'], ORDER_RESERVATION_TIMEOUT=1800)
+class PaymentCallbackTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.user = get_user_model().objects.create_user(username='jane', email='jane@example.com', password='pw')
+        self.client.force_login(self.user)
+        self.lamp = Product.objects.create(tenant=self.tenant, name='Lamp', description='', price=10, stock_quantity=3)
+        self.mpesa = mock.patch('apps.payments.views.MpesaService').start()
+        self.addCleanup(mock.patch.stopall)
+        self.mpesa.return_value.stk_push.side_effect = [
+            ({'MerchantRequestID': f'm-{i}', 'CheckoutRequestID': f'c-{i}'}, None) for i in range(5)
+        ]
+
+    def checkout(self, quantity, payment_method='mpesa'):
+        response = self.client.post('/api/orders/orders/', {
+            'items': [{'product': str(self.lamp.pk), 'quantity': quantity}], 'total_amount': '0',
+            'payment_method': payment_method, 'customer_name': 'Jane', 'customer_email': 'jane@example.com',
+            'customer_phone': '0700000000', 'shipping_address': 'Nairobi',
+        }, content_type='application/json', HTTP_HOST='shop.localhost')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.order_by('-created_at').first()
+
+    def pay(self, order, result_code):
+        response = self.client.post('/api/payments/initiate-payment/',
+                                    {'order_id': str(order.pk), 'phone_number': '254700000000'},
+                                    content_type='application/json')
+        payment = MpesaPayment.objects.get(pk=response.json()['payment_id'])
+        self.client.post('/api/payments/callback/', stk_callback(payment, result_code), content_type='application/json')
+        payment.refresh_from_db()
+        return payment
+
+    def stock(self):
+        return Product.objects.values_list('stock_quantity', flat=True).get(pk=self.lamp.pk)
+
+    def test_retry_after_failed_payment(self):
+        order = self.checkout(2)
+        self.assertEqual(self.pay(order, 1032).status, 'failed')
+
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.stock_reserved), ('pending', True))
+        self.assertEqual(self.stock(), 1)
+
+        self.assertEqual(self.pay(order, 0).status, 'successful')
+        order.refresh_from_db()
+        self.assertNotEqual(order.status, 'cancelled')
+        self.assertEqual(self.stock(), 1)
+
+    def test_reservation_released_after_timeout(self):
+        abandoned, retrying = self.checkout(1), self.checkout(1)
+        cash = self.checkout(1, payment_method='cash')
+        self.pay(abandoned, 1032)
+        self.pay(retrying, 1032)
+        long_ago = timezone.now() - timedelta(hours=1)
+        Order.objects.update(updated_at=long_ago)
+        MpesaPayment.objects.filter(order=abandoned).update(created_at=long_ago)
+
+        call_command('release_expired_orders', stdout=StringIO())
+        abandoned.refresh_from_db()
+        retrying.refresh_from_db()
+        self.assertEqual((abandoned.status, abandoned.stock_reserved), ('cancelled', False))
+        self.assertEqual((retrying.status, retrying.stock_reserved), ('pending', True))
+        cash.refresh_from_db()
+        self.assertEqual((cash.status, cash.stock_reserved), ('pending', True))
+        self.assertEqual(self.stock(), 1)
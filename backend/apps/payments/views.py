@@ -7,6 +7,7 @@ from django.views.decorators.csrf import csrf_exempt
 from .models import MpesaPayment, SubscriptionPayment
 from .services.mpesa_service import MpesaService
 from apps.orders.models import Order
+from apps.orders.idempotency import idempotent
 from .serializers import MpesaPaymentSerializer, SubscriptionPaymentSerializer, SubscriptionPaymentCreateSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 import json
@@ -30,6 +31,8 @@ class SubscriptionPaymentViewSet(viewsets.ModelViewSet):
 @api_view(['GET','POST'])
 @permission_classes([AllowAny])
 @csrf_exempt
+# Anonymous shoppers' keys are scoped to the order they are paying for
+@idempotent('payments.initiate', namespace=lambda request: request.data.get('order_id'))
 def initiate_stk_push(request):
     """Initiate STK push payment"""
     try:
@@ -47,13 +50,15 @@ def initiate_stk_push(request):
         mpesa_service = MpesaService()
 
         result, error = mpesa_service.stk_push(
-            phone_number, int(order.total), f"ORDER_{order.id}", f"payment for order {order.id}"
+            phone_number, int(order.total_amount), f"ORDER_{order.id}", f"payment for order {order.id}"
         )
         
         if error:
+            # Upstream failure, often transient: 502 so a retry with the same
+            # Idempotency-Key tries M-Pesa again instead of replaying this
             return Response(
                 {'error': f'Payment initiation failed: {error}'},
-                status=status.HTTP_400_BAD_REQUEST
+                status=status.HTTP_502_BAD_GATEWAY
             )
             
         # Save payment record
@@ -61,7 +66,7 @@ def initiate_stk_push(request):
             order=order,
             user=request.user if request.user.is_authenticated else None,
             phone_number=phone_number,
-            amount=order.total,
+            amount=order.total_amount,
             merchant_request_id=result.get('MerchantRequestID', ''),
             checkout_request_id=result.get('CheckoutRequestID', ''),
             status='pending'
@@ -113,6 +118,8 @@ def payment_callback(request):
             payment.order.status = 'completed'
             payment.order.save()
         else:
+            # The order stays pending with its stock held, so the shopper can
+            # retry; release_expired_orders frees it if they never pay
             payment.status = 'failed'
             
         payment.save()
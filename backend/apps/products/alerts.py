@@ -0,0 +1,213 @@
+"""
+Event-driven low-stock alerts.
+
+Instead of scanning catalogs, every stock change is checked as it happens:
+a tracked product whose stock moves from above its threshold to at or
+below it opens a LowStockAlert; moving back above resolves it. A partial
+unique constraint allows one open alert per product, so repeated sales
+below the threshold (or two racing checkouts) enqueue a single alert per
+crossing.
+
+The threshold is the product's own low_stock_threshold, else the store's
+StoreSettings.low_stock_threshold, else settings.LOW_STOCK_THRESHOLD. The
+dashboard's low_stock counter (stats.py) uses the same resolver, so it
+always matches the open alerts.
+
+Changes that move a product across its threshold without moving stock
+(creating or importing it already low, toggling track_quantity, changing
+its own or the store's threshold) re-check it outright with reconcile()
+or reconcile_tenant().
+
+Alerts with notified_at unset are the notification queue; the
+send_low_stock_alerts command mails each store one digest of them,
+honouring StoreSettings.low_stock_alerts. Open alerts double as the
+"currently low" list for the dashboard.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.mail import send_mail
+from django.db.models import Exists, F, OuterRef, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.tenants.services.store_settings import get_low_stock_threshold
+
+from .models import LowStockAlert, Product
+
+
+ALERT_FIELDS = ('track_quantity', 'low_stock_threshold')
+
+
+def store_threshold(tenant_id):
+    """A store's default threshold: its StoreSettings value, else the global one"""
+    threshold = get_low_stock_threshold(tenant_id)
+    return settings.LOW_STOCK_THRESHOLD if threshold is None else threshold
+
+
+def resolve_threshold(tenant_id, override):
+    return override if override is not None else store_threshold(tenant_id)
+
+
+def low_stock_threshold(product):
+    return resolve_threshold(product.tenant_id, product.low_stock_threshold)
+
+
+def is_low(tenant_id, track_quantity, stock_quantity, override):
+    """Whether stock fields count as low; the one test for alerts and the dashboard"""
+    return bool(track_quantity) and stock_quantity <= resolve_threshold(tenant_id, override)
+
+
+def snapshot(product):
+    """Remember the fields besides stock that decide whether a product is low"""
+    if product.get_deferred_fields().intersection(ALERT_FIELDS):
+        product._alert_fields = None
+    else:
+        product._alert_fields = (product.track_quantity, product.low_stock_threshold)
+
+
+def product_saved(product, created, deltas):
+    """Keep a product's alert current after save(); ``deltas`` are its stock changes"""
+    loaded = None if created else getattr(product, '_alert_fields', None)
+    current = (product.track_quantity, product.low_stock_threshold)
+    if loaded != current:
+        # New, or what counts as low changed: check the product outright
+        reconcile([product], created=created)
+    else:
+        stock_moved([product], deltas)
+    product._alert_fields = current
+
+
+def reconcile(products, created=False):
+    """
+    Open an alert for each of ``products`` that is low and resolve the open
+    alerts of the rest, whatever their stock did. ``created`` skips the
+    resolve for products that cannot have alerts yet.
+    """
+    now = timezone.now()
+    low, fine = [], []
+    for product in products:
+        if product.tenant_id is None:
+            continue
+        threshold = low_stock_threshold(product)
+        if product.track_quantity and product.stock_quantity <= threshold:
+            low.append(LowStockAlert(
+                tenant_id=product.tenant_id, product_id=product.pk,
+                threshold=threshold, stock_quantity=product.stock_quantity, created_at=now,
+            ))
+        else:
+            fine.append(product.pk)
+
+    if fine and not created:
+        LowStockAlert.objects.filter(product_id__in=fine, resolved_at__isnull=True).update(resolved_at=now)
+    if low:
+        LowStockAlert.objects.bulk_create(low, ignore_conflicts=True)
+
+
+def reconcile_tenant(tenant_id, chunk_size=500):
+    """
+    reconcile() every product of a store, set-based, after its threshold
+    changed. Returns (alerts opened, alerts resolved).
+    """
+    now = timezone.now()
+    default = store_threshold(tenant_id)
+    low = Product.objects.filter(tenant_id=tenant_id, track_quantity=True).alias(
+        threshold=Coalesce('low_stock_threshold', Value(default)),
+    ).filter(stock_quantity__lte=F('threshold'))
+
+    resolved = (LowStockAlert.objects.filter(tenant_id=tenant_id, resolved_at__isnull=True)
+                .exclude(product_id__in=low.values('pk')).update(resolved_at=now))
+
+    has_open = LowStockAlert.objects.filter(product_id=OuterRef('pk'), resolved_at__isnull=True)
+    missing = low.annotate(level=F('threshold')).filter(~Exists(has_open)).values_list('pk', 'stock_quantity', 'level')
+    opened = LowStockAlert.objects.bulk_create(
+        [
+            LowStockAlert(tenant_id=tenant_id, product_id=pk, threshold=threshold,
+                          stock_quantity=stock_quantity, created_at=now)
+            for pk, stock_quantity, threshold in missing.iterator(chunk_size=chunk_size)
+        ],
+        batch_size=chunk_size, ignore_conflicts=True,
+    )
+    return len(opened), resolved
+
+
+def stock_moved(products, deltas):
+    """
+    Open or resolve alerts for ``products`` (as they are after the change)
+    whose stock moved by ``deltas`` ({product_id: change}). Returns the
+    number of threshold crossings.
+    """
+    now = timezone.now()
+    crossed, recovered = [], []
+    for product in products:
+        delta = deltas.get(product.pk)
+        if not delta or not product.track_quantity or product.tenant_id is None:
+            continue
+        threshold = low_stock_threshold(product)
+        before, after = product.stock_quantity - delta, product.stock_quantity
+        if before > threshold >= after:
+            crossed.append(LowStockAlert(
+                tenant_id=product.tenant_id, product_id=product.pk,
+                threshold=threshold, stock_quantity=after, created_at=now,
+            ))
+        elif after > threshold >= before:
+            recovered.append(product.pk)
+
+    if recovered:
+        LowStockAlert.objects.filter(product_id__in=recovered, resolved_at__isnull=True).update(resolved_at=now)
+    if crossed:
+        # An alert that is still open for the product wins; nothing is duplicated
+        LowStockAlert.objects.bulk_create(crossed, ignore_conflicts=True)
+    return len(crossed)
+
+
+def open_alerts(tenant):
+    return (LowStockAlert.objects.filter(tenant=tenant, resolved_at__isnull=True)
+            .select_related('product').order_by('-created_at'))
+
+
+def alert_recipient(tenant):
+    """Where a store's low-stock mail goes, or None if it opted out"""
+    try:
+        store_settings = tenant.settings
+    except ObjectDoesNotExist:
+        store_settings = None
+    if store_settings is not None:
+        if not (store_settings.low_stock_alerts and store_settings.email_notifications):
+            return None
+        if store_settings.notification_email:
+            return store_settings.notification_email
+    return tenant.owner_email or tenant.email or None
+
+
+def send_pending_alerts(limit=1000):
+    """
+    Mail each store one digest of its un-notified alerts. Returns
+    (stores mailed, alerts handled). Alerts of stores that opted out are
+    marked handled without mail; a failed send leaves them queued.
+    """
+    pending = (LowStockAlert.objects.filter(notified_at__isnull=True)
+               .select_related('product', 'tenant__settings').order_by('created_at')[:limit])
+    per_tenant = defaultdict(list)
+    for alert in pending:
+        per_tenant[alert.tenant_id].append(alert)
+
+    mailed = handled = 0
+    for alerts in per_tenant.values():
+        tenant = alerts[0].tenant
+        recipient = alert_recipient(tenant)
+        if recipient:
+            lines = [
+                f'- {alert.product.name} ({alert.product.sku}): {alert.stock_quantity} left, threshold {alert.threshold}'
+                for alert in alerts
+            ]
+            send_mail(
+                f'{tenant.name}: {len(alerts)} product(s) running low on stock',
+                'These products have reached their low-stock threshold:\n\n' + '\n'.join(lines),
+                None, [recipient],
+            )
+            mailed += 1
+        LowStockAlert.objects.filter(pk__in=[alert.pk for alert in alerts]).update(notified_at=timezone.now())
+        handled += len(alerts)
+    return mailed, handled
@@ -0,0 +1,90 @@
+"""
+Set-based bulk actions on a tenant's products.
+
+Every action is a single UPDATE over the selected rows, so reworking a
+catalog costs the same few queries for ten products or ten thousand.
+QuerySet.update() does not send post_save, so the facet and stats deltas
+are aggregated from the selected rows (GROUP BY their current status or
+price bucket) just before the UPDATE and applied in the same transaction,
+and the response cache is invalidated once per batch.
+"""
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Coalesce, Greatest, Round
+from django.utils import timezone
+
+from apps.tenants.services.response_cache import GLOBAL_SCOPE, bump_version
+
+from . import facets, stats
+
+STATUS_ACTIONS = {'publish': 'published', 'unpublish': 'draft', 'archive': 'archived'}
+FEATURE_ACTIONS = {'feature': True, 'unfeature': False}
+ACTIONS = tuple(STATUS_ACTIONS) + tuple(FEATURE_ACTIONS) + ('reprice',)
+
+
+class BulkActionError(ValueError):
+    """The requested action or its parameters are invalid"""
+
+
+def _decimal(value, name):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        raise BulkActionError(f"'{name}' must be a number")
+
+
+def price_expression(percent=None, amount=None):
+    """New price as an expression over the current one, never below zero"""
+    if (percent is None) == (amount is None):
+        raise BulkActionError("Reprice needs exactly one of 'percent' or 'amount'")
+    money = DecimalField(max_digits=10, decimal_places=2)
+    if percent is not None:
+        percent = _decimal(percent, 'percent')
+        if percent <= -100:
+            raise BulkActionError("'percent' must be greater than -100")
+        price = Round(F('price') * Value(1 + percent / 100, output_field=money), 2, output_field=money)
+    else:
+        price = F('price') + Value(_decimal(amount, 'amount'), output_field=money)
+    return Greatest(price, Value(Decimal('0.00'), output_field=money), output_field=money)
+
+
+def run_bulk_action(tenant, products, action, percent=None, amount=None):
+    """Apply ``action`` to the tenant's rows in ``products``; return the number changed"""
+    products = products.filter(tenant=tenant).order_by()
+    now = timezone.now()
+
+    if action in STATUS_ACTIONS:
+        new_status = STATUS_ACTIONS[action]
+        changes = {'status': new_status}
+        if new_status == 'published':
+            changes['published_at'] = Coalesce(F('published_at'), Value(now))
+        products = products.exclude(status=new_status)
+    elif action in FEATURE_ACTIONS:
+        changes = {'is_featured': FEATURE_ACTIONS[action]}
+        products = products.exclude(is_featured=FEATURE_ACTIONS[action])
+    elif action == 'reprice':
+        changes = {'price': price_expression(percent, amount)}
+    else:
+        raise BulkActionError(f"Unknown action '{action}'. Choose one of: {', '.join(ACTIONS)}")
+
+    with transaction.atomic():
+        if action not in FEATURE_ACTIONS and connection.features.has_select_for_update:
+            # Hold the rows so the deltas below still describe them at UPDATE time
+            list(products.select_for_update().order_by('pk').values_list('pk', flat=True))
+        # Status and price both feed the facet table; only status the stats
+        facet_deltas, stat_deltas = Counter(), Counter()
+        if action in STATUS_ACTIONS:
+            facet_deltas = facets.status_change_deltas(products, new_status)
+            stat_deltas = stats.status_change_deltas(products, new_status)
+        elif action == 'reprice':
+            facet_deltas = facets.price_change_deltas(products, changes['price'])
+        updated = products.update(updated_at=now, **changes)
+        if updated:
+            facets.apply_deltas(facet_deltas)
+            stats.apply_deltas(stat_deltas)
+    if updated:
+        bump_version(tenant.pk, GLOBAL_SCOPE)
+    return updated
@@ -0,0 +1,128 @@
+"""
+Collision-free SKU / barcode allocation.
+
+Each tenant owns a ProductCodeSequence row. Reserving N codes is a single
+``UPDATE ... SET next_value = next_value + N`` that returns the new value,
+so the range [next_value - N, next_value) belongs to the caller alone: no
+probing ``exists()`` queries, and concurrent creates serialize on one row
+lock per tenant instead of racing the unique constraint. Backends without
+UPDATE ... RETURNING lock the row with SELECT ... FOR UPDATE and bump it.
+
+Codes look like ``SHO-GEN-1A-000042`` (SKU) and ``MTE1A-000042`` (barcode),
+where ``1A`` is the sequence row id in base 36. That makes codes globally
+unique even though the counters are per tenant. The dashes also keep them
+apart from the older random codes.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from apps.tenants.models import Tenant
+from .models import ProductCodeSequence
+
+CodeBlock = namedtuple('CodeBlock', ['prefix', 'tenant_code', 'values'])
+
+_BASE36 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def base36(number):
+    digits = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        digits = _BASE36[remainder] + digits
+        if not number:
+            return digits
+
+
+def _name_prefix(name, default):
+    return (name or '')[:3].upper() or default
+
+
+def format_sku(block, value, category=None):
+    category_prefix = _name_prefix(category.name, 'GEN') if category else 'GEN'
+    return f"{block.prefix}-{category_prefix}-{block.tenant_code}-{value:06d}"
+
+
+def format_barcode(block, value):
+    return f"MTE{block.tenant_code}-{value:06d}"
+
+
+def _can_return_from_update():
+    # Django has no feature flag for UPDATE ... RETURNING (MariaDB, for one,
+    # returns from INSERT but not UPDATE), so name the backends that do
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
+def _advance(tenant_id, count):
+    """Bump the tenant's counter by count; return (id, prefix, next_value) or None"""
+    if _can_return_from_update():
+        table = ProductCodeSequence._meta.db_table
+        db_tenant_id = ProductCodeSequence._meta.get_field('tenant').get_db_prep_value(tenant_id, connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET next_value = next_value + %s WHERE tenant_id = %s '
+                'RETURNING id, prefix, next_value',
+                [count, db_tenant_id],
+            )
+            return cursor.fetchone()
+
+    # Elsewhere: lock the row, then bump it (reserve() holds the transaction)
+    row = (ProductCodeSequence.objects.select_for_update().filter(tenant_id=tenant_id)
+           .values_list('id', 'prefix', 'next_value').first())
+    if row is None:
+        return None
+    sequence_id, prefix, next_value = row
+    ProductCodeSequence.objects.filter(pk=sequence_id).update(next_value=F('next_value') + count)
+    return sequence_id, prefix, next_value + count
+
+
+def reserve(tenant, count=1):
+    """Reserve ``count`` consecutive code values for a tenant (1 query once warm)"""
+    if count < 1:
+        raise ValueError('count must be at least 1')
+    tenant_id = getattr(tenant, 'pk', tenant)
+
+    with transaction.atomic(savepoint=False):
+        row = _advance(tenant_id, count)
+        if row is None:
+            name = getattr(tenant, 'name', None)
+            if name is None:
+                name = Tenant.objects.filter(pk=tenant_id).values_list('name', flat=True).first()
+                if name is None:
+                    raise ValueError(f'No tenant {tenant_id!r} to reserve product codes for')
+            try:
+                with transaction.atomic():
+                    ProductCodeSequence.objects.create(tenant_id=tenant_id, prefix=_name_prefix(name, 'TEN'))
+            except IntegrityError:
+                # Another request created the sequence first; just use it
+                pass
+            row = _advance(tenant_id, count)
+            if row is None:
+                raise ValueError(f'Could not create a product code sequence for tenant {tenant_id!r}')
+
+    sequence_id, prefix, end = row
+    return CodeBlock(prefix, base36(sequence_id), range(end - count, end))
+
+
+def assign_codes(products):
+    """
+    Fill in missing SKUs/barcodes for products, one reservation per tenant.
+    Used by Product.save() and by bulk paths before bulk_create().
+    """
+    pending = defaultdict(list)
+    for product in products:
+        if not product.sku or not product.barcode:
+            pending[product.tenant_id].append(product)
+
+    for tenant_id, tenant_products in pending.items():
+        first = tenant_products[0]
+        tenant = first.tenant if type(first).tenant.is_cached(first) else tenant_id
+        block = reserve(tenant, len(tenant_products))
+        for product, value in zip(tenant_products, block.values):
+            if not product.sku:
+                product.sku = format_sku(block, value, product.Category if product.Category_id else None)
+            if not product.barcode:
+                product.barcode = format_barcode(block, value)
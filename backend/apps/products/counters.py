@@ -0,0 +1,29 @@
+"""
+Shared upsert for the precomputed counter tables (facets.py, stats.py).
+
+Counters move by deltas: one ``UPDATE ... SET field = field + delta`` per
+row, issued in lookup order so concurrent writers lock rows in the same
+order. What happens when the row does not exist yet is up to the caller.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def apply_counter_deltas(model, rows, missing):
+    """
+    Add ``rows`` of (lookup, {field: delta}) to ``model``'s counter rows.
+    ``missing(lookup, deltas)`` is called for rows the UPDATE did not find.
+    """
+    for lookup, deltas in sorted(rows, key=lambda row: tuple(row[0].values())):
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if changes and not model.objects.filter(**lookup).update(**changes):
+            missing(lookup, deltas)
+
+
+def create_counter(model, lookup, values):
+    """Insert a counter row, or add to it if a concurrent writer created it first"""
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **values)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**{field: F(field) + value for field, value in values.items()})
@@ -0,0 +1,263 @@
+"""
+Facet counts (category, price bucket, stock state) for product listings.
+
+Counts for a tenant's unfiltered catalog live in ProductFacetCount and are
+kept current by applying +1/-1 deltas from the Product signals, so the
+storefront grid never has to GROUP BY the products table. Filtered listings
+are aggregated on the fly from the filtered queryset.
+"""
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, CharField, Count, Q, Sum, Value, When
+
+from .counters import apply_counter_deltas, create_counter
+from .models import Category, Product, ProductFacetCount
+
+# Price buckets as [low, high) in store currency; None means open-ended
+PRICE_BUCKETS = [
+    (0, 500),
+    (500, 1000),
+    (1000, 2500),
+    (2500, 5000),
+    (5000, 10000),
+    (10000, None),
+]
+
+FACET_FIELDS = ('tenant_id', 'status', 'Category_id', 'price', 'track_quantity', 'stock_quantity')
+
+
+def bucket_label(low, high):
+    return f'{low}+' if high is None else f'{low}-{high}'
+
+
+def bucket_bounds(label):
+    """Return (low, high) for a bucket label, or None if it is not one of ours"""
+    for low, high in PRICE_BUCKETS:
+        if bucket_label(low, high) == label:
+            return low, high
+    return None
+
+
+def price_bucket(price):
+    try:
+        price = Decimal(str(price))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    for low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return bucket_label(low, high)
+    return None
+
+
+def stock_state(track_quantity, stock_quantity):
+    # Mirrors ProductSerializer.get_in_stock
+    if not track_quantity:
+        return 'in_stock'
+    try:
+        return 'in_stock' if int(stock_quantity) > 0 else 'out_of_stock'
+    except (TypeError, ValueError):
+        return 'out_of_stock'
+
+
+def facet_keys(product):
+    """The (tenant_id, status, facet, value) rows a product contributes to"""
+    if product.tenant_id is None:
+        return ()
+    keys = [
+        (product.tenant_id, product.status, 'category', str(product.Category_id) if product.Category_id else 'none'),
+        (product.tenant_id, product.status, 'stock', stock_state(product.track_quantity, product.stock_quantity)),
+    ]
+    bucket = price_bucket(product.price)
+    if bucket:
+        keys.append((product.tenant_id, product.status, 'price', bucket))
+    return tuple(keys)
+
+
+def snapshot(product):
+    """Remember the facet keys a product had when it was loaded"""
+    if product.get_deferred_fields().intersection(FACET_FIELDS):
+        # Touching deferred fields here would cost a query per instance
+        product._facet_keys = None
+    else:
+        product._facet_keys = facet_keys(product)
+
+
+def _create_facet_row(lookup, deltas):
+    if deltas['count'] > 0:
+        create_counter(ProductFacetCount, lookup, deltas)
+
+
+def apply_deltas(deltas):
+    """Apply a Counter of {(tenant_id, status, facet, value): delta} to the table"""
+    rows = [
+        ({'tenant_id': tenant_id, 'status': status, 'facet': facet, 'value': value}, {'count': delta})
+        for (tenant_id, status, facet, value), delta in deltas.items() if delta
+    ]
+    apply_counter_deltas(ProductFacetCount, rows, _create_facet_row)
+
+
+def product_saved(product, created):
+    old_keys = () if created else getattr(product, '_facet_keys', None)
+    if old_keys is None:
+        # We do not know what the row looked like before; recount the tenant
+        rebuild_facets(product.tenant_id)
+    else:
+        new_keys = facet_keys(product)
+        if set(old_keys) != set(new_keys):
+            deltas = Counter(new_keys)
+            deltas.subtract(Counter(old_keys))
+            apply_deltas(deltas)
+    product._facet_keys = facet_keys(product)
+
+
+def product_deleted(product):
+    old_keys = getattr(product, '_facet_keys', None)
+    if old_keys is None:
+        rebuild_facets(product.tenant_id)
+        return
+    deltas = Counter()
+    deltas.subtract(Counter(old_keys))
+    apply_deltas(deltas)
+
+
+def _price_bucket_expression(field='price'):
+    whens = []
+    for low, high in PRICE_BUCKETS:
+        condition = Q(**{f'{field}__gte': low}) if high is None else Q(**{f'{field}__gte': low, f'{field}__lt': high})
+        whens.append(When(condition, then=Value(bucket_label(low, high))))
+    return Case(*whens, default=Value(''), output_field=CharField())
+
+
+def _in_stock_q():
+    return Q(track_quantity=False) | Q(stock_quantity__gt=0)
+
+
+def status_change_deltas(queryset, new_status):
+    """
+    Facet deltas for moving every row of ``queryset`` to ``new_status``,
+    aggregated from the rows before the UPDATE (1 query)
+    """
+    rows = queryset.order_by().annotate(
+        bucket=_price_bucket_expression(),
+        in_stock=Case(When(_in_stock_q(), then=Value(True)), default=Value(False), output_field=BooleanField()),
+    ).values('tenant_id', 'status', 'Category_id', 'bucket', 'in_stock').annotate(n=Count('id'))
+    deltas = Counter()
+    for row in rows:
+        values = [
+            ('category', str(row['Category_id']) if row['Category_id'] else 'none'),
+            ('stock', 'in_stock' if row['in_stock'] else 'out_of_stock'),
+        ]
+        if row['bucket']:
+            values.append(('price', row['bucket']))
+        for facet, value in values:
+            deltas[(row['tenant_id'], row['status'], facet, value)] -= row['n']
+            deltas[(row['tenant_id'], new_status, facet, value)] += row['n']
+    return deltas
+
+
+def price_change_deltas(queryset, new_price):
+    """
+    Facet deltas for setting every row of ``queryset`` to the expression
+    ``new_price``, aggregated from the rows before the UPDATE (1 query)
+    """
+    rows = queryset.order_by().alias(new_price=new_price).annotate(
+        old_bucket=_price_bucket_expression(),
+        new_bucket=_price_bucket_expression('new_price'),
+    ).values('tenant_id', 'status', 'old_bucket', 'new_bucket').annotate(n=Count('id'))
+    deltas = Counter()
+    for row in rows:
+        if row['old_bucket'] == row['new_bucket']:
+            continue
+        if row['old_bucket']:
+            deltas[(row['tenant_id'], row['status'], 'price', row['old_bucket'])] -= row['n']
+        if row['new_bucket']:
+            deltas[(row['tenant_id'], row['status'], 'price', row['new_bucket'])] += row['n']
+    return deltas
+
+
+def count_facets(queryset):
+    """Aggregate facet counts for an arbitrary product queryset (2 queries)"""
+    facets = {'category': Counter(), 'price': Counter(), 'stock': Counter()}
+
+    for row in queryset.order_by().values('Category_id').annotate(n=Count('id')):
+        value = str(row['Category_id']) if row['Category_id'] else 'none'
+        facets['category'][value] += row['n']
+
+    aggregates = {
+        bucket_label(low, high): Count('id', filter=Q(price__gte=low) if high is None else Q(price__gte=low, price__lt=high))
+        for low, high in PRICE_BUCKETS
+    }
+    aggregates['in_stock'] = Count('id', filter=_in_stock_q())
+    aggregates['out_of_stock'] = Count('id', filter=~_in_stock_q())
+    totals = queryset.order_by().aggregate(**aggregates)
+    for low, high in PRICE_BUCKETS:
+        facets['price'][bucket_label(low, high)] = totals[bucket_label(low, high)]
+    facets['stock']['in_stock'] = totals['in_stock']
+    facets['stock']['out_of_stock'] = totals['out_of_stock']
+    return facets
+
+
+def stored_facets(tenant, status=None):
+    """Read the precomputed counts for a tenant's catalog (1 query)"""
+    rows = ProductFacetCount.objects.filter(tenant=tenant, count__gt=0)
+    if status:
+        rows = rows.filter(status=status)
+    facets = {'category': Counter(), 'price': Counter(), 'stock': Counter()}
+    for row in rows.values('facet', 'value').annotate(total=Sum('count')).order_by():
+        facets[row['facet']][row['value']] += row['total']
+    return facets
+
+
+def format_facets(facets):
+    """Shape raw counters for the API, naming categories and ordering buckets"""
+    category_ids = [value for value in facets['category'] if value != 'none']
+    names = dict(Category.objects.filter(id__in=category_ids).values_list('id', 'name')) if category_ids else {}
+    names = {str(pk): name for pk, name in names.items()}
+
+    categories = [
+        {'value': value, 'name': names.get(value, 'Uncategorized'), 'count': count}
+        for value, count in facets['category'].items() if count
+    ]
+    categories.sort(key=lambda item: (-item['count'], item['name']))
+
+    return {
+        'category': categories,
+        'price': [
+            {'value': bucket_label(low, high), 'count': facets['price'][bucket_label(low, high)]}
+            for low, high in PRICE_BUCKETS
+        ],
+        'stock': [
+            {'value': value, 'count': facets['stock'][value]}
+            for value in ('in_stock', 'out_of_stock')
+        ],
+    }
+
+
+@transaction.atomic
+def rebuild_facets(tenant_id):
+    """Recount one tenant's facets from the products table"""
+    products = Product.objects.filter(tenant_id=tenant_id).order_by()
+    rows = Counter()
+
+    for row in products.values('status', 'Category_id').annotate(n=Count('id')):
+        value = str(row['Category_id']) if row['Category_id'] else 'none'
+        rows[(row['status'], 'category', value)] += row['n']
+
+    for row in products.annotate(bucket=_price_bucket_expression()).values('status', 'bucket').annotate(n=Count('id')):
+        if row['bucket']:
+            rows[(row['status'], 'price', row['bucket'])] += row['n']
+
+    for row in products.values('status').annotate(
+        in_stock=Count('id', filter=_in_stock_q()),
+        out_of_stock=Count('id', filter=~_in_stock_q()),
+    ):
+        rows[(row['status'], 'stock', 'in_stock')] += row['in_stock']
+        rows[(row['status'], 'stock', 'out_of_stock')] += row['out_of_stock']
+
+    ProductFacetCount.objects.filter(tenant_id=tenant_id).delete()
+    ProductFacetCount.objects.bulk_create([
+        ProductFacetCount(tenant_id=tenant_id, status=status, facet=facet, value=value, count=count)
+        for (status, facet, value), count in rows.items() if count
+    ])
@@ -0,0 +1,56 @@
+import django_filters
+from django.db.models import Q
+
+from apps.tenants.services.response_cache import tenant_id_for_subdomain
+
+from .facets import bucket_bounds
+from .models import Category, Product
+
+
+class ProductFilter(django_filters.FilterSet):
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    price_bucket = django_filters.CharFilter(method='filter_price_bucket')
+    in_stock = django_filters.BooleanFilter(method='filter_in_stock')
+    category__descendant_of = django_filters.UUIDFilter(method='filter_descendant_of')
+
+    class Meta:
+        model = Product
+        fields = ['status', 'Category', 'is_featured']
+
+    def filter_price_bucket(self, queryset, name, value):
+        bounds = bucket_bounds(value)
+        if bounds is None:
+            return queryset.none()
+        low, high = bounds
+        queryset = queryset.filter(price__gte=low)
+        if high is not None:
+            queryset = queryset.filter(price__lt=high)
+        return queryset
+
+    def filter_in_stock(self, queryset, name, value):
+        in_stock = Q(track_quantity=False) | Q(stock_quantity__gt=0)
+        return queryset.filter(in_stock if value else ~in_stock)
+
+    def listing_tenant_id(self):
+        """The store the listing is for: ?vendor=, else the subdomain's tenant"""
+        request = self.request
+        if request is None:
+            return None
+        if request.GET.get('vendor'):
+            return tenant_id_for_subdomain(request.GET['vendor'])
+        tenant = getattr(request, 'tenant', None)
+        return tenant.pk if tenant else None
+
+    def filter_descendant_of(self, queryset, name, value):
+        # The category itself and everything under it: products whose
+        # category path starts with the ancestor's. The path is passed as a
+        # literal so the LIKE 'prefix%' can use the varchar_pattern_ops index
+        ancestors = Category.objects.filter(pk=value)
+        tenant_id = self.listing_tenant_id()
+        if tenant_id is not None:
+            ancestors = ancestors.filter(tenant_id=tenant_id)
+        path = ancestors.values_list('path', flat=True).first()
+        if not path:
+            return queryset.none()
+        return queryset.filter(Category__path__startswith=path)
@@ -0,0 +1,108 @@
+"""
+Product image storage and precomputed image URLs.
+
+Product images go through the ``product_images`` entry of settings.STORAGES:
+CloudinaryImageStorage (here) or the local ContentAddressedStorage
+(media.py). Either is a Django Storage whose save() returns the value kept
+in Product.image and whose image_urls() maps that value to the canonical
+URL plus a fixed set of responsive variants, so Product.save() never needs
+to know which one is configured.
+
+The URLs are built once, when a product's image changes, and stored in
+Product.image_urls. Serializers read that dict, so listings make no
+per-object SDK calls. Building a Cloudinary URL is pure string work; no
+network is involved.
+"""
+from cloudinary import CloudinaryResource, uploader
+from cloudinary.models import CloudinaryField
+from cloudinary_storage.storage import MediaCloudinaryStorage
+from django.core.files.storage import storages
+
+# Cloudinary transformations per variant; f_auto/q_auto pick format/quality per browser
+IMAGE_VARIANTS = {
+    'thumb': {'width': 160, 'height': 160, 'crop': 'fill'},
+    'card': {'width': 480, 'height': 480, 'crop': 'fill'},
+    'zoom': {'width': 1600, 'height': 1600, 'crop': 'limit'},
+}
+_AUTO = {'fetch_format': 'auto', 'quality': 'auto'}
+
+# Parses stored values like "image/upload/v123/products/abc.jpg"
+_FIELD = CloudinaryField('image')
+
+
+def image_source(image):
+    """A stable string identifying the stored image ('' when there is none)"""
+    if not image:
+        return ''
+    if isinstance(image, dict):
+        return image.get('public_id', '')
+    return str(image)
+
+
+def _transformation(options):
+    parts = {
+        'c': options.get('crop'), 'w': options.get('width'), 'h': options.get('height'),
+        'f': 'auto', 'q': 'auto',
+    }
+    return ','.join(f'{key}_{value}' for key, value in sorted(parts.items()) if value)
+
+
+def _url_variants(url):
+    # A full Cloudinary delivery URL: splice the transformation in after /upload/
+    if '/upload/' not in url:
+        return {name: url for name in IMAGE_VARIANTS}
+    head, tail = url.split('/upload/', 1)
+    return {
+        name: f'{head}/upload/{_transformation(options)}/{tail}'
+        for name, options in IMAGE_VARIANTS.items()
+    }
+
+
+def cloudinary_image_urls(image):
+    """Return {'original', 'thumb', 'card', 'zoom'} URLs for a Cloudinary image value ({} if none)"""
+    if isinstance(image, dict):
+        if not image.get('public_id'):
+            return {}
+        image = CloudinaryResource(image['public_id'], type='upload', resource_type='image')
+    if isinstance(image, str):
+        if image.startswith('http'):
+            return {'original': image, **_url_variants(image)}
+        image = _FIELD.to_python(image)
+    if not isinstance(image, CloudinaryResource):
+        return {}
+
+    urls = {'original': image.build_url(secure=True)}
+    for name, options in IMAGE_VARIANTS.items():
+        urls[name] = image.build_url(secure=True, **options, **_AUTO)
+    return urls
+
+
+class CloudinaryImageStorage(MediaCloudinaryStorage):
+    """
+    Cloudinary for product images. save() uploads the way CloudinaryField
+    does and returns the field's value ("image/upload/v1/products/x.jpg").
+    """
+
+    def __init__(self, folder='products/', **kwargs):
+        super().__init__(**kwargs)
+        self.folder = folder
+
+    def _save(self, name, content):
+        if hasattr(content, 'seekable') and content.seekable():
+            content.seek(0)
+        resource = uploader.upload_resource(content, type='upload', resource_type='image', folder=self.folder)
+        return resource.get_prep_value()
+
+    def image_urls(self, image):
+        return cloudinary_image_urls(image)
+
+
+def product_image_storage():
+    return storages['product_images']
+
+
+def build_image_urls(image):
+    """Return {'original', 'thumb', 'card', 'zoom'} URLs for an image value ({} if none)"""
+    if not image:
+        return {}
+    return product_image_storage().image_urls(image)
@@ -0,0 +1,292 @@
+"""
+Bulk product import from CSV or JSON Lines uploads.
+
+Rows are read lazily from the upload, validated against the Product model
+fields and written with ``bulk_create`` one chunk at a time, so memory stays
+bounded by the chunk size rather than the file size. A bad row is reported
+and skipped; it never aborts the rest of the file.
+
+bulk_create() does not send post_save, so each chunk does what the Product
+signals would have done for it: SKU/barcode allocation (one reservation per
+chunk), search indexing, facet counts, dashboard stats and low-stock
+alerts. The tenant's response cache version is bumped once at the end.
+"""
+import codecs
+import csv
+import json
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.tenants.services.response_cache import GLOBAL_SCOPE, bump_version
+
+from . import alerts, facets, search, stats
+from .codes import assign_codes
+from .models import Category, Product
+
+# Columns we accept, besides ``category`` (a category name)
+IMPORT_FIELDS = (
+    'name', 'description', 'price', 'compare_at_price', 'cost_price',
+    'sku', 'barcode', 'track_quantity', 'stock_quantity', 'allow_backorder',
+    'is_active', 'status', 'is_featured', 'seo_title', 'seo_description',
+)
+REQUIRED_FIELDS = ('name', 'price')
+BOOLEAN_FIELDS = ('track_quantity', 'allow_backorder', 'is_active', 'is_featured')
+
+_TRUE = {'1', 'true', 't', 'yes', 'y', 'on'}
+_FALSE = {'0', 'false', 'f', 'no', 'n', 'off'}
+
+
+class ImportFileError(Exception):
+    """The upload itself cannot be read (bad encoding, unknown format...)"""
+
+
+def detect_format(upload, requested=None):
+    fmt = (requested or '').lower()
+    if not fmt:
+        name = (getattr(upload, 'name', '') or '').lower()
+        fmt = 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+    if fmt in ('ndjson', 'json'):
+        fmt = 'jsonl'
+    if fmt not in ('csv', 'jsonl'):
+        raise ImportFileError(f"Unsupported format '{fmt}'. Use csv or jsonl.")
+    return fmt
+
+
+def read_rows(upload, fmt):
+    """
+    Yield (row_number, data, error) for each record in the upload. Exactly one
+    of data / error is set. Row numbers count records, starting at 1.
+    """
+    lines = codecs.iterdecode(upload, 'utf-8-sig')
+    try:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(lines), start=1):
+                if None in row:
+                    yield number, None, {'non_field_errors': ['Row has more columns than the header.']}
+                else:
+                    yield number, row, None
+        else:
+            number = 0
+            for line in lines:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    data = json.loads(line)
+                except ValueError as e:
+                    yield number, None, {'non_field_errors': [f'Invalid JSON: {e}']}
+                    continue
+                if isinstance(data, dict):
+                    yield number, data, None
+                else:
+                    yield number, None, {'non_field_errors': ['Each line must be a JSON object.']}
+    except UnicodeDecodeError:
+        raise ImportFileError('File is not valid UTF-8.')
+    except csv.Error as e:
+        raise ImportFileError(f'Malformed CSV: {e}')
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValidationError(f"'{value}' is not a valid boolean.")
+
+
+def clean_row(data):
+    """Validate one record; return Product field values or raise ValidationError"""
+    values = {}
+    errors = {}
+    for name in IMPORT_FIELDS:
+        raw = data.get(name)
+        if _blank(raw):
+            if name in REQUIRED_FIELDS:
+                errors[name] = ['This field is required.']
+            continue
+        field = Product._meta.get_field(name)
+        try:
+            if name in BOOLEAN_FIELDS:
+                raw = _to_bool(raw)
+            elif isinstance(raw, str):
+                raw = raw.strip()
+            values[name] = field.clean(raw, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+
+    category = data.get('category')
+    if not _blank(category):
+        values['category'] = str(category).strip()[:255]
+
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+class ProductImporter:
+    """Import rows into one tenant's catalog, chunk_size rows per write"""
+
+    def __init__(self, tenant, vendor=None, chunk_size=500, max_errors=1000):
+        self.tenant = tenant
+        self.vendor = vendor
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.seen_codes = {'sku': set(), 'barcode': set()}
+        self.categories = {
+            category.name.lower(): category
+            for category in Category.objects.filter(tenant=tenant)
+        }
+
+    def run(self, rows):
+        """Consume (row_number, data, error) tuples and return a summary dict"""
+        chunk = []
+        try:
+            for number, data, error in rows:
+                if error:
+                    self.add_error(number, error)
+                    continue
+                chunk.append((number, data))
+                if len(chunk) >= self.chunk_size:
+                    self.write_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self.write_chunk(chunk)
+        finally:
+            if self.created:
+                bump_version(self.tenant.pk, GLOBAL_SCOPE)
+        return self.summary()
+
+    def summary(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+    def add_error(self, number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def write_chunk(self, chunk):
+        cleaned = []
+        for number, data in chunk:
+            try:
+                cleaned.append((number, clean_row(data)))
+            except ValidationError as e:
+                self.add_error(number, e.message_dict)
+
+        cleaned = self.drop_duplicate_codes(cleaned)
+        self.resolve_categories(values for _, values in cleaned)
+
+        now = timezone.now()
+        rows = []
+        for number, values in cleaned:
+            category = values.pop('category', None)
+            product = Product(tenant=self.tenant, vendor=self.vendor, **values)
+            if category:
+                product.Category = self.categories.get(category.lower())
+            if product.status == 'published' and not product.published_at:
+                product.published_at = now
+            rows.append((number, product))
+
+        if not rows:
+            return
+        products = [product for _, product in rows]
+        provided = [(product.sku, product.barcode) for product in products]
+        try:
+            with transaction.atomic():
+                assign_codes(products)
+                Product.objects.bulk_create(products, batch_size=self.chunk_size)
+                self.after_insert(products)
+        except IntegrityError:
+            # A concurrent writer took one of the SKUs/barcodes between our
+            # check and the insert; fall back to row-by-row for this chunk.
+            # The code reservation was rolled back too, so allocate again.
+            for product, (sku, barcode) in zip(products, provided):
+                product.sku, product.barcode = sku, barcode
+            self.write_rows(rows)
+            return
+        self.created += len(products)
+
+    def write_rows(self, rows):
+        for number, product in rows:
+            sku, barcode = product.sku, product.barcode
+            try:
+                with transaction.atomic():
+                    assign_codes([product])
+                    Product.objects.bulk_create([product])
+                    self.after_insert([product])
+            except IntegrityError:
+                product.sku, product.barcode = sku, barcode
+                self.add_error(number, {'non_field_errors': ['SKU or barcode already exists.']})
+            else:
+                self.created += 1
+
+    def after_insert(self, products):
+        """What the post_save signals would have done for these rows"""
+        search.index_products(products, created=True)
+        deltas = Counter()
+        stat_deltas = Counter()
+        for product in products:
+            deltas.update(facets.facet_keys(product))
+            stat_deltas.update(stats.key_deltas(stats.stats_key(product), 1))
+        facets.apply_deltas(deltas)
+        stats.apply_deltas(stat_deltas)
+        alerts.reconcile(products, created=True)
+
+    def drop_duplicate_codes(self, cleaned):
+        """Reject rows whose SKU/barcode is taken, in the database or earlier in the file"""
+        taken = {}
+        for field in ('sku', 'barcode'):
+            codes = {values[field] for _, values in cleaned if values.get(field)}
+            taken[field] = set(
+                Product.objects.filter(**{f'{field}__in': codes}).values_list(field, flat=True)
+            ) if codes else set()
+        seen = self.seen_codes
+
+        kept = []
+        for number, values in cleaned:
+            errors = {}
+            for field in ('sku', 'barcode'):
+                code = values.get(field)
+                if code and (code in taken[field] or code in seen[field]):
+                    errors[field] = [f'A product with this {field} already exists.']
+            if errors:
+                self.add_error(number, errors)
+                continue
+            for field in ('sku', 'barcode'):
+                if values.get(field):
+                    seen[field].add(values[field])
+            kept.append((number, values))
+        return kept
+
+    def resolve_categories(self, rows):
+        """Create any categories named in the chunk that the tenant lacks"""
+        missing = {}
+        for values in rows:
+            name = values.get('category')
+            if name and name.lower() not in self.categories:
+                missing.setdefault(name.lower(), name)
+        if not missing:
+            return
+        new_categories = [Category(tenant=self.tenant, name=name) for name in missing.values()]
+        for category in new_categories:
+            category.set_path()
+        Category.objects.bulk_create(new_categories, ignore_conflicts=True)
+        for category in Category.objects.filter(tenant=self.tenant, name__in=missing.values()):
+            self.categories[category.name.lower()] = category
@@ -0,0 +1,178 @@
+"""
+Atomic stock reservation for checkout.
+
+A cart is reserved with two statements, however many lines it has. First
+the tracked rows are locked in product id order (SELECT ... FOR UPDATE),
+so two carts holding the same products lock them in the same order and
+cannot deadlock; short lines are reported from the locked values. Then a
+single conditional UPDATE takes every line:
+
+    UPDATE products SET stock_quantity = stock_quantity - CASE id WHEN ? THEN n ... END
+    WHERE id IN (...) AND track_quantity
+      AND (allow_backorder OR stock_quantity >= CASE id WHEN ? THEN n ... END)
+
+The condition is evaluated under the row lock as well. On a backend
+without row locks (SQLite, which locks the whole database on its first
+write) the UPDATE runs first and alone decides; a savepoint undoes a
+short cart so the failing line can still be named. Either way two
+checkouts can never both take the last unit, and if anything fails the
+surrounding transaction rolls the whole cart back.
+
+Untracked products are never touched. QuerySet.update() skips post_save,
+so facet counts, stats and the response cache are brought up to date here,
+and only for products whose stock state actually changed. Each call also
+appends its movements to the stock ledger (ledger.py) with one INSERT and
+opens or resolves low-stock alerts for threshold crossings (alerts.py).
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from apps.tenants.services.response_cache import GLOBAL_SCOPE, bump_version
+
+from . import alerts, facets, ledger, stats
+from .models import Product
+
+
+class InsufficientStock(Exception):
+    """Raised when a tracked product cannot cover the requested quantity"""
+
+    def __init__(self, product_id, requested):
+        self.product_id = product_id
+        self.requested = requested
+        super().__init__(f'Insufficient stock for product {product_id}: requested {requested}')
+
+
+def _quantities(lines):
+    """Sum (product, quantity) lines per product id, tracked products only"""
+    totals = Counter()
+    for product, quantity in lines:
+        if product.track_quantity and quantity:
+            totals[product.pk] += quantity
+    return totals
+
+
+def _per_product(quantities):
+    """CASE expression yielding each product's quantity inside one multi-row UPDATE"""
+    whens = [When(pk=product_id, then=Value(quantity)) for product_id, quantity in sorted(quantities.items())]
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def _lock_rows(product_ids):
+    """Lock tracked product rows in id order; returns (id, stock_quantity, allow_backorder)"""
+    return list(
+        Product.objects.select_for_update().filter(pk__in=product_ids, track_quantity=True)
+        .order_by('pk').values_list('pk', 'stock_quantity', 'allow_backorder')
+    )
+
+
+def _check_stock(rows, quantities):
+    """Raise InsufficientStock for the first of ``rows`` that cannot cover its quantity"""
+    for product_id, stock_quantity, allow_backorder in rows:
+        if not allow_backorder and stock_quantity < quantities[product_id]:
+            raise InsufficientStock(product_id, quantities[product_id])
+
+
+def _take_stock(quantities):
+    amount = _per_product(quantities)
+    return Product.objects.filter(
+        Q(allow_backorder=True) | Q(stock_quantity__gte=amount),
+        pk__in=quantities, track_quantity=True,
+    ).update(stock_quantity=F('stock_quantity') - amount)
+
+
+def reserve_stock(lines, reference=''):
+    """
+    Take stock for (product, quantity) lines, all or nothing, recording the
+    sale against ``reference`` (e.g. the order id). Raises InsufficientStock
+    (and reserves nothing) if a line cannot be met.
+    """
+    quantities = _quantities(lines)
+    if not quantities:
+        return quantities
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            rows = _lock_rows(quantities)
+            _check_stock(rows, quantities)
+            quantities = Counter({product_id: quantities[product_id] for product_id, _, _ in rows})
+            if _take_stock(quantities) != len(quantities):
+                raise InsufficientStock(min(quantities), quantities[min(quantities)])
+        else:
+            savepoint = transaction.savepoint()
+            if _take_stock(quantities) != len(quantities):
+                transaction.savepoint_rollback(savepoint)
+                rows = _lock_rows(quantities)
+                _check_stock(rows, quantities)
+                # Otherwise a product stopped tracking stock mid-checkout
+                product_id = min(set(quantities) - {row[0] for row in rows})
+                raise InsufficientStock(product_id, quantities[product_id])
+            transaction.savepoint_commit(savepoint)
+
+        deltas = {product_id: -quantity for product_id, quantity in quantities.items()}
+        ledger.record_movements('sale', stock_changed(deltas), deltas, reference)
+    return quantities
+
+
+def release_stock(lines, reference=''):
+    """Give back stock taken by reserve_stock(), e.g. on cancellation"""
+    quantities = _quantities(lines)
+    if not quantities:
+        return quantities
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            quantities = Counter({product_id: quantities[product_id] for product_id, _, _ in _lock_rows(quantities)})
+        Product.objects.filter(pk__in=quantities, track_quantity=True).update(
+            stock_quantity=F('stock_quantity') + _per_product(quantities),
+        )
+        ledger.record_movements('return', stock_changed(quantities), quantities, reference)
+    return quantities
+
+
+def adjust_stock(product, quantity, kind, reference='', user=None):
+    """
+    Move one product's stock by ``quantity`` (restocks, counts, customer
+    returns) and record it. Returns the stock level after the change.
+    """
+    with transaction.atomic():
+        Product.objects.filter(pk=product.pk).update(stock_quantity=F('stock_quantity') + quantity)
+        changed = stock_changed({product.pk: quantity})
+        ledger.record_movements(kind, changed, {product.pk: quantity}, reference, user)
+    if changed:
+        product.stock_quantity = changed[0].stock_quantity
+    return product.stock_quantity
+
+
+def stock_changed(deltas):
+    """
+    Bring derived data up to date after stock_quantity moved by ``deltas``
+    ({product_id: change}) behind the ORM's back. One SELECT, plus counter
+    updates only for products that crossed a stock state boundary.
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return []
+
+    facet_deltas = Counter()
+    stat_deltas = Counter()
+    tenants = set()
+    products = list(Product.objects.filter(pk__in=deltas))
+    for product in products:
+        tenants.add(product.tenant_id)
+        new_facets, new_stats = facets.facet_keys(product), stats.stats_key(product)
+        product.stock_quantity -= deltas[product.pk]
+        old_facets, old_stats = facets.facet_keys(product), stats.stats_key(product)
+        product.stock_quantity += deltas[product.pk]
+
+        if new_facets != old_facets:
+            facet_deltas.update(new_facets)
+            facet_deltas.subtract(old_facets)
+        if new_stats != old_stats:
+            stat_deltas.update(stats.key_deltas(new_stats, 1))
+            stat_deltas.update(stats.key_deltas(old_stats, -1))
+
+    facets.apply_deltas(facet_deltas)
+    stats.apply_deltas(stat_deltas)
+    alerts.stock_moved(products, deltas)
+    transaction.on_commit(lambda: bump_version(*tenants, GLOBAL_SCOPE))
+    return products
@@ -0,0 +1,172 @@
+"""
+Append-only stock movement ledger.
+
+Every change to a product's stock_quantity is recorded as a StockMovement
+(sale, restock, adjustment or return) holding the signed change and the
+stock level right after it. Movements for one operation, e.g. all lines
+of an order, are written with a single bulk INSERT in the same
+transaction as the stock change, so the ledger never disagrees with the
+products table.
+
+compact_ledger() rolls movements older than a retention window into one
+StockSnapshot per product per day (closing balance plus per-kind totals)
+and deletes them, so the table stays bounded. stock_at() answers
+point-in-time queries exactly inside the window and to the day before it;
+before the first snapshot it uses that day's opening balance (closing
+balance less the day's net change).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StockMovement, StockSnapshot
+
+KIND_FIELDS = {'sale': 'sold', 'restock': 'restocked', 'adjustment': 'adjusted', 'return': 'returned'}
+SNAPSHOT_TOTALS = ('sold', 'restocked', 'adjusted', 'returned', 'movements')
+
+
+def record_movements(kind, products, deltas, reference='', user=None):
+    """
+    Write one movement per product in ``deltas`` ({product_id: change}) with
+    a single INSERT. ``products`` are the rows as they are after the change.
+    """
+    now = timezone.now()
+    user_id = getattr(user, 'pk', None)
+    movements = [
+        StockMovement(
+            tenant_id=product.tenant_id, product_id=product.pk, kind=kind,
+            quantity=deltas[product.pk], balance=product.stock_quantity,
+            reference=str(reference or ''), created_by_id=user_id, created_at=now,
+        )
+        for product in products if deltas.get(product.pk) and product.tenant_id
+    ]
+    return StockMovement.objects.bulk_create(movements)
+
+
+def snapshot(product):
+    """Remember the stock level a product was loaded with"""
+    if 'stock_quantity' in product.get_deferred_fields():
+        product._loaded_stock = None
+    else:
+        product._loaded_stock = product.stock_quantity
+
+
+def product_saved(product, created):
+    """
+    Record an edit of stock_quantity made through Product.save() as an
+    adjustment. Returns {product_id: change}, empty if stock did not move.
+    """
+    loaded = None if created else getattr(product, '_loaded_stock', None)
+    deltas = {}
+    if loaded is not None and product.stock_quantity != loaded:
+        deltas[product.pk] = product.stock_quantity - loaded
+        record_movements('adjustment', [product], deltas, user=getattr(product, '_stock_changed_by', None))
+    product._loaded_stock = product.stock_quantity
+    return deltas
+
+
+def stock_at(product, when):
+    """
+    The product's stock_quantity at ``when``. Exact while the movements are
+    kept; for compacted history it is the closing balance of that day, and
+    before all history the opening balance of the first day recorded.
+    """
+    movements = StockMovement.objects.filter(product_id=product.pk)
+    last = movements.filter(created_at__lte=when).order_by('-created_at', '-id').values_list('balance', flat=True).first()
+    if last is not None:
+        return last
+
+    day = timezone.localdate(when)
+    snapshots = StockSnapshot.objects.filter(product_id=product.pk)
+    closing = snapshots.filter(day__lte=day).order_by('-day').values_list('balance', flat=True).first()
+    if closing is not None:
+        return closing
+
+    # Before the first thing we know about: the earliest snapshot day's
+    # opening balance, or, if nothing is compacted, undo the first movement
+    earliest = snapshots.order_by('day').values_list('balance', 'sold', 'restocked', 'adjusted', 'returned').first()
+    if earliest is not None:
+        balance, sold, restocked, adjusted, returned = earliest
+        return balance - (restocked + adjusted + returned - sold)
+    first = movements.order_by('created_at', 'id').values_list('balance', 'quantity').first()
+    if first is not None:
+        return first[0] - first[1]
+    return product.stock_quantity
+
+
+def compaction_cutoff(keep_days):
+    """Midnight (local time) ``keep_days`` days ago; whole days are compacted"""
+    day = timezone.localdate() - timedelta(days=keep_days)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def compact_ledger(keep_days=None, chunk_size=500):
+    """
+    Roll movements older than ``keep_days`` (default STOCK_LEDGER_RETENTION_DAYS)
+    into per-product daily snapshots, ``chunk_size`` products per transaction.
+    Returns (movements compacted, snapshots written).
+    """
+    if keep_days is None:
+        keep_days = settings.STOCK_LEDGER_RETENTION_DAYS
+    cutoff = compaction_cutoff(keep_days)
+    old = StockMovement.objects.filter(created_at__lt=cutoff)
+    compacted = written = 0
+    while True:
+        product_ids = list(
+            old.order_by('product_id').values_list('product_id', flat=True).distinct()[:chunk_size]
+        )
+        if not product_ids:
+            return compacted, written
+        with transaction.atomic():
+            moved, snapshots = _compact_products(old.filter(product_id__in=product_ids))
+        compacted += moved
+        written += snapshots
+
+
+def _compact_products(movements):
+    days = {}
+    last_id = None
+    rows = movements.order_by('created_at', 'id').values_list(
+        'id', 'tenant_id', 'product_id', 'kind', 'quantity', 'balance', 'created_at',
+    )
+    for pk, tenant_id, product_id, kind, quantity, balance, created_at in rows.iterator():
+        key = (product_id, timezone.localdate(created_at))
+        day = days.get(key)
+        if day is None:
+            day = days[key] = defaultdict(int, tenant_id=tenant_id)
+        field = KIND_FIELDS[kind]
+        day[field] += -quantity if kind == 'sale' else quantity
+        day['movements'] += 1
+        day['balance'] = balance
+        last_id = pk if last_id is None else max(last_id, pk)
+    if not days:
+        return 0, 0
+
+    existing = {
+        (snapshot.product_id, snapshot.day): snapshot
+        for snapshot in StockSnapshot.objects.select_for_update().filter(
+            product_id__in={product_id for product_id, _ in days},
+            day__in={day for _, day in days},
+        )
+    }
+    created, updated = [], []
+    for (product_id, day), totals in days.items():
+        snapshot = existing.get((product_id, day))
+        if snapshot is None:
+            created.append(StockSnapshot(
+                tenant_id=totals['tenant_id'], product_id=product_id, day=day, balance=totals['balance'],
+                **{field: totals[field] for field in SNAPSHOT_TOTALS},
+            ))
+            continue
+        snapshot.balance = totals['balance']
+        for field in SNAPSHOT_TOTALS:
+            setattr(snapshot, field, getattr(snapshot, field) + totals[field])
+        updated.append(snapshot)
+
+    StockSnapshot.objects.bulk_create(created)
+    StockSnapshot.objects.bulk_update(updated, ['balance', *SNAPSHOT_TOTALS])
+    moved, _ = movements.filter(pk__lte=last_id).delete()
+    return moved, len(created) + len(updated)
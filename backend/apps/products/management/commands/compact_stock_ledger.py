@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.products.ledger import compact_ledger
+
+
+class Command(BaseCommand):
+    help = 'Roll old stock movements into per-product daily snapshots (run daily, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days', type=int, default=settings.STOCK_LEDGER_RETENTION_DAYS,
+            help='Keep movements from this many days back (default: STOCK_LEDGER_RETENTION_DAYS)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=500, help='Products per transaction')
+
+    def handle(self, *args, **options):
+        moved, snapshots = compact_ledger(options['keep_days'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Compacted {moved} movement(s) into {snapshots} snapshot(s)'))
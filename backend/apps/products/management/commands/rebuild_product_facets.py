@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.facets import rebuild_facets
+from apps.tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = 'Recount the precomputed product facet counts for every tenant (or the given subdomains)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('subdomains', nargs='*')
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.all()
+        if options['subdomains']:
+            tenants = tenants.filter(subdomain__in=options['subdomains'])
+        for tenant_id in tenants.values_list('id', flat=True):
+            rebuild_facets(tenant_id)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt product facets for {len(tenants)} tenant(s)'))
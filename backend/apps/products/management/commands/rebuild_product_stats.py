@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.stats import rebuild_stats, verify_stats
+from apps.tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = 'Recount the product stats counters for every tenant (or the given subdomains)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('subdomains', nargs='*')
+        parser.add_argument('--verify', action='store_true', help='Only report counters that have drifted')
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.all()
+        if options['subdomains']:
+            tenants = tenants.filter(subdomain__in=options['subdomains'])
+
+        drifted = 0
+        for tenant_id, subdomain in tenants.values_list('id', 'subdomain'):
+            if not options['verify']:
+                rebuild_stats(tenant_id)
+                continue
+            mismatches = verify_stats(tenant_id)
+            if mismatches:
+                drifted += 1
+                details = ', '.join(f'{field} {stored} != {actual}' for field, (stored, actual) in mismatches.items())
+                self.stdout.write(self.style.WARNING(f'{subdomain}: {details}'))
+
+        if options['verify']:
+            self.stdout.write(self.style.SUCCESS(f'Checked {len(tenants)} tenant(s), {drifted} drifted'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt product stats for {len(tenants)} tenant(s)'))
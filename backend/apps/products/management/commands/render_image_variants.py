@@ -0,0 +1,78 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from apps.products.media import ORIGINALS_PREFIX, get_storage, parse_local_image, render_in_worker
+from apps.products.models import Product
+
+
+class Command(BaseCommand):
+    help = ('Render missing resized variants of locally stored product images in a pool of worker processes; '
+            'with --watch, keep running and pick up new uploads')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=int, metavar='MINUTES',
+            help='Only look at products updated in the last MINUTES (first pass only with --watch)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Rendering processes (default: one per CPU)',
+        )
+        parser.add_argument(
+            '--watch', type=float, metavar='SECONDS',
+            help='Run as a worker: every SECONDS, render variants for products updated since the last pass',
+        )
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        if storage is None:
+            raise CommandError("The product_images storage is not the local content-addressed storage")
+
+        since = None
+        if options['since'] is not None:
+            since = timezone.now() - timedelta(minutes=options['since'])
+
+        # Children only read originals and write variants; they never use the database
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1), initializer=django.setup) as pool:
+            while True:
+                started = timezone.now()
+                images = self.pending_images(since)
+                self.render(pool, storage, images)
+                if options['watch'] is None:
+                    return
+                # Small overlap so a save committed during the pass is not skipped
+                since = started - timedelta(seconds=1)
+                close_old_connections()
+                time.sleep(options['watch'])
+
+    def pending_images(self, since):
+        products = Product.objects.filter(image__startswith=ORIGINALS_PREFIX)
+        if since is not None:
+            products = products.filter(updated_at__gte=since)
+        images = set()
+        for image in products.values_list('image', flat=True).iterator():
+            parsed = parse_local_image(image)
+            if parsed is not None:
+                images.add(parsed)
+        return images
+
+    def render(self, pool, storage, images):
+        futures = {
+            pool.submit(render_in_worker, str(storage.location), storage.base_url, digest, ext): digest
+            for digest, ext in images
+        }
+        failed = 0
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Could not render variants of {futures[future]}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Checked variants for {len(images)} image(s), {failed} failed'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.alerts import send_pending_alerts
+
+
+class Command(BaseCommand):
+    help = 'Mail stores a digest of their new low-stock alerts (run every few minutes, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000, help='Most alerts to handle in one run')
+
+    def handle(self, *args, **options):
+        mailed, handled = send_pending_alerts(options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Handled {handled} alert(s), mailed {mailed} store(s)'))
@@ -0,0 +1,178 @@
+"""
+Local, content-addressed storage for product images.
+
+Selected with PRODUCT_IMAGE_STORAGE = 'local', which makes
+ContentAddressedStorage the ``product_images`` storage. Originals are stored
+under their SHA-256, so identical uploads (from any tenant) share one file,
+and a product's image value is the original's name,
+``originals/<sha[:2]>/<sha256>.<ext>``.
+
+Resized variants (the sizes in images.IMAGE_VARIANTS) are never rendered in
+the web process. The render_image_variants command is the worker: it
+renders whatever is missing in a pool of processes, once or continuously
+with ``--watch``. Until a variant exists, the media view redirects to the
+original. The work is derived from the rows and files already saved, so
+nothing is lost when a process restarts.
+
+Every file name is derived from its content, so files never change and
+are served with far-future, immutable cache headers.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .images import IMAGE_VARIANTS, product_image_storage
+
+ORIGINALS_PREFIX = 'originals/'
+VARIANT_FORMAT = ('WEBP', 'webp')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+ORIGINAL_NAME = re.compile(r'^originals/([0-9a-f]{2})/([0-9a-f]{64})\.(\w+)$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage whose writes are atomic and never rename on collision.
+    save() takes an uploaded image and stores it under its content hash,
+    whatever name it was given; the returned name is the image value.
+    """
+
+    def _save(self, name, content):
+        digest, ext = _identify(content)
+        content.seek(0)
+        return self._write(original_name(digest, ext), content)
+
+    def _write(self, name, content):
+        if self.exists(name):
+            # Same name means same content; keep the file we already have
+            return name
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def image_urls(self, image):
+        parsed = parse_local_image(image)
+        if parsed is None:
+            return {}
+        digest, ext = parsed
+        urls = {'original': self.url(original_name(digest, ext))}
+        for variant in IMAGE_VARIANTS:
+            urls[variant] = self.url(variant_name(digest, variant))
+        return urls
+
+
+def get_storage():
+    """The product image storage if it is the local one, else None"""
+    storage = product_image_storage()
+    return storage if isinstance(storage, ContentAddressedStorage) else None
+
+
+def original_name(digest, ext):
+    return f'originals/{digest[:2]}/{digest}.{ext}'
+
+
+def variant_name(digest, variant):
+    return f'variants/{digest[:2]}/{digest}/{variant}.{VARIANT_FORMAT[1]}'
+
+
+def parse_local_image(value):
+    """Return (digest, ext) for a local original's image value, else None"""
+    public_id = getattr(value, 'public_id', None)
+    if public_id is not None:
+        value = f"{public_id}.{getattr(value, 'format', None) or ''}"
+    match = ORIGINAL_NAME.match(str(value or ''))
+    if match is None or match[1] != match[2][:2]:
+        return None
+    return match[2], match[3]
+
+
+def _identify(upload):
+    """
+    Return (sha256, ext) of an uploaded image.
+    Raises ValidationError if the upload is not an image Pillow can read.
+    """
+    upload.seek(0)
+    sha = hashlib.sha256()
+    for chunk in upload.chunks():
+        sha.update(chunk)
+
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ValidationError({'image': 'Upload a valid image.'})
+    ext = FORMAT_EXTENSIONS.get(image_format)
+    if ext is None:
+        raise ValidationError({'image': f'Unsupported image format {image_format}.'})
+    return sha.hexdigest(), ext
+
+
+def render_variant(storage, digest, ext, variant):
+    """Render one variant from the original if it is not there yet; return its name"""
+    name = variant_name(digest, variant)
+    if storage.exists(name):
+        return name
+
+    options = IMAGE_VARIANTS[variant]
+    size = (options['width'], options['height'])
+    with storage.open(original_name(digest, ext), 'rb') as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        if options['crop'] == 'fill':
+            image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        else:
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, VARIANT_FORMAT[0], quality=82, method=4)
+
+    buffer.seek(0)
+    return storage._write(name, File(buffer, name=name))
+
+
+def render_variants(storage, digest, ext):
+    return [render_variant(storage, digest, ext, variant) for variant in IMAGE_VARIANTS]
+
+
+def render_in_worker(location, base_url, digest, ext):
+    """Process-pool entry point: render one image's missing variants"""
+    return render_variants(ContentAddressedStorage(location=location, base_url=base_url), digest, ext)
+
+
+def pending_original(storage, name):
+    """
+    For a variant name that is not rendered yet, the name of the original
+    it will be rendered from; None if ``name`` is no such variant.
+    """
+    parts = name.split('/')
+    if len(parts) != 4 or parts[0] != 'variants':
+        return None
+    digest, variant = parts[2], parts[3].rpartition('.')[0]
+    if variant not in IMAGE_VARIANTS or name != variant_name(digest, variant):
+        return None
+    for ext in FORMAT_EXTENSIONS.values():
+        if storage.exists(original_name(digest, ext)):
+            return original_name(digest, ext)
+    return None
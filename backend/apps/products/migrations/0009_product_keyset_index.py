@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_alter_product_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'status', '-created_at', '-id'], name='prod_tenant_status_created_idx'),
+        ),
+    ]
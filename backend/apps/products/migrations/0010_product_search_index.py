@@ -0,0 +1,57 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE products ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(sku, '') || ' ' || coalesce(barcode, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(seo_title, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    'CREATE INDEX products_search_vector_idx ON products USING gin (search_vector)',
+]
+
+POSTGRES_REVERSE = [
+    'DROP INDEX IF EXISTS products_search_vector_idx',
+    'ALTER TABLE products DROP COLUMN IF EXISTS search_vector',
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE products_fts USING fts5(
+        product_id UNINDEXED, tenant_id UNINDEXED,
+        name, description, sku, barcode, seo_title,
+        tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    INSERT INTO products_fts (product_id, tenant_id, name, description, sku, barcode, seo_title)
+    SELECT id, tenant_id, name, description, sku, barcode, seo_title FROM products
+    """,
+]
+
+SQLITE_REVERSE = [
+    'DROP TABLE IF EXISTS products_fts',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_search_index'),
+        ('tenants', '0007_backfill_storesettings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('published', 'Published'), ('archived', 'Archived')], max_length=20)),
+                ('facet', models.CharField(choices=[('category', 'Category'), ('price', 'Price bucket'), ('stock', 'Stock state')], max_length=20)),
+                ('value', models.CharField(max_length=64)),
+                ('count', models.IntegerField(default=0)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_facets', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'product_facet_counts',
+                'unique_together': {('tenant', 'status', 'facet', 'value')},
+            },
+        ),
+    ]
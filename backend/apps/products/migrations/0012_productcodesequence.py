@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_productfacetcount'),
+        ('tenants', '0007_backfill_storesettings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=3)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+                ('tenant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='product_code_sequence', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'product_code_sequences',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_productcodesequence'),
+        ('tenants', '0007_backfill_storesettings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0)),
+                ('published', models.IntegerField(default=0)),
+                ('draft', models.IntegerField(default=0)),
+                ('archived', models.IntegerField(default=0)),
+                ('out_of_stock', models.IntegerField(default=0)),
+                ('low_stock', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='product_stats', to='tenants.tenant')),
+            ],
+            options={
+                'verbose_name_plural': 'product stats',
+                'db_table': 'product_stats',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:27
+
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    categories = {c.pk: c for c in Category.objects.all()}
+
+    def path_of(category, seen=()):
+        if category.path:
+            return category.path
+        parent = categories.get(category.parent_id)
+        if parent is None or parent.pk in seen:
+            # Root, or a pre-existing cycle: treat it as a root
+            prefix = ''
+        else:
+            prefix = path_of(parent, seen + (category.pk,))
+        category.path = f"{prefix}{category.pk.hex}/"
+        category.depth = category.path.count('/') - 1
+        return category.path
+
+    for category in categories.values():
+        path_of(category)
+    Category.objects.bulk_update(categories.values(), ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_product_stats'),
+        ('tenants', '0007_backfill_storesettings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=1024),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
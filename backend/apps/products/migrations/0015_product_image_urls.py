@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:29
+
+from django.db import migrations, models
+
+from apps.products.images import build_image_urls
+
+
+def backfill_image_urls(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    products = Product.objects.exclude(image__isnull=True).exclude(image='').only('id', 'image')
+    batch = []
+    for product in products.iterator(chunk_size=500):
+        product.image_urls = build_image_urls(product.image)
+        batch.append(product)
+        if len(batch) >= 500:
+            Product.objects.bulk_update(batch, ['image_urls'])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ['image_urls'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_urls',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(backfill_image_urls, migrations.RunPython.noop),
+    ]
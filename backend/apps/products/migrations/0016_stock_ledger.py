@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_product_image_urls'),
+        ('tenants', '0007_backfill_storesettings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Sale'), ('restock', 'Restock'), ('adjustment', 'Adjustment'), ('return', 'Return')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('balance', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products.product')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'stock_movements',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['product', '-created_at', '-id'], name='stock_move_product_idx'), models.Index(fields=['created_at'], name='stock_move_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('balance', models.IntegerField()),
+                ('sold', models.IntegerField(default=0)),
+                ('restocked', models.IntegerField(default=0)),
+                ('adjusted', models.IntegerField(default=0)),
+                ('returned', models.IntegerField(default=0)),
+                ('movements', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.product')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'stock_snapshots',
+                'ordering': ['-day'],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def open_existing_alerts(apps, schema_editor):
+    # Products already low get an open alert, marked notified so the first
+    # notification run does not mail every store its whole low list
+    Product = apps.get_model('products', 'Product')
+    LowStockAlert = apps.get_model('products', 'LowStockAlert')
+    threshold = settings.LOW_STOCK_THRESHOLD
+    now = timezone.now()
+    low = Product.objects.filter(track_quantity=True, stock_quantity__lte=threshold).values_list(
+        'id', 'tenant_id', 'stock_quantity',
+    )
+    LowStockAlert.objects.bulk_create(
+        (LowStockAlert(product_id=pk, tenant_id=tenant_id, threshold=threshold, stock_quantity=stock,
+                       created_at=now, notified_at=now)
+         for pk, tenant_id, stock in low.iterator(chunk_size=500)),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_stock_ledger'),
+        ('tenants', '0008_storesettings_low_stock_threshold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='low_stock_threshold',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='LowStockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.IntegerField()),
+                ('stock_quantity', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock_alerts', to='products.product')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock_alerts', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'low_stock_alerts',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('resolved_at__isnull', True)), fields=['tenant', '-created_at'], name='low_stock_alert_open_idx'), models.Index(condition=models.Q(('notified_at__isnull', True)), fields=['created_at'], name='low_stock_alert_pending_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('resolved_at__isnull', True)), fields=('product',), name='low_stock_alert_open_uniq')],
+            },
+        ),
+        migrations.RunPython(open_existing_alerts, migrations.RunPython.noop),
+    ]
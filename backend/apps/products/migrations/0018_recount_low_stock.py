@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Exists, F, OuterRef, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def recount_low_stock(apps, schema_editor):
+    # low_stock now counts out-of-stock products too and honours the
+    # product and store thresholds; alerts follow the same thresholds.
+    # Alerts opened here are marked notified, as in 0017.
+    Product = apps.get_model('products', 'Product')
+    ProductStats = apps.get_model('products', 'ProductStats')
+    LowStockAlert = apps.get_model('products', 'LowStockAlert')
+    StoreSettings = apps.get_model('tenants', 'StoreSettings')
+    store_thresholds = dict(
+        StoreSettings.objects.filter(low_stock_threshold__isnull=False).values_list('store_id', 'low_stock_threshold')
+    )
+    now = timezone.now()
+
+    tenant_ids = list(Product.objects.order_by().values_list('tenant_id', flat=True).distinct())
+    for tenant_id in tenant_ids:
+        default = store_thresholds.get(tenant_id, settings.LOW_STOCK_THRESHOLD)
+        low = Product.objects.filter(tenant_id=tenant_id, track_quantity=True).alias(
+            threshold=Coalesce('low_stock_threshold', Value(default)),
+        ).filter(stock_quantity__lte=F('threshold'))
+
+        ProductStats.objects.filter(tenant_id=tenant_id).update(low_stock=low.count())
+
+        LowStockAlert.objects.filter(tenant_id=tenant_id, resolved_at__isnull=True).exclude(
+            product_id__in=low.values('pk'),
+        ).update(resolved_at=now)
+        has_open = LowStockAlert.objects.filter(product_id=OuterRef('pk'), resolved_at__isnull=True)
+        missing = low.annotate(level=F('threshold')).filter(~Exists(has_open)).values_list('pk', 'stock_quantity', 'level')
+        LowStockAlert.objects.bulk_create(
+            (LowStockAlert(product_id=pk, tenant_id=tenant_id, threshold=threshold, stock_quantity=stock,
+                           created_at=now, notified_at=now)
+             for pk, stock, threshold in missing.iterator(chunk_size=500)),
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_low_stock_alerts'),
+        ('tenants', '0008_storesettings_low_stock_threshold'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_low_stock, migrations.RunPython.noop),
+    ]
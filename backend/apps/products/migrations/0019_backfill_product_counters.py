@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Case, CharField, Count, Q, Value, When
+from django.db.models.functions import Coalesce
+
+# The price buckets of facets.py at the time of this migration
+PRICE_BUCKETS = [(0, 500), (500, 1000), (1000, 2500), (2500, 5000), (5000, 10000), (10000, None)]
+
+
+def bucket_label(low, high):
+    return f'{low}+' if high is None else f'{low}-{high}'
+
+
+def backfill_counters(apps, schema_editor):
+    # One full count of every store's facet and stats rows, so deploys no
+    # longer have to recount them; signals keep them current from here on
+    Product = apps.get_model('products', 'Product')
+    ProductFacetCount = apps.get_model('products', 'ProductFacetCount')
+    ProductStats = apps.get_model('products', 'ProductStats')
+    StoreSettings = apps.get_model('tenants', 'StoreSettings')
+    store_thresholds = dict(
+        StoreSettings.objects.filter(low_stock_threshold__isnull=False).values_list('store_id', 'low_stock_threshold')
+    )
+    in_stock = Q(track_quantity=False) | Q(stock_quantity__gt=0)
+    bucket = Case(
+        *[
+            When(Q(price__gte=low) if high is None else Q(price__gte=low, price__lt=high), then=Value(bucket_label(low, high)))
+            for low, high in PRICE_BUCKETS
+        ],
+        default=Value(''), output_field=CharField(),
+    )
+
+    tenant_ids = list(Product.objects.order_by().values_list('tenant_id', flat=True).distinct())
+    for tenant_id in tenant_ids:
+        products = Product.objects.filter(tenant_id=tenant_id).order_by()
+
+        rows = {}
+        for row in products.values('status', 'Category_id').annotate(n=Count('id')):
+            value = str(row['Category_id']) if row['Category_id'] else 'none'
+            rows[(row['status'], 'category', value)] = row['n']
+        for row in products.annotate(bucket=bucket).values('status', 'bucket').annotate(n=Count('id')):
+            if row['bucket']:
+                rows[(row['status'], 'price', row['bucket'])] = row['n']
+        for row in products.values('status').annotate(
+            in_stock=Count('id', filter=in_stock), out_of_stock=Count('id', filter=~in_stock),
+        ):
+            rows[(row['status'], 'stock', 'in_stock')] = row['in_stock']
+            rows[(row['status'], 'stock', 'out_of_stock')] = row['out_of_stock']
+        ProductFacetCount.objects.filter(tenant_id=tenant_id).delete()
+        ProductFacetCount.objects.bulk_create([
+            ProductFacetCount(tenant_id=tenant_id, status=status, facet=facet, value=value, count=count)
+            for (status, facet, value), count in rows.items() if count
+        ])
+
+        threshold = Coalesce('low_stock_threshold', Value(store_thresholds.get(tenant_id, settings.LOW_STOCK_THRESHOLD)))
+        counts = products.aggregate(
+            total=Count('id'),
+            published=Count('id', filter=Q(status='published')),
+            draft=Count('id', filter=Q(status='draft')),
+            archived=Count('id', filter=Q(status='archived')),
+            out_of_stock=Count('id', filter=Q(track_quantity=True, stock_quantity__lte=0)),
+            low_stock=Count('id', filter=Q(track_quantity=True, stock_quantity__lte=threshold)),
+        )
+        ProductStats.objects.update_or_create(tenant_id=tenant_id, defaults=counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_recount_low_stock'),
+        ('tenants', '0008_storesettings_low_stock_threshold'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
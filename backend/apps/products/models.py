@@ -1,10 +1,12 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from apps.tenants.models import Tenant
 from django.contrib.auth.models import User  # Add this import
 from django.conf import settings
 import uuid
-import random
-import string
 from django.utils import timezone  # Fixed import
 from cloudinary.models import CloudinaryField 
 
@@ -14,15 +16,48 @@ class Category(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True)
+    # Materialized path of ancestor ids ("<root hex>/.../<own hex>/"), so a
+    # whole subtree is one indexed prefix match. Maintained by save().
+    path = models.CharField(max_length=1024, blank=True, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         db_table = 'categories'
         unique_together = ['tenant', 'name']
         ordering = ['name']
+        indexes = [
+            # varchar_pattern_ops lets Postgres use the index for LIKE 'prefix%'
+            models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def set_path(self):
+        """Compute path/depth from the parent; call before bulk_create()"""
+        parent_path = ''
+        if self.parent_id:
+            parent = self.parent
+            if parent.tenant_id != self.tenant_id:
+                raise ValidationError({'parent': 'Parent category belongs to another store.'})
+            if self.path and parent.path.startswith(self.path):
+                raise ValidationError({'parent': 'A category cannot be moved under itself.'})
+            parent_path = parent.path
+        self.path = f"{parent_path}{self.pk.hex}/"
+        self.depth = self.path.count('/') - 1
+
+    def save(self, *args, **kwargs):
+        old_path, old_depth = self.path, self.depth
+        self.set_path()
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                # Moved: rewrite the prefix of every descendant in one UPDATE
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (self.depth - old_depth),
+                )
+
 class Product(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='products')
@@ -38,7 +73,11 @@ class Product(models.Model):
     track_quantity = models.BooleanField(default=True)
     stock_quantity = models.IntegerField(default=0)
     allow_backorder = models.BooleanField(default=False)
+    # Overrides the store's low-stock threshold for this product
+    low_stock_threshold = models.PositiveIntegerField(null=True, blank=True)
     image = CloudinaryField('image', folder='products/', blank=True, null=True)
+    # Canonical URL plus responsive variants, rebuilt by save() when the image changes
+    image_urls = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -57,41 +96,172 @@ class Product(models.Model):
     class Meta:
         db_table = 'products'
         ordering = ['-created_at']  
+        indexes = [
+            # Serves keyset pagination of a tenant's (optionally status-filtered) catalog
+            models.Index(fields=['tenant', 'status', '-created_at', '-id'], name='prod_tenant_status_created_idx'),
+        ]
 
     def __str__(self):
         return self.name    
     
-    def generate_sku(self):
-        tenant_prefix = self.tenant.name[:3].upper() if self.tenant else 'TEN'
-        category_prefix = self.Category.name[:3].upper() if self.Category else 'GEN'  # Keep as Category
-        random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-
-        sku = f"{tenant_prefix}-{category_prefix}-{random_part}"
-
-        while Product.objects.filter(sku=sku).exists():
-            random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            sku = f"{tenant_prefix}-{category_prefix}-{random_part}"
-        return sku
-    
-    def generate_barcode(self):
-        if not self.sku:
-            self.sku = self.generate_sku()
-        base_barcode = f"MTE{self.sku.replace('-', '')}"
-        barcode = base_barcode
-
-        counter = 1
-        while Product.objects.filter(barcode=barcode).exists():
-            barcode = f"{base_barcode}{counter:02d}"
-            counter += 1
-        return barcode
-           
     def save(self, *args, **kwargs):
-        if not self.sku:
-            self.sku = self.generate_sku()
-        
-        if not self.barcode:
-            self.barcode = self.generate_barcode()
+        if not self.sku or not self.barcode:
+            from .codes import assign_codes
+            assign_codes([self])
 
         if self.status == 'published' and not self.published_at:
             self.published_at = timezone.now()
-        super().save(*args, **kwargs)
\ No newline at end of file
+
+        if 'image' not in self.get_deferred_fields():
+            from .images import build_image_urls, image_source, product_image_storage
+            if isinstance(self.image, UploadedFile):
+                self.image = product_image_storage().save(f'products/{self.image.name}', self.image)
+            source = image_source(self.image)
+            if self._state.adding or source != getattr(self, '_loaded_image', None):
+                self.image_urls = build_image_urls(self.image)
+                self._loaded_image = source
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None and 'image' in update_fields:
+                    kwargs['update_fields'] = {*update_fields, 'image_urls'}
+
+        # The post_save handlers update counters; keep them in the same transaction
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+class ProductCodeSequence(models.Model):
+    """Per-tenant counter that SKUs and barcodes are allocated from"""
+    tenant = models.OneToOneField('tenants.Tenant', on_delete=models.CASCADE, related_name='product_code_sequence')
+    prefix = models.CharField(max_length=3)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        db_table = 'product_code_sequences'
+
+    def __str__(self):
+        return f"{self.prefix} next={self.next_value}"
+
+
+class ProductFacetCount(models.Model):
+    """Precomputed per-tenant facet counts, maintained from Product signals"""
+    FACET_CHOICES = [
+        ('category', 'Category'),
+        ('price', 'Price bucket'),
+        ('stock', 'Stock state'),
+    ]
+
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='product_facets')
+    status = models.CharField(max_length=20, choices=Product.STATUS_CHOICES)
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    value = models.CharField(max_length=64)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'product_facet_counts'
+        unique_together = ['tenant', 'status', 'facet', 'value']
+
+    def __str__(self):
+        return f"{self.tenant_id} {self.status} {self.facet}={self.value}: {self.count}"
+
+
+class ProductStats(models.Model):
+    """Per-tenant catalog counters for the vendor dashboard, maintained from Product signals"""
+    tenant = models.OneToOneField('tenants.Tenant', on_delete=models.CASCADE, related_name='product_stats')
+    total = models.IntegerField(default=0)
+    published = models.IntegerField(default=0)
+    draft = models.IntegerField(default=0)
+    archived = models.IntegerField(default=0)
+    out_of_stock = models.IntegerField(default=0)
+    low_stock = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'product_stats'
+        verbose_name_plural = 'product stats'
+
+    def __str__(self):
+        return f"{self.tenant_id}: {self.total} products"
+
+
+class StockMovement(models.Model):
+    """One append-only change to a product's stock level; see ledger.py"""
+    KIND_CHOICES = [
+        ('sale', 'Sale'),
+        ('restock', 'Restock'),
+        ('adjustment', 'Adjustment'),
+        ('return', 'Return'),
+    ]
+
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='stock_movements')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()  # signed change to stock_quantity
+    balance = models.IntegerField()  # stock_quantity right after the change
+    reference = models.CharField(max_length=64, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'stock_movements'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='stock_move_product_idx'),
+            models.Index(fields=['created_at'], name='stock_move_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.kind} {self.quantity:+d} -> {self.balance}"
+
+
+class StockSnapshot(models.Model):
+    """A product's compacted stock movements for one day"""
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='stock_snapshots')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    day = models.DateField()
+    balance = models.IntegerField()  # stock_quantity at the end of the day
+    sold = models.IntegerField(default=0)
+    restocked = models.IntegerField(default=0)
+    adjusted = models.IntegerField(default=0)
+    returned = models.IntegerField(default=0)
+    movements = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'stock_snapshots'
+        ordering = ['-day']
+        unique_together = ['product', 'day']
+
+    def __str__(self):
+        return f"{self.product_id} {self.day}: {self.balance}"
+
+
+class LowStockAlert(models.Model):
+    """
+    A tracked product's stock fell to or below its low-stock threshold.
+    One open alert per product; it resolves when stock climbs back above.
+    Rows with notified_at unset are the notification queue; see alerts.py.
+    """
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='low_stock_alerts')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='low_stock_alerts')
+    threshold = models.IntegerField()
+    stock_quantity = models.IntegerField()  # stock level when the threshold was crossed
+    created_at = models.DateTimeField(default=timezone.now)
+    notified_at = models.DateTimeField(null=True, blank=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'low_stock_alerts'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['product'], condition=models.Q(resolved_at__isnull=True),
+                                    name='low_stock_alert_open_uniq'),
+        ]
+        indexes = [
+            # The "currently low" dashboard list: open alerts only
+            models.Index(fields=['tenant', '-created_at'], condition=models.Q(resolved_at__isnull=True),
+                         name='low_stock_alert_open_idx'),
+            # Pending notifications
+            models.Index(fields=['created_at'], condition=models.Q(notified_at__isnull=True),
+                         name='low_stock_alert_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} at {self.stock_quantity} (threshold {self.threshold})"
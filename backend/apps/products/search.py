@@ -0,0 +1,153 @@
+"""
+Per-tenant full-text search over products.
+
+PostgreSQL keeps a generated ``search_vector`` tsvector column with a GIN
+index (see migration 0010), so Postgres needs no application-side upkeep.
+SQLite keeps a standalone FTS5 table, ``products_fts``, which is updated
+incrementally from the Product post_save/post_delete signals. Any other
+backend falls back to icontains matching.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Product
+
+FTS_TABLE = 'products_fts'
+SEARCH_FIELDS = ('name', 'description', 'sku', 'barcode', 'seo_title')
+
+# bm25 weights for (product_id, tenant_id, name, description, sku, barcode, seo_title)
+FTS5_WEIGHTS = '0.0, 0.0, 10.0, 1.0, 8.0, 8.0, 4.0'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_fts5():
+    return connection.vendor == 'sqlite'
+
+
+def is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def _fts5_match(query):
+    # Quote every token so user input can never inject FTS5 operators;
+    # the trailing * gives prefix matching for search-as-you-type
+    tokens = _TOKEN_RE.findall(query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def index_products(products, created=False):
+    """
+    Insert or refresh FTS5 rows for the given products (no-op off SQLite).
+    Pass created=True for rows that were just inserted to skip the delete.
+    """
+    if not is_fts5():
+        return
+    products = list(products)
+    if not products:
+        return
+    with connection.cursor() as cursor:
+        if not created:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE product_id = %s',
+                [(product.pk.hex,) for product in products],
+            )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (product_id, tenant_id, name, description, sku, barcode, seo_title) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            [
+                (product.pk.hex, product.tenant_id.hex) + tuple(getattr(product, field) or '' for field in SEARCH_FIELDS)
+                for product in products
+            ],
+        )
+
+
+def unindex_products(product_ids):
+    """Drop FTS5 rows for the given product ids (no-op off SQLite)"""
+    if not is_fts5():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE product_id = %s',
+            [(product_id.hex,) for product_id in product_ids],
+        )
+
+
+def search_products(tenant, query, status=None, limit=20):
+    """
+    Return up to ``limit`` of the tenant's products matching ``query``, best
+    match first. Each product carries a ``search_rank`` attribute.
+    """
+    if not query or not query.strip():
+        return []
+
+    if is_postgres():
+        ranked = _search_postgres(tenant, query, status, limit)
+    elif is_fts5():
+        ranked = _search_fts5(tenant, query, status, limit)
+    else:
+        return _search_fallback(tenant, query, status, limit)
+
+    if not ranked:
+        return []
+    products = Product.objects.select_related('Category', 'tenant').in_bulk([pk for pk, _ in ranked])
+    results = []
+    for pk, rank in ranked:
+        product = products.get(pk)
+        if product is not None:
+            product.search_rank = rank
+            results.append(product)
+    return results
+
+
+def _search_postgres(tenant, query, status, limit):
+    sql = (
+        "SELECT id, ts_rank(search_vector, q) AS rank "
+        "FROM products, websearch_to_tsquery('english', %s) q "
+        "WHERE tenant_id = %s AND search_vector @@ q"
+    )
+    params = [query, tenant.pk]
+    if status:
+        sql += ' AND status = %s'
+        params.append(status)
+    sql += ' ORDER BY rank DESC LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(pk, float(rank)) for pk, rank in cursor.fetchall()]
+
+
+def _search_fts5(tenant, query, status, limit):
+    match = _fts5_match(query)
+    if not match:
+        return []
+    sql = (
+        f'SELECT {FTS_TABLE}.product_id, bm25({FTS_TABLE}, {FTS5_WEIGHTS}) AS rank '
+        f'FROM {FTS_TABLE} JOIN products ON products.id = {FTS_TABLE}.product_id '
+        f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.tenant_id = %s'
+    )
+    params = [match, tenant.pk.hex]
+    if status:
+        sql += ' AND products.status = %s'
+        params.append(status)
+    sql += ' ORDER BY rank LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        # bm25() is "lower is better"; flip it so both backends rank descending
+        return [(Product._meta.pk.to_python(pk), -rank) for pk, rank in cursor.fetchall()]
+
+
+def _search_fallback(tenant, query, status, limit):
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__icontains': query})
+    products = Product.objects.select_related('Category', 'tenant').filter(condition, tenant=tenant)
+    if status:
+        products = products.filter(status=status)
+    results = list(products[:limit])
+    for product in results:
+        product.search_rank = None
+    return results
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Category, Product
+from .models import Category, Product, StockMovement
 from cloudinary.models import CloudinaryField 
 from cloudinary import CloudinaryImage
 from django.conf import settings
@@ -10,10 +10,22 @@ class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
-        read_only_fields = ['id', 'Product_count']
+        read_only_fields = ['id', 'Product_count', 'path', 'depth']
+
+    def validate(self, attrs):
+        parent = attrs.get('parent')
+        if parent is not None:
+            tenant = attrs.get('tenant', getattr(self.instance, 'tenant', None))
+            if tenant is not None and parent.tenant_id != tenant.pk:
+                raise serializers.ValidationError({'parent': 'Parent category belongs to another store.'})
+            if self.instance is not None and self.instance.path and parent.path.startswith(self.instance.path):
+                raise serializers.ValidationError({'parent': 'A category cannot be moved under itself.'})
+        return attrs
 
     def get_Product_count(self, obj):
-        return obj.product_set.count()
+        # CategoryViewSet annotates product_count; fall back for other callers
+        count = getattr(obj, 'product_count', None)
+        return obj.product_set.count() if count is None else count
     
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='Category.name', read_only=True)
@@ -31,19 +43,10 @@ class ProductSerializer(serializers.ModelSerializer):
             return obj.stock_quantity > 0
         return True
     def get_image_url(self, obj):
-        if obj.image:
-            try:
-                if hasattr(obj.image, 'url'):
-                    return obj.image.url
-                elif isinstance(obj.image, str):
-                    if obj.image.startswith('http'):
-                        return obj.image
-                    
-            except Exception as e:
-                print(f"⚠️ Simple image_url failed: {e}")
-                return None
-            return None      
-                                                 
+        # Precomputed on save; see apps/products/images.py
+        return obj.image_urls.get('original') if obj.image_urls else None
+
+
 class ProductCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
@@ -90,6 +93,10 @@ class ProductUpdateSerializer(serializers.ModelSerializer):
         # Update other fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
+
+        # Stock edits are logged as ledger adjustments by the post_save signal
+        request = self.context.get('request')
+        instance._stock_changed_by = getattr(request, 'user', None)
         
         # Handle image update
         if image_url and isinstance(image_url, str):
@@ -103,4 +110,10 @@ class ProductUpdateSerializer(serializers.ModelSerializer):
                 traceback.print_exc()
         
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockMovement
+        fields = ['id', 'kind', 'quantity', 'balance', 'reference', 'created_by', 'created_at']
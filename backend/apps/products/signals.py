@@ -0,0 +1,92 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.tenants.models import StoreSettings
+from apps.tenants.services.response_cache import GLOBAL_SCOPE, bump_version
+from apps.tenants.services.store_settings import forget_store_settings
+
+from . import alerts, facets, images, ledger, search, stats
+from .models import Category, Product
+
+
+@receiver(post_init, sender=Product)
+def remember_facets(sender, instance, **kwargs):
+    facets.snapshot(instance)
+    stats.snapshot(instance)
+
+
+@receiver(post_init, sender=Product)
+def remember_image(sender, instance, **kwargs):
+    if 'image' not in instance.get_deferred_fields():
+        instance._loaded_image = images.image_source(instance.image)
+
+
+@receiver(post_init, sender=Product)
+def remember_stock(sender, instance, **kwargs):
+    ledger.snapshot(instance)
+    alerts.snapshot(instance)
+
+
+@receiver(post_save, sender=Product)
+def record_stock_adjustment(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        alerts.product_saved(instance, created, ledger.product_saved(instance, created))
+
+
+@receiver(post_save, sender=Product)
+def update_facets_on_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        facets.product_saved(instance, created)
+
+
+@receiver(post_save, sender=Product)
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        stats.product_saved(instance, created)
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    search.unindex_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def update_facets_on_delete(sender, instance, **kwargs):
+    facets.product_deleted(instance)
+
+
+@receiver(post_delete, sender=Product)
+def update_stats_on_delete(sender, instance, **kwargs):
+    stats.product_deleted(instance)
+
+
+@receiver(post_init, sender=StoreSettings)
+def remember_low_stock_threshold(sender, instance, **kwargs):
+    if 'low_stock_threshold' not in instance.get_deferred_fields():
+        instance._loaded_low_stock_threshold = instance.low_stock_threshold
+
+
+@receiver(post_save, sender=StoreSettings)
+def recheck_low_stock(sender, instance, created, raw=False, **kwargs):
+    # A new store default moves products across it without any stock moving
+    loaded = getattr(instance, '_loaded_low_stock_threshold', None)
+    if not raw and not created and instance.low_stock_threshold != loaded:
+        forget_store_settings(instance.store_id)
+        alerts.reconcile_tenant(instance.store_id)
+        stats.rebuild_stats(instance.store_id)
+    instance._loaded_low_stock_threshold = instance.low_stock_threshold
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_version(instance.tenant_id, GLOBAL_SCOPE)
@@ -0,0 +1,164 @@
+"""
+Per-tenant catalog counters for the vendor dashboard.
+
+ProductStats holds one row per tenant with total / per-status / stock
+counts. Product signals apply +1/-1 deltas in the same transaction as the
+write (Product.save() and deletes are atomic), so polling the stats
+endpoint is a single-row read. count_stats() is the full COUNT fallback
+used to create, rebuild or verify a tenant's row.
+
+low_stock counts every tracked product at or below its threshold, out of
+stock ones included, using the resolver the low-stock alerts use
+(alerts.py); a change of the store's threshold recounts the row.
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Value
+from django.db.models.functions import Coalesce
+
+from . import alerts
+from .counters import apply_counter_deltas
+from .models import Product, ProductStats
+
+STAT_FIELDS = ('total', 'published', 'draft', 'archived', 'out_of_stock', 'low_stock')
+STATUS_FIELDS = {'published': 'published', 'draft': 'draft', 'archived': 'archived'}
+SNAPSHOT_FIELDS = ('tenant_id', 'status', 'track_quantity', 'stock_quantity', 'low_stock_threshold')
+
+
+def stock_levels(tenant_id, track_quantity, stock_quantity, threshold):
+    """The stock counters ('out_of_stock', 'low_stock') a product's stock fields count towards"""
+    levels = []
+    if track_quantity and stock_quantity <= 0:
+        levels.append('out_of_stock')
+    if alerts.is_low(tenant_id, track_quantity, stock_quantity, threshold):
+        levels.append('low_stock')
+    return levels
+
+
+def stats_key(product):
+    """
+    The fields that decide what a product counts towards. Stock levels are
+    resolved only when deltas are taken, so loading products stays free.
+    """
+    if product.tenant_id is None:
+        return None
+    return (product.tenant_id, product.status, product.track_quantity,
+            product.stock_quantity, product.low_stock_threshold)
+
+
+def snapshot(product):
+    """Remember what a product counted as when it was loaded"""
+    if product.get_deferred_fields().intersection(SNAPSHOT_FIELDS):
+        product._stats_key = False  # unknown; a save will recount the tenant
+    else:
+        product._stats_key = stats_key(product)
+
+
+def key_deltas(key, sign):
+    """Counter of {(tenant_id, field): delta} for adding/removing one product"""
+    deltas = Counter()
+    if key is None:
+        return deltas
+    tenant_id, status, *stock = key
+    deltas[(tenant_id, 'total')] += sign
+    if status in STATUS_FIELDS:
+        deltas[(tenant_id, STATUS_FIELDS[status])] += sign
+    for level in stock_levels(tenant_id, *stock):
+        deltas[(tenant_id, level)] += sign
+    return deltas
+
+
+def _create_stats_row(lookup, deltas):
+    # First write for this tenant: count what is there, change included
+    rebuild_stats(lookup['tenant_id'])
+
+
+def apply_deltas(deltas):
+    """Apply a Counter of {(tenant_id, field): delta}, one UPDATE per tenant"""
+    per_tenant = defaultdict(dict)
+    for (tenant_id, field), delta in deltas.items():
+        if delta:
+            per_tenant[tenant_id][field] = delta
+    rows = [({'tenant_id': tenant_id}, changes) for tenant_id, changes in per_tenant.items()]
+    apply_counter_deltas(ProductStats, rows, _create_stats_row)
+
+
+def status_change_deltas(queryset, new_status):
+    """
+    Counter deltas for moving every row of ``queryset`` to ``new_status``
+    (1 query). Totals and stock levels are unaffected by a status change.
+    """
+    deltas = Counter()
+    for row in queryset.order_by().values('tenant_id', 'status').annotate(n=Count('id')):
+        if row['status'] in STATUS_FIELDS:
+            deltas[(row['tenant_id'], STATUS_FIELDS[row['status']])] -= row['n']
+        if new_status in STATUS_FIELDS:
+            deltas[(row['tenant_id'], STATUS_FIELDS[new_status])] += row['n']
+    return deltas
+
+
+def product_saved(product, created):
+    old_key = None if created else getattr(product, '_stats_key', False)
+    new_key = stats_key(product)
+    if old_key is False:
+        rebuild_stats(product.tenant_id)
+    elif old_key != new_key:
+        deltas = key_deltas(new_key, 1)
+        deltas.update(key_deltas(old_key, -1))
+        apply_deltas(deltas)
+    product._stats_key = new_key
+
+
+def product_deleted(product):
+    old_key = getattr(product, '_stats_key', False)
+    if old_key is False:
+        rebuild_stats(product.tenant_id)
+    else:
+        apply_deltas(key_deltas(old_key, -1))
+
+
+def count_stats(tenant_id):
+    """Count a tenant's stats straight from the products table (1 query)"""
+    threshold = Coalesce('low_stock_threshold', Value(alerts.store_threshold(tenant_id)))
+    return Product.objects.filter(tenant_id=tenant_id).order_by().aggregate(
+        total=Count('id'),
+        published=Count('id', filter=Q(status='published')),
+        draft=Count('id', filter=Q(status='draft')),
+        archived=Count('id', filter=Q(status='archived')),
+        out_of_stock=Count('id', filter=Q(track_quantity=True, stock_quantity__lte=0)),
+        low_stock=Count('id', filter=Q(track_quantity=True, stock_quantity__lte=threshold)),
+    )
+
+
+@transaction.atomic
+def rebuild_stats(tenant_id):
+    """Recount one tenant's row from the products table"""
+    counts = count_stats(tenant_id)
+    if ProductStats.objects.filter(tenant_id=tenant_id).update(**counts):
+        return counts
+    try:
+        with transaction.atomic():
+            ProductStats.objects.create(tenant_id=tenant_id, **counts)
+    except IntegrityError:
+        # Created concurrently; our counts are at least as fresh
+        ProductStats.objects.filter(tenant_id=tenant_id).update(**counts)
+    return counts
+
+
+def get_stats(tenant):
+    """The tenant's counters as a dict (1 query once the row exists)"""
+    stats = ProductStats.objects.filter(tenant=tenant).values(*STAT_FIELDS).first()
+    if stats is None:
+        stats = rebuild_stats(tenant.pk)
+    return stats
+
+
+def verify_stats(tenant_id):
+    """Return {field: (stored, actual)} for every counter that has drifted"""
+    stored = ProductStats.objects.filter(tenant_id=tenant_id).values(*STAT_FIELDS).first() or {}
+    actual = count_stats(tenant_id)
+    return {
+        field: (stored.get(field), actual[field])
+        for field in STAT_FIELDS if stored.get(field) != actual[field]
+    }
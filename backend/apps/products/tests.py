@@ -1,3 +1,882 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin import AdminSite
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core import mail
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from apps.tenants.admin import TenantAdmin
+from apps.tenants.models import Tenant
+from .facets import rebuild_facets, stored_facets
+from .search import search_products
+from .media import parse_local_image
+from . import alerts, codes, ledger, stats
+from .inventory import adjust_stock, release_stock, reserve_stock
+from .models import (
+    Category, LowStockAlert, Product, ProductCodeSequence, ProductFacetCount, StockMovement, StockSnapshot,
+)
+from .views import ProductViewSet
+
+
+def make_products(tenant, count, **kwargs):
+    return [
+        Product.objects.create(tenant=tenant, name=f'Product {i}', description='', price=10, **kwargs)
+        for i in range(count)
+    ]
+
+
+class ProductKeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        products = make_products(self.tenant, 7)
+        # Force ties on created_at so the id tie-breaker matters
+        same = timezone.now() - timedelta(days=1)
+        Product.objects.filter(pk__in=[p.pk for p in products[:4]]).update(created_at=same)
+
+    def test_pages_forward_and_back_without_gaps(self):
+        expected = [str(pk) for pk in Product.objects.order_by('-created_at', '-id').values_list('id', flat=True)]
+
+        first = self.client.get('/api/products/products/', {'page_size': 3}).json()
+        self.assertNotIn('count', first)
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        third = self.client.get(second['next']).json()
+        self.assertIsNone(third['next'])
+
+        seen = [p['id'] for page in (first, second, third) for p in page['results']]
+        self.assertEqual(seen, expected)
+
+        back = self.client.get(third['previous']).json()
+        self.assertEqual([p['id'] for p in back['results']], [p['id'] for p in second['results']])
+        back = self.client.get(back['previous']).json()
+        self.assertEqual([p['id'] for p in back['results']], [p['id'] for p in first['results']])
+        self.assertIsNone(back['previous'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products/products/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class VendorProductsTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        make_products(self.tenant, 5)
+
+    @mock.patch.object(ProductViewSet, 'stream_batch_size', 2)
+    def test_by_vendor_streams_full_catalog(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/by_vendor/shop/')
+            body = json.loads(b''.join(response.streaming_content))
+        self.assertTrue(body['success'])
+        self.assertEqual(body['vendor']['subdomain'], 'shop')
+        self.assertEqual(body['count'], 5)
+        self.assertEqual(len(body['products']), 5)
+
+    def test_for_vendor_paginates_on_request(self):
+        first = self.client.get('/api/products/for_vendor/', {'vendor': 'shop', 'page_size': 3}).json()
+        self.assertEqual(first['count'], 3)
+        second = self.client.get(first['next']).json()
+        self.assertEqual(second['count'], 2)
+        self.assertIsNone(second['next'])
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.other = Tenant.objects.create(name='Other', subdomain='other', is_active=True)
+        self.boots = Product.objects.create(
+            tenant=self.tenant, name='Leather boots', description='Waterproof hiking boots', price=50
+        )
+        self.sandals = Product.objects.create(
+            tenant=self.tenant, name='Beach sandals', description='Go well with boots', price=20
+        )
+        Product.objects.create(tenant=self.other, name='Rubber boots', description='', price=30)
+
+    def _search(self, q, **params):
+        response = self.client.get('/api/products/products/search/', {'q': q, 'vendor': 'shop', **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_ranked_and_tenant_scoped(self):
+        self.assertEqual(self._search('boots'), [str(self.boots.pk), str(self.sandals.pk)])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.sandals.name = 'Flip flops'
+        self.sandals.description = ''
+        self.sandals.save()
+        self.assertEqual(self._search('boots'), [str(self.boots.pk)])
+        self.assertEqual(self._search('flip'), [str(self.sandals.pk)])
+
+        self.boots.delete()
+        self.assertEqual(self._search('boots'), [])
+
+    def test_sku_lookup_and_operator_input(self):
+        self.assertEqual(self._search(self.boots.sku), [str(self.boots.pk)])
+        self.assertEqual(self._search('"boots*)'), [str(self.boots.pk), str(self.sandals.pk)])
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.shoes = Category.objects.create(tenant=self.tenant, name='Shoes')
+        self.hats = Category.objects.create(tenant=self.tenant, name='Hats')
+
+    def _stored(self):
+        return sorted(ProductFacetCount.objects.filter(tenant=self.tenant, count__gt=0).values_list(
+            'status', 'facet', 'value', 'count'))
+
+    def test_incremental_counts_match_rebuild(self):
+        cheap = Product.objects.create(tenant=self.tenant, Category=self.shoes, name='Flip flops',
+                                       description='', price=300, stock_quantity=4)
+        pricey = Product.objects.create(tenant=self.tenant, Category=self.shoes, name='Boots',
+                                        description='', price=12000, stock_quantity=0)
+        Product.objects.create(tenant=self.tenant, name='Loose', description='', price=700, status='published')
+
+        cheap = Product.objects.get(pk=cheap.pk)
+        cheap.Category = self.hats
+        cheap.price = 1500
+        cheap.status = 'published'
+        cheap.save()
+        pricey.stock_quantity = 3
+        pricey.save()
+        Product.objects.get(pk=pricey.pk).delete()
+
+        incremental = self._stored()
+        rebuild_facets(self.tenant.pk)
+        self.assertEqual(incremental, self._stored())
+        self.assertIn(('published', 'price', '1000-2500', 1), incremental)
+
+    def test_list_returns_facets(self):
+        make_products(self.tenant, 3, Category=self.shoes, stock_quantity=1)
+        Product.objects.create(tenant=self.tenant, Category=self.hats, name='Cap', description='', price=600)
+
+        with self.assertNumQueries(5):
+            # cache scope id, tenant, page, stored facet counts, category names
+            data = self.client.get('/api/products/products/', {'vendor': 'shop', 'facets': 1}).json()
+        self.assertEqual(data['facets']['category'][0], {'value': str(self.shoes.pk), 'name': 'Shoes', 'count': 3})
+        self.assertEqual(data['facets']['stock'], [{'value': 'in_stock', 'count': 3}, {'value': 'out_of_stock', 'count': 1}])
+
+        data = self.client.get('/api/products/products/', {'vendor': 'shop', 'facets': 1, 'in_stock': 'true'}).json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(data['facets']['category'], [{'value': str(self.shoes.pk), 'name': 'Shoes', 'count': 3}])
+
+
+class StorefrontResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.other = Tenant.objects.create(name='Other', subdomain='other', is_active=True)
+        self.product = make_products(self.tenant, 1)[0]
+        make_products(self.other, 1)
+
+    def _list(self, subdomain='shop'):
+        return self.client.get('/api/products/products/', {'vendor': subdomain})
+
+    def test_repeat_reads_are_served_from_cache(self):
+        self.assertEqual(self._list()['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self._list()
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_writes_bump_only_their_tenant(self):
+        self._list()
+        self._list('other')
+        make_products(self.tenant, 1)
+        response = self._list()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertEqual(self._list('other')['X-Cache'], 'HIT')
+
+    def test_detail_and_tenant_reads_invalidate(self):
+        url = f'/api/products/products/{self.product.pk}/'
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.product.name = 'Renamed'
+        self.product.save()
+        self.assertEqual(self.client.get(url).json()['name'], 'Renamed')
+
+        self.client.get('/api/tenants/shop/')
+        self.assertEqual(self.client.get('/api/tenants/shop/')['X-Cache'], 'HIT')
+        settings = self.tenant.settings
+        settings.theme_color = '#000000'
+        settings.save()
+        response = self.client.get('/api/tenants/shop/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['tenant']['settings']['theme_color'], '#000000')
+
+    def test_store_changes_invalidate_the_unscoped_list(self):
+        first = self.client.get('/api/products/products/')
+        self.assertEqual(self.client.get('/api/products/products/')['X-Cache'], 'HIT')
+
+        self.tenant.name = 'Renamed'
+        self.tenant.save()
+        self.assertEqual(self.client.get('/api/products/products/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        response = self.client.get('/api/products/products/')
+        self.assertIn('Renamed', {product['tenant_name'] for product in response.json()['results']})
+
+        # Deactivating through the admin action (a queryset update) invalidates too
+        self.assertEqual(self.client.get('/api/products/products/')['X-Cache'], 'HIT')
+        TenantAdmin(Tenant, AdminSite()).reject_tenants(mock.Mock(), Tenant.objects.filter(pk=self.other.pk))
+        self.assertEqual(self.client.get('/api/products/products/')['X-Cache'], 'MISS')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.product = make_products(self.tenant, 1)[0]
+        self.url = f'/api/products/products/{self.product.pk}/'
+
+    def test_etag_revalidation(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.product.price = 99
+        self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified_revalidation(self):
+        # Within the second of the last write only the ETag is offered
+        self.assertNotIn('Last-Modified', self.client.get('/api/tenants/shop/'))
+
+        later = time.time() + 2
+        with mock.patch('apps.tenants.services.response_cache.time.time', return_value=later):
+            last_modified = self.client.get('/api/tenants/shop/')['Last-Modified']
+            response = self.client.get('/api/tenants/shop/', HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 304)
+
+            # A write in that same second is not hidden behind a 304
+            self.tenant.save()
+            response = self.client.get('/api/tenants/shop/', HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 200)
+
+    def test_signed_in_responses_are_private(self):
+        anonymous = self.client.get(self.url)
+        self.assertIn('Cookie', anonymous['Vary'])
+        self.assertIn('Authorization', anonymous['Vary'])
+
+        self.client.force_login(get_user_model().objects.create_user(username='jane', password='pw'))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+
+
+class CodeAllocatorTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.twin = Tenant.objects.create(name='Shop Two', subdomain='shoptwo', is_active=True)
+
+    def test_codes_are_unique_across_tenants_with_same_prefix(self):
+        products = make_products(self.tenant, 3) + make_products(self.twin, 3)
+        skus = {p.sku for p in products}
+        barcodes = {p.barcode for p in products}
+        self.assertEqual(len(skus), 6)
+        self.assertEqual(len(barcodes), 6)
+        self.assertTrue(all(sku.startswith('SHO-GEN-') for sku in skus))
+
+    def test_reserve_is_one_query_once_warm(self):
+        codes.reserve(self.tenant)
+        with self.assertNumQueries(1):
+            block = codes.reserve(self.tenant, 500)
+        self.assertEqual(len(block.values), 500)
+        self.assertEqual(block.values[0], 2)
+
+    def test_reserve_without_update_returning(self):
+        with mock.patch.object(codes, '_can_return_from_update', return_value=False):
+            first = codes.reserve(self.tenant, 3)
+            second = codes.reserve(self.tenant, 2)
+        self.assertEqual((list(first.values), list(second.values)), ([1, 2, 3], [4, 5]))
+        self.assertEqual(ProductCodeSequence.objects.get(tenant=self.tenant).next_value, 6)
+
+    def test_reserve_for_missing_tenant(self):
+        with self.assertRaisesMessage(ValueError, 'No tenant'):
+            codes.reserve(uuid.uuid4())
+
+    def test_assign_codes_batches_per_tenant(self):
+        products = [Product(tenant=self.tenant, name=f'P{i}', description='', price=1) for i in range(50)]
+        codes.assign_codes(products)
+        self.assertEqual(len({p.sku for p in products}), 50)
+        Product.objects.bulk_create(products)
+        self.assertEqual(ProductCodeSequence.objects.get(tenant=self.tenant).next_value, 51)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.user = get_user_model().objects.create_user(
+            username='vendor', email='vendor@example.com', password='pw', tenant=self.tenant,
+        )
+        self.client.force_login(self.user)
+        Product.objects.create(tenant=self.tenant, name='Existing', description='', price=1, sku='TAKEN')
+
+    def upload(self, name, content, **data):
+        data['file'] = SimpleUploadedFile(name, content.encode())
+        return self.client.post('/api/products/products/import/', data)
+
+    def test_csv_reports_bad_rows_and_imports_the_rest(self):
+        content = (
+            'name,price,stock_quantity,status,category,sku\n'
+            'Red boots,2500,3,published,Shoes,\n'
+            'No price,,1,draft,,\n'
+            'Blue boots,abc,1,draft,Shoes,\n'
+            'Clash,10,1,draft,,TAKEN\n'
+            'Green hat,300,0,draft,Hats,HAT-1\n'
+            'Twin hat,300,0,draft,Hats,HAT-1\n'
+        )
+        with mock.patch.object(ProductViewSet, 'import_chunk_size', 2):
+            response = self.upload('catalog.csv', content)
+
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (2, 4))
+        self.assertEqual([error['row'] for error in body['errors']], [2, 3, 4, 6])
+        self.assertIn('price', body['errors'][0]['errors'])
+
+        boots = Product.objects.get(name='Red boots')
+        self.assertEqual(boots.vendor, self.user)
+        self.assertEqual(boots.Category.name, 'Shoes')
+        self.assertIsNotNone(boots.published_at)
+        self.assertTrue(boots.sku and boots.barcode)
+        self.assertEqual(Product.objects.get(name='Green hat').sku, 'HAT-1')
+
+        # bulk_create skips signals, so the importer keeps search and facets current
+        self.assertEqual([p.name for p in search_products(self.tenant, 'boots')], ['Red boots'])
+        self.assertEqual(stored_facets(self.tenant, 'published')['price']['2500-5000'], 1)
+
+    def test_jsonl_import(self):
+        lines = [
+            json.dumps({'name': f'Item {i}', 'price': i + 1, 'is_featured': 'yes'}) for i in range(5)
+        ] + ['not json', '[1, 2]']
+        response = self.upload('catalog.jsonl', '\n'.join(lines))
+
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (5, 2))
+        self.assertEqual(Product.objects.filter(is_featured=True).count(), 5)
+
+    def test_queries_per_chunk_do_not_grow_with_rows(self):
+        def run(rows):
+            content = 'name,price\n' + ''.join(f'Item {i},10\n' for i in range(rows))
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.upload('catalog.csv', content).json()['created'], rows)
+            return len(queries)
+
+        run(5)  # creates the code sequence and facet rows
+        # 30 rows keeps one INSERT under SQLite's 999 bound-parameter cap
+        self.assertEqual(run(5), run(30))
+
+    def test_requires_a_file(self):
+        response = self.client.post('/api/products/products/import/', {})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkActionTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.other = Tenant.objects.create(name='Other', subdomain='other', is_active=True)
+        self.client.force_login(get_user_model().objects.create_user(
+            username='vendor', email='vendor@example.com', password='pw', tenant=self.tenant,
+        ))
+        self.products = make_products(self.tenant, 4)
+        self.foreign = make_products(self.other, 1)[0]
+
+    def bulk(self, **data):
+        return self.client.post('/api/products/products/bulk/', data, content_type='application/json')
+
+    def test_publish_by_ids_is_one_update(self):
+        ids = [str(p.pk) for p in self.products[:3]] + [str(self.foreign.pk)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk(action='publish', ids=ids)
+        self.assertEqual(response.json()['updated'], 3)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "products"') for q in queries), 1)
+
+        published = Product.objects.filter(status='published')
+        self.assertEqual(published.count(), 3)
+        self.assertFalse(published.filter(published_at__isnull=True).exists())
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.status, 'draft')
+        self.assertEqual(stored_facets(self.tenant, 'published')['price']['0-500'], 3)
+
+        # Already-published rows are left alone
+        self.assertEqual(self.bulk(action='publish', ids=ids).json()['updated'], 0)
+
+    def test_reprice_by_filter(self):
+        Product.objects.filter(pk=self.products[0].pk).update(is_featured=True)
+        response = self.bulk(action='reprice', filters={'is_featured': True}, percent=-15)
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).price, Decimal('8.50'))
+
+        self.bulk(action='reprice', filters={}, amount=-100)
+        self.assertEqual(set(Product.objects.filter(tenant=self.tenant).values_list('price', flat=True)), {Decimal('0.00')})
+        self.assertEqual(Product.objects.get(pk=self.foreign.pk).price, Decimal('10.00'))
+
+    def test_counters_follow_without_recount(self):
+        stats.rebuild_stats(self.tenant.pk)
+        Product.objects.filter(pk=self.products[3].pk).update(price=700)
+        rebuild_facets(self.tenant.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.bulk(action='publish', ids=[str(p.pk) for p in self.products[2:]])
+            self.bulk(action='reprice', filters={'status': 'published'}, percent=100)
+            self.bulk(action='archive', filters={'min_price': 15})
+        self.assertFalse(any(q['sql'].startswith('DELETE') for q in queries))
+
+        self.assertEqual(stats.verify_stats(self.tenant.pk), {})
+        stored = {status: stored_facets(self.tenant, status) for status in ('draft', 'published', 'archived')}
+        rebuild_facets(self.tenant.pk)
+        for status, facets in stored.items():
+            self.assertEqual(facets, stored_facets(self.tenant, status))
+        self.assertEqual(stored['archived']['price'], {'0-500': 1, '1000-2500': 1})
+
+    def test_rejects_missing_selection_and_bad_params(self):
+        self.assertEqual(self.bulk(action='archive').status_code, 400)
+        self.assertEqual(self.bulk(action='explode', filters={}).status_code, 400)
+        self.assertEqual(self.bulk(action='reprice', filters={}).status_code, 400)
+
+
+class ProductStatsTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.client.force_login(get_user_model().objects.create_user(
+            username='vendor', email='vendor@example.com', password='pw', tenant=self.tenant,
+        ))
+
+    def test_counters_follow_writes(self):
+        low, empty, plenty = make_products(self.tenant, 3, stock_quantity=2)
+        Product.objects.create(tenant=self.tenant, name='Untracked', description='', price=1,
+                               track_quantity=False, stock_quantity=0, status='published')
+        empty.stock_quantity = 0
+        empty.save()
+        plenty = Product.objects.get(pk=plenty.pk)
+        plenty.stock_quantity = 50
+        plenty.status = 'archived'
+        plenty.save()
+        Product.objects.get(pk=low.pk).delete()
+
+        self.assertEqual(stats.verify_stats(self.tenant.pk), {})
+        self.assertEqual(stats.get_stats(self.tenant), {
+            'total': 3, 'published': 1, 'draft': 1, 'archived': 1, 'out_of_stock': 1, 'low_stock': 1,
+        })
+
+    def test_bulk_paths_keep_counters_exact(self):
+        make_products(self.tenant, 2)
+        self.client.post('/api/products/products/import/', {
+            'file': SimpleUploadedFile('c.csv', b'name,price,stock_quantity\nA,1,3\nB,1,9\n'),
+        })
+        self.client.post('/api/products/products/bulk/', {'action': 'archive', 'filters': {'min_price': 5}},
+                         content_type='application/json')
+        self.assertEqual(stats.verify_stats(self.tenant.pk), {})
+
+    def test_endpoint_reads_one_row(self):
+        make_products(self.tenant, 2, status='published')
+        stats.get_stats(self.tenant)
+        # session, user, tenant, counters
+        with self.assertNumQueries(4):
+            data = self.client.get('/api/products/products/stats/').json()
+        self.assertEqual(data['total_products'], 2)
+        self.assertEqual(data['published_products'], 2)
+        self.assertEqual(data['out_of_stock'], 2)
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.vendor = get_user_model().objects.create_user(
+            username='vendor', email='vendor@example.com', password='pw', tenant=self.tenant,
+        )
+        self.client.force_login(self.vendor)
+        self.lamp, self.desk, self.chair = make_products(self.tenant, 3, stock_quantity=10, vendor=self.vendor)
+
+    def test_order_movements_are_one_insert(self):
+        lines = [(self.lamp, 2), (self.desk, 1), (self.chair, 4)]
+        with CaptureQueriesContext(connection) as ctx:
+            reserve_stock(lines, reference='order-1')
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "stock_movements"')]
+        self.assertEqual(len(inserts), 1)
+
+        release_stock(lines[:1], reference='order-1')
+        self.assertEqual(
+            list(StockMovement.objects.filter(product=self.lamp).order_by('id').values_list('kind', 'quantity', 'balance', 'reference')),
+            [('sale', -2, 8, 'order-1'), ('return', 2, 10, 'order-1')],
+        )
+
+    def test_edits_and_restocks_are_recorded(self):
+        self.client.patch(f'/api/products/products/{self.lamp.pk}/', {'stock_quantity': 4}, content_type='application/json')
+        response = self.client.post(f'/api/products/products/{self.lamp.pk}/stock/',
+                                    {'kind': 'restock', 'quantity': 20, 'reference': 'PO-1'}, content_type='application/json')
+        self.assertEqual(response.json()['stock_quantity'], 24)
+        self.assertEqual(self.client.post(f'/api/products/products/{self.lamp.pk}/stock/',
+                                          {'kind': 'sale', 'quantity': 1}, content_type='application/json').status_code, 400)
+
+        movements = self.client.get(f'/api/products/products/{self.lamp.pk}/stock/').json()['movements']
+        self.assertEqual([(m['kind'], m['quantity'], m['balance']) for m in movements],
+                         [('restock', 20, 24), ('adjustment', -6, 4)])
+        self.assertEqual(movements[1]['created_by'], str(self.vendor.pk))
+
+    def test_point_in_time_and_compaction(self):
+        reserve_stock([(self.lamp, 3)])
+        reserve_stock([(self.lamp, 2)])
+        ledger.record_movements('restock', [Product.objects.get(pk=self.desk.pk)], {self.desk.pk: 5})
+        long_ago = timezone.now() - timedelta(days=120)
+        StockMovement.objects.filter(product=self.lamp).update(created_at=long_ago)
+        reserve_stock([(self.lamp, 1)])
+        recent = StockMovement.objects.filter(product=self.lamp).latest('created_at', 'id')
+
+        self.assertEqual(ledger.stock_at(self.lamp, long_ago - timedelta(days=1)), 10)
+        self.assertEqual(ledger.stock_at(self.lamp, long_ago), 5)
+
+        self.assertEqual(ledger.compact_ledger(keep_days=90), (2, 1))
+        snapshot = StockSnapshot.objects.get()
+        self.assertEqual((snapshot.balance, snapshot.sold, snapshot.movements), (5, 5, 2))
+        self.assertEqual(list(StockMovement.objects.filter(product=self.lamp)), [recent])
+
+        self.assertEqual(ledger.stock_at(self.lamp, long_ago - timedelta(days=1)), 10)
+        self.assertEqual(ledger.stock_at(self.lamp, long_ago + timedelta(days=1)), 5)
+        self.assertEqual(ledger.stock_at(self.lamp, timezone.now()), 4)
+        self.assertEqual(ledger.compact_ledger(keep_days=90), (0, 0))
+
+
+@override_settings(LOW_STOCK_THRESHOLD=5)
+class LowStockAlertTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True, owner_email='owner@example.com')
+        self.client.force_login(get_user_model().objects.create_user(
+            username='vendor', email='vendor@example.com', password='pw', tenant=self.tenant,
+        ))
+        self.lamp, self.desk = make_products(self.tenant, 2, stock_quantity=8)
+
+    def test_one_alert_per_crossing(self):
+        reserve_stock([(self.lamp, 2)])
+        self.assertFalse(LowStockAlert.objects.exists())
+        reserve_stock([(self.lamp, 2)])
+        reserve_stock([(self.lamp, 1)])
+        alert = LowStockAlert.objects.get()
+        self.assertEqual((alert.stock_quantity, alert.threshold), (4, 5))
+
+        adjust_stock(self.lamp, 10, 'restock')
+        alert.refresh_from_db()
+        self.assertIsNotNone(alert.resolved_at)
+
+        # A direct edit is a crossing too
+        lamp = Product.objects.get(pk=self.lamp.pk)
+        lamp.stock_quantity = 1
+        lamp.save()
+        self.assertEqual(LowStockAlert.objects.filter(resolved_at__isnull=True).count(), 1)
+        self.assertEqual(LowStockAlert.objects.count(), 2)
+
+    def test_product_and_store_thresholds(self):
+        self.tenant.settings.low_stock_threshold = 7
+        self.tenant.settings.save()
+        Product.objects.filter(pk=self.desk.pk).update(low_stock_threshold=2)
+        self.desk.refresh_from_db()
+
+        reserve_stock([(self.lamp, 1), (self.desk, 5)])
+        self.assertEqual(list(LowStockAlert.objects.values_list('product_id', 'threshold')), [(self.lamp.pk, 7)])
+
+    def test_non_stock_changes_recheck_alerts(self):
+        def open_ids():
+            return set(LowStockAlert.objects.filter(resolved_at__isnull=True).values_list('product_id', flat=True))
+
+        # Created or imported already low
+        vase = Product.objects.create(tenant=self.tenant, name='Vase', description='', price=1, stock_quantity=2)
+        self.client.post('/api/products/products/import/', {
+            'file': SimpleUploadedFile('c.csv', b'name,price,stock_quantity\nRug,1,3\nBed,1,9\n'),
+        })
+        rug = Product.objects.get(name='Rug')
+        self.assertEqual(open_ids(), {vase.pk, rug.pk})
+
+        # Tracking switched off, then a product threshold raised
+        vase.track_quantity = False
+        vase.save()
+        lamp = Product.objects.get(pk=self.lamp.pk)
+        lamp.low_stock_threshold = 8
+        lamp.save()
+        self.assertEqual(open_ids(), {rug.pk, self.lamp.pk})
+
+        # The store default moves everything else
+        self.tenant.settings.low_stock_threshold = 8
+        self.tenant.settings.save()
+        self.assertEqual(open_ids(), {rug.pk, self.lamp.pk, self.desk.pk})
+        self.tenant.settings.low_stock_threshold = 2
+        self.tenant.settings.save()
+        self.assertEqual(open_ids(), {self.lamp.pk})
+
+        # The dashboard counts exactly the open alerts
+        self.assertEqual(stats.verify_stats(self.tenant.pk), {})
+        data = self.client.get('/api/products/products/stats/').json()
+        self.assertEqual((data['low_stock'], data['low_stock_threshold']), (1, 2))
+
+    def test_dashboard_list_and_digest(self):
+        reserve_stock([(self.lamp, 5), (self.desk, 6)])
+        with self.assertNumQueries(4):  # session, user, tenant, open alerts
+            data = self.client.get('/api/products/products/low-stock/').json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual({row['stock_quantity'] for row in data['results']}, {3, 2})
+
+        self.assertEqual(alerts.send_pending_alerts(), (1, 2))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['owner@example.com'])
+        self.assertEqual(alerts.send_pending_alerts(), (0, 0))
+
+    def test_opted_out_store_is_not_mailed(self):
+        self.tenant.settings.low_stock_alerts = False
+        self.tenant.settings.save()
+        reserve_stock([(self.lamp, 5)])
+        self.assertEqual(alerts.send_pending_alerts(), (0, 1))
+        self.assertEqual(mail.outbox, [])
+
+
+class CategoryListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        other = Tenant.objects.create(name='Other', subdomain='other', is_active=True)
+        Category.objects.create(tenant=other, name='Elsewhere')
+
+    def make_categories(self, count):
+        for i in range(count):
+            category = Category.objects.create(tenant=self.tenant, name=f'Category {i}')
+            make_products(self.tenant, 2, Category=category)
+            make_products(self.tenant, 1, Category=category, status='published')
+
+    def list_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/categories/', {'vendor': 'shop'})
+        return response.json(), len(queries)
+
+    def test_counts_in_constant_queries(self):
+        self.make_categories(2)
+        data, few = self.list_queries()
+        for i in range(2, 8):
+            category = Category.objects.create(tenant=self.tenant, name=f'Category {i}')
+            make_products(self.tenant, 3, Category=category)
+        data, many = self.list_queries()
+
+        # tenant id lookup, page count, one annotated page query
+        self.assertEqual(few, 3)
+        self.assertEqual(many, few)
+        self.assertEqual(data['count'], 8)
+        self.assertEqual({c['Product_count'] for c in data['results']}, {3})
+
+    def test_published_only_and_tenant_scoped(self):
+        self.make_categories(1)
+        data = self.client.get('/api/products/categories/', {'vendor': 'shop', 'published': 1}).json()
+        self.assertEqual([(c['name'], c['Product_count']) for c in data['results']], [('Category 0', 1)])
+
+        self.assertEqual(self.client.get('/api/products/categories/').json()['count'], 0)
+
+    def test_create_only_in_own_store(self):
+        payload = {'name': 'Sneaky', 'tenant': str(self.tenant.pk)}
+        response = self.client.post('/api/products/categories/?vendor=shop', payload)
+        self.assertIn(response.status_code, (401, 403))
+
+        get_user_model().objects.create_user(username='o', email='owner@other.com', password='pw')
+        Tenant.objects.filter(subdomain='other').update(owner_email='owner@other.com')
+        self.client.login(username='o', password='pw')
+        response = self.client.post('/api/products/categories/?vendor=shop', payload)
+        self.assertEqual(response.status_code, 201)
+        # Neither ?vendor= nor the payload's tenant picks the store written to
+        self.assertEqual(Category.objects.get(name='Sneaky').tenant.subdomain, 'other')
+
+    def test_update_and_delete_only_in_own_store(self):
+        target = Category.objects.create(tenant=self.tenant, name='Shoes')
+        url = f'/api/products/categories/{target.pk}/'
+        self.assertIn(self.client.patch(url + '?vendor=shop', {'name': 'Hacked'},
+                                        content_type='application/json').status_code, (401, 403))
+
+        get_user_model().objects.create_user(username='o', email='owner@other.com', password='pw')
+        Tenant.objects.filter(subdomain='other').update(owner_email='owner@other.com')
+        self.client.login(username='o', password='pw')
+        for query in ('?vendor=shop', f'?tenant_id={self.tenant.pk}'):
+            response = self.client.patch(url + query, {'name': 'Hacked'}, content_type='application/json')
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(self.client.delete(url + query).status_code, 404)
+        self.assertEqual(Category.objects.get(pk=target.pk).name, 'Shoes')
+
+        own = Category.objects.get(name='Elsewhere')
+        response = self.client.patch(f'/api/products/categories/{own.pk}/?vendor=shop', {'name': 'Renamed'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Category.objects.get(pk=own.pk).name, 'Renamed')
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.clothes = Category.objects.create(tenant=self.tenant, name='Clothes')
+        self.shoes = Category.objects.create(tenant=self.tenant, name='Shoes', parent=self.clothes)
+        self.boots = Category.objects.create(tenant=self.tenant, name='Boots', parent=self.shoes)
+        self.toys = Category.objects.create(tenant=self.tenant, name='Toys')
+        for category in (self.clothes, self.shoes, self.boots, self.toys):
+            make_products(self.tenant, 1, Category=category)
+
+    def descendants(self, category):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/products/products/', {
+                'vendor': 'shop', 'category__descendant_of': str(category.pk),
+            }).json()
+        return sorted(p['category_name'] for p in data['results']), queries
+
+    def test_descendant_filter(self):
+        names, _ = self.descendants(self.shoes)
+        self.assertEqual(names, ['Boots', 'Shoes'])
+        names, _ = self.descendants(self.clothes)
+        self.assertEqual(names, ['Boots', 'Clothes', 'Shoes'])
+
+    def test_descendant_filter_uses_literal_prefix_within_store(self):
+        names, queries = self.descendants(self.shoes)
+        self.assertEqual(names, ['Boots', 'Shoes'])
+        self.assertTrue(any(f"LIKE '{self.shoes.path}%'" in q['sql'] for q in queries))
+
+        other = Tenant.objects.create(name='Other', subdomain='other', is_active=True)
+        elsewhere = Category.objects.create(tenant=other, name='Elsewhere')
+        self.assertEqual(self.descendants(elsewhere)[0], [])
+        self.assertEqual(self.descendants(Category(tenant=self.tenant, name='Ghost'))[0], [])
+
+    def test_move_rewrites_subtree(self):
+        self.shoes.parent = self.toys
+        self.shoes.save()
+        self.boots.refresh_from_db()
+        self.assertEqual(self.boots.path, f'{self.toys.pk.hex}/{self.shoes.pk.hex}/{self.boots.pk.hex}/')
+        self.assertEqual(self.boots.depth, 2)
+        self.assertEqual(self.descendants(self.clothes)[0], ['Clothes'])
+
+        self.toys.refresh_from_db()
+        self.toys.parent = self.boots
+        with self.assertRaises(ValidationError):
+            self.toys.save()
+
+    def test_tree_is_one_query(self):
+        Category.objects.create(tenant=self.tenant, name='Sandals', parent=self.shoes)
+        # tenant id lookup, then the tree itself
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/products/categories/tree/', {'vendor': 'shop'}).json()
+        clothes, toys = data['categories']
+        self.assertEqual((clothes['name'], toys['name']), ('Clothes', 'Toys'))
+        shoes = clothes['children'][0]
+        self.assertEqual([c['name'] for c in shoes['children']], ['Boots', 'Sandals'])
+        self.assertEqual(shoes['product_count'], 1)
+
+
+class ProductImageUrlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+
+    def test_variants_built_once_on_save(self):
+        product = Product.objects.create(tenant=self.tenant, name='Boots', description='', price=1,
+                                         image='image/upload/v1/products/boots.jpg')
+        product = Product.objects.get(pk=product.pk)
+        self.assertEqual(set(product.image_urls), {'original', 'thumb', 'card', 'zoom'})
+        self.assertIn('/upload/c_fill,f_auto,h_160,q_auto,w_160/v1/products/boots.jpg', product.image_urls['thumb'])
+
+        with mock.patch('cloudinary.CloudinaryResource.build_url') as build_url:
+            product.name = 'Leather boots'
+            product.save()
+            data = self.client.get('/api/products/products/', {'vendor': 'shop'}).json()
+        build_url.assert_not_called()
+        self.assertEqual(data['results'][0]['image_url'], product.image_urls['original'])
+        self.assertEqual(data['results'][0]['image_urls']['card'], product.image_urls['card'])
+
+    def test_url_images_and_clearing(self):
+        url = 'https://res.cloudinary.com/demo/image/upload/v2/products/hat.png'
+        product = Product.objects.create(tenant=self.tenant, name='Hat', description='', price=1, image=url)
+        self.assertEqual(product.image_urls['original'], url)
+        self.assertIn('/upload/c_limit,f_auto,h_1600,q_auto,w_1600/v2/', product.image_urls['zoom'])
+
+        product.image = None
+        product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).image_urls, {})
+
+
+def png_bytes(color='red', size=(800, 600)):
+    buffer = BytesIO()
+    PILImage.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class LocalMediaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        local = {
+            'BACKEND': 'apps.products.media.ContentAddressedStorage',
+            'OPTIONS': {'location': self.root, 'base_url': '/media/cas/'},
+        }
+        settings_override = override_settings(STORAGES={**settings.STORAGES, 'product_images': local})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create(self, content, name='photo.png'):
+        return Product.objects.create(tenant=self.tenant, name='Lamp', description='', price=1,
+                                      image=SimpleUploadedFile(name, content))
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.create(png_bytes())
+        second = self.create(png_bytes(), name='copy.png')
+        self.create(png_bytes('blue'))
+
+        self.assertEqual(first.image_urls, second.image_urls)
+        self.assertTrue(first.image_urls['thumb'].startswith('/media/cas/variants/'))
+        originals = [f for _, _, files in os.walk(os.path.join(self.root, 'originals')) for f in files]
+        self.assertEqual(len(originals), 2)
+
+    def test_variants_rendered_and_served_immutable(self):
+        product = self.create(png_bytes())
+        call_command('render_image_variants', '--since', '5', '--workers', '2', stdout=StringIO())
+        digest, ext = parse_local_image(Product.objects.get(pk=product.pk).image)
+        self.assertEqual(ext, 'png')
+        variants = os.listdir(os.path.join(self.root, 'variants', digest[:2], digest))
+        self.assertEqual(sorted(variants), ['card.webp', 'thumb.webp', 'zoom.webp'])
+
+        response = self.client.get(product.image_urls['thumb'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        with PILImage.open(BytesIO(b''.join(response.streaming_content))) as thumb:
+            self.assertEqual((thumb.format, thumb.size), ('WEBP', (160, 160)))
+
+    def test_missing_variant_redirects_to_the_original(self):
+        product = self.create(png_bytes())
+        response = self.client.get(product.image_urls['zoom'])
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], product.image_urls['original'])
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'variants')))  # nothing rendered in the request
+
+        with override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.client.get(product.image_urls['original'])
+        self.assertTrue(response['X-Accel-Redirect'].startswith('/protected-media/originals/'))
+        self.assertEqual(self.client.get('/media/cas/variants/aa/' + 'a' * 64 + '/zoom.webp').status_code, 404)
+        self.assertEqual(self.client.get('/media/cas/variants/../../etc/passwd').status_code, 404)
+
+    def test_rejects_non_images(self):
+        with self.assertRaises(ValidationError):
+            Product.objects.create(tenant=self.tenant, name='Bad', description='', price=1,
+                                   image=SimpleUploadedFile('x.png', b'not an image'))
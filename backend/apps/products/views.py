@@ -3,23 +3,184 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+import mimetypes
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework.utils.encoders import JSONEncoder
+import uuid
 
 from apps.tenants.models import Tenant
 from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer, ProductCreateSerializer, ProductUpdateSerializer
+from .serializers import (
+    CategorySerializer, ProductSerializer, ProductCreateSerializer, ProductUpdateSerializer, StockMovementSerializer,
+)
+from .pagination import KeysetPagination
+from .search import search_products
+from .filters import ProductFilter
+from .facets import count_facets, format_facets, stored_facets
+from .bulk import ACTIONS, BulkActionError, run_bulk_action
+from .stats import get_stats
+from .inventory import adjust_stock
+from .alerts import open_alerts, store_threshold
+from .ledger import stock_at
+from .media import IMMUTABLE, get_storage, pending_original
+from .importer import ImportFileError, ProductImporter, detect_format, read_rows
+from django.core.cache import cache
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.tenants.services.response_cache import GLOBAL_SCOPE, cache_tenant_response, tenant_id_for_subdomain
+
+
+def owned_tenant(request):
+    """The store the signed-in vendor manages, or None"""
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    if getattr(user, 'tenant_id', None):
+        return Tenant.objects.filter(pk=user.tenant_id).first()
+    if user.email:
+        return Tenant.objects.filter(owner_email=user.email).first()
+    return None
+
+
+def category_tenant_id(request):
+    """
+    Tenant whose categories a request is about: ?vendor=, ?tenant_id=, the
+    subdomain's tenant, then the signed-in vendor's own store ('' if none)
+    """
+    vendor_subdomain = request.GET.get('vendor')
+    if vendor_subdomain:
+        return tenant_id_for_subdomain(vendor_subdomain)
+    tenant_id = request.GET.get('tenant_id')
+    if tenant_id:
+        try:
+            return str(uuid.UUID(tenant_id))
+        except ValueError:
+            return ''
+    tenant = getattr(request, 'tenant', None)
+    if tenant:
+        return str(tenant.pk)
+    tenant = owned_tenant(request)
+    return str(tenant.pk) if tenant else ''
+
+
+def category_list_scope(view, request, *args, **kwargs):
+    return view.get_tenant_id() or None
+
+
+def product_list_scope(view, request, *args, **kwargs):
+    # The list is only narrowed to one tenant by ?vendor=, otherwise it spans all
+    vendor_subdomain = request.GET.get('vendor')
+    if vendor_subdomain:
+        return tenant_id_for_subdomain(vendor_subdomain) or None
+    return GLOBAL_SCOPE
+
+
+def product_search_scope(view, request, *args, **kwargs):
+    vendor_subdomain = request.GET.get('vendor')
+    if vendor_subdomain:
+        return tenant_id_for_subdomain(vendor_subdomain) or None
+    tenant_id = request.GET.get('tenant_id')
+    if tenant_id:
+        try:
+            return str(uuid.UUID(tenant_id))
+        except ValueError:
+            return None
+    tenant = getattr(request, 'tenant', None)
+    return str(tenant.pk) if tenant else None
+
+
+def product_detail_scope(view, request, *args, pk=None, **kwargs):
+    """Tenant id owning a product, cached since products never change tenant"""
+    key = f"product:tenant:{pk}"
+    tenant_id = cache.get(key)
+    if tenant_id is None:
+        try:
+            tenant_id = Product.objects.filter(pk=pk).values_list('tenant_id', flat=True).first()
+        except ValidationError:
+            tenant_id = None
+        tenant_id = str(tenant_id) if tenant_id else ''
+        cache.set(key, tenant_id, settings.RESPONSE_CACHE_TTL)
+    return tenant_id or None
+
 
 class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
-    permission_classes = [AllowAny]
-    
+    # Reads may pick any store; writes only ever touch the caller's own
+    WRITE_ACTIONS = ('create', 'update', 'partial_update', 'destroy')
+
+    def get_permissions(self):
+        if self.action in self.WRITE_ACTIONS:
+            return [IsAuthenticated()]
+        return [AllowAny()]
+
+    def get_tenant_id(self):
+        if not hasattr(self, '_tenant_id'):
+            if self.action in self.WRITE_ACTIONS:
+                tenant = owned_tenant(self.request)
+                self._tenant_id = str(tenant.pk) if tenant else ''
+            else:
+                self._tenant_id = category_tenant_id(self.request)
+        return self._tenant_id
+
     def get_queryset(self):
-        return Category.objects.all()
+        tenant_id = self.get_tenant_id()
+        if not tenant_id:
+            return Category.objects.none()
+        # Count products in the same query instead of once per category;
+        # ?published=1 counts only what the storefront shows
+        products = Q(product__status='published') if self.request.GET.get('published') else None
+        return Category.objects.filter(tenant_id=tenant_id).annotate(
+            product_count=Count('product', filter=products),
+        )
+
+    @cache_tenant_response('categories:list', category_list_scope)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    @cache_tenant_response('categories:tree', category_list_scope)
+    def tree(self, request):
+        """The tenant's categories as a nested tree, read in one query"""
+        nodes = {}
+        roots = []
+        # Ordering by path puts every parent before its children
+        for category in self.get_queryset().order_by('path'):
+            node = {
+                'id': str(category.id),
+                'name': category.name,
+                'depth': category.depth,
+                'product_count': category.product_count,
+                'children': [],
+            }
+            nodes[category.id] = node
+            parent = nodes.get(category.parent_id)
+            (parent['children'] if parent else roots).append(node)
+
+        def sort(children):
+            children.sort(key=lambda node: node['name'])
+            for node in children:
+                sort(node['children'])
+        sort(roots)
+        return Response({'success': True, 'categories': roots})
     
     def perform_create(self, serializer):
-        if hasattr(self.request, 'tenant') and self.request.tenant:
-            serializer.save(tenant=self.request.tenant)
+        # Categories go to the caller's own store only; ?vendor= / ?tenant_id=
+        # select what is read, never where it is written
+        tenant = owned_tenant(self.request)
+        if tenant is None:
+            raise PermissionDenied('You do not manage a store.')
+        if getattr(self.request, 'tenant', None) and self.request.tenant.pk != tenant.pk:
+            raise PermissionDenied('You do not manage this store.')
+        serializer.save(tenant=tenant)
 
 class IsProductOwner(permissions.BasePermission):
     """
@@ -35,8 +196,13 @@ class ProductViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend]
+    pagination_class = KeysetPagination
+    stream_batch_size = 200
+    import_chunk_size = 500
+    stock_movement_kinds = ('restock', 'adjustment', 'return')
+    stock_movement_limit = 50
     
-    filterset_fields = ['status', 'Category', 'is_featured']
+    filterset_class = ProductFilter
     
     def get_serializer_class(self):
         if self.action in 'create':
@@ -47,6 +213,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = Product.objects.select_related('Category', 'tenant')
+        self.catalog_tenant = None
         
         # Handle tenant filtering
         tenant_slug = self.request.GET.get('tenant')
@@ -64,7 +231,7 @@ class ProductViewSet(viewsets.ModelViewSet):
                 # ✅ FIX: Remove is_active filter since tenants might not have this field
                 tenant = Tenant.objects.get(subdomain=vendor_subdomain)
                 queryset = queryset.filter(tenant=tenant)
-                print(f"✅ Filtering products for vendor: {vendor_subdomain}, found {queryset.count()} products")
+                self.catalog_tenant = tenant
             except Tenant.DoesNotExist:
                 print(f"❌ Vendor not found: {vendor_subdomain}")
                 return Product.objects.none()
@@ -73,6 +240,30 @@ class ProductViewSet(viewsets.ModelViewSet):
     
         return queryset
     
+    @cache_tenant_response('products:list', product_list_scope)
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.GET.get('facets') and self.catalog_tenant is not None:
+            response.data['facets'] = self.get_facets(request)
+        return response
+
+    @cache_tenant_response('products:detail', product_detail_scope)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_facets(self, request):
+        """
+        Facet counts for the current listing. The unfiltered (or status-only)
+        catalog is read from the precomputed table; anything narrower is
+        aggregated from the filtered queryset.
+        """
+        filter_params = set(ProductFilter.base_filters) & set(request.GET)
+        if filter_params <= {'status'}:
+            counts = stored_facets(self.catalog_tenant, status=request.GET.get('status'))
+        else:
+            counts = count_facets(self.filter_queryset(self.get_queryset()))
+        return format_facets(counts)
+
     def perform_create(self, serializer):
         print("🎯 PERFORM_CREATE CALLED!")
         print("📦 Data:", serializer.validated_data)
@@ -122,6 +313,59 @@ class ProductViewSet(viewsets.ModelViewSet):
         context['request'] = self.request
         return context
 
+    def vendor_payload(self, tenant):
+        return {
+            'id': str(tenant.id),
+            'name': tenant.name,
+            'subdomain': tenant.subdomain,
+            'description': tenant.description
+        }
+
+    def vendor_products_response(self, request, tenant):
+        """
+        Products for one vendor, either as a keyset page (?cursor= / ?page_size=)
+        or as the full catalog streamed in batches with bounded memory.
+        """
+        products = Product.objects.filter(tenant=tenant).select_related('Category', 'tenant')
+
+        if 'cursor' in request.GET or 'page_size' in request.GET:
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(products, request, view=self)
+            serializer = self.get_serializer(page, many=True)
+            return Response({
+                'success': True,
+                'vendor': self.vendor_payload(tenant),
+                'products': serializer.data,
+                'count': len(page),
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+            })
+
+        return StreamingHttpResponse(
+            self.stream_vendor_products(tenant, products.order_by('-created_at', '-id')),
+            content_type='application/json',
+        )
+
+    def stream_vendor_products(self, tenant, products):
+        """Yield the {success, vendor, products, count} body one batch at a time"""
+        encoder = JSONEncoder()
+        yield '{"success": true, "vendor": ' + encoder.encode(self.vendor_payload(tenant)) + ', "products": ['
+
+        count = 0
+        batch = []
+        for product in products.iterator(chunk_size=self.stream_batch_size):
+            batch.append(product)
+            if len(batch) == self.stream_batch_size:
+                yield (',' if count else '') + encoder.encode(self.get_serializer(batch, many=True).data)[1:-1]
+                count += len(batch)
+                batch = []
+        if batch:
+            yield (',' if count else '') + encoder.encode(self.get_serializer(batch, many=True).data)[1:-1]
+            count += len(batch)
+
+        # The count falls out of the stream, no separate COUNT(*) query
+        yield '], "count": %d}' % count
+
     
     
     # ✅ FIXED: Get products by vendor subdomain
@@ -137,23 +381,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             # ✅ FIX: Remove is_active filter
             tenant = get_object_or_404(Tenant, subdomain=vendor_subdomain)
             
-            # Filter products by this tenant
-            products = Product.objects.filter(tenant=tenant)
-            
-            # Serialize the products
-            serializer = self.get_serializer(products, many=True)
-            
-            return Response({
-                'success': True,
-                'vendor': {
-                    'id': str(tenant.id),
-                    'name': tenant.name,
-                    'subdomain': tenant.subdomain,
-                    'description': tenant.description
-                },
-                'products': serializer.data,
-                'count': products.count()
-            })
+            return self.vendor_products_response(request, tenant)
             
         except Tenant.DoesNotExist:
             return Response({
@@ -180,23 +408,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             # ✅ FIX: Remove is_active filter
             tenant = get_object_or_404(Tenant, id=tenant_id)
             
-            # Filter products by this tenant
-            products = Product.objects.filter(tenant=tenant)
-            
-            # Serialize the products
-            serializer = self.get_serializer(products, many=True)
-            
-            return Response({
-                'success': True,
-                'vendor': {
-                    'id': str(tenant.id),
-                    'name': tenant.name,
-                    'subdomain': tenant.subdomain,
-                    'description': tenant.description
-                },
-                'products': serializer.data,
-                'count': products.count()
-            })
+            return self.vendor_products_response(request, tenant)
             
         except (Tenant.DoesNotExist, ValueError):
             return Response({
@@ -233,20 +445,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             try:
                 # ✅ FIX: Remove is_active filter
                 tenant = Tenant.objects.get(subdomain=vendor_subdomain)
-                products = Product.objects.filter(tenant=tenant)
-                serializer = self.get_serializer(products, many=True)
-                
-                return Response({
-                    'success': True,
-                    'vendor': {
-                        'id': str(tenant.id),
-                        'name': tenant.name,
-                        'subdomain': tenant.subdomain,
-                        'description': tenant.description
-                    },
-                    'products': serializer.data,
-                    'count': products.count()
-                })
+                return self.vendor_products_response(request, tenant)
             except Tenant.DoesNotExist:
                 return Response({
                     'success': False,
@@ -260,29 +459,213 @@ class ProductViewSet(viewsets.ModelViewSet):
                 'error': 'Please provide either "vendor" or "tenant_id" parameter'
             }, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    @cache_tenant_response('products:search', product_search_scope)
+    def search(self, request):
+        """
+        Ranked full-text search within one store
+        URL: /api/products/products/search/?q=shoes&vendor=shavia
+        """
+        query = request.GET.get('q', '').strip()
+        vendor_subdomain = request.GET.get('vendor')
+        tenant_id = request.GET.get('tenant_id')
+
+        try:
+            if vendor_subdomain:
+                tenant = Tenant.objects.get(subdomain=vendor_subdomain)
+            elif tenant_id:
+                tenant = Tenant.objects.get(id=tenant_id)
+            elif getattr(request, 'tenant', None):
+                tenant = request.tenant
+            else:
+                return Response({
+                    'success': False,
+                    'error': 'Please provide either "vendor" or "tenant_id" parameter'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        except (Tenant.DoesNotExist, ValueError, ValidationError):
+            return Response({
+                'success': False,
+                'error': 'Vendor not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+        except ValueError:
+            limit = 20
+
+        products = search_products(tenant, query, status=request.GET.get('status'), limit=limit)
+        results = self.get_serializer(products, many=True).data
+        for item, product in zip(results, products):
+            item['search_rank'] = product.search_rank
+
+        return Response({
+            'success': True,
+            'query': query,
+            'results': results,
+            'count': len(results)
+        })
+
+    @action(
+        detail=False, methods=['post'], url_path='import',
+        permission_classes=[IsAuthenticated], parser_classes=[MultiPartParser, FormParser],
+    )
+    def bulk_import(self, request):
+        """
+        Import products from a CSV or JSON Lines file (multipart field ``file``).
+        The format comes from ``format`` or the file extension. Invalid rows
+        are reported by row number and skipped.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'success': False, 'error': 'Upload a CSV or JSONL file as "file"'}, status=status.HTTP_400_BAD_REQUEST)
+
+        tenant = owned_tenant(request)
+        if tenant is None:
+            return Response({'success': False, 'error': 'No store found for current user'}, status=status.HTTP_404_NOT_FOUND)
+
+        importer = ProductImporter(tenant, vendor=request.user, chunk_size=self.import_chunk_size)
+        try:
+            fmt = detect_format(upload, request.data.get('format'))
+            result = importer.run(read_rows(upload, fmt))
+        except ImportFileError as e:
+            return Response({'success': False, 'error': str(e), **importer.summary()}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'success': True, **result}, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='bulk', permission_classes=[IsAuthenticated])
+    def bulk_action(self, request):
+        """
+        Run one action over many products with a single UPDATE.
+        Body: {"action": "publish|unpublish|archive|feature|unfeature|reprice",
+               "ids": [...] or "filters": {...ProductFilter params...},
+               "percent": -10 or "amount": 5 (reprice only)}
+        """
+        tenant = owned_tenant(request)
+        if tenant is None:
+            return Response({'success': False, 'error': 'No store found for current user'}, status=status.HTTP_404_NOT_FOUND)
+
+        action_name = request.data.get('action')
+        if action_name not in ACTIONS:
+            return Response({'success': False, 'error': f"action must be one of: {', '.join(ACTIONS)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = Product.objects.filter(tenant=tenant)
+        ids = request.data.get('ids')
+        filters = request.data.get('filters')
+        if ids is not None:
+            try:
+                ids = [uuid.UUID(str(pk)) for pk in ids]
+            except (TypeError, ValueError):
+                return Response({'success': False, 'error': 'ids must be a list of product ids'}, status=status.HTTP_400_BAD_REQUEST)
+            products = products.filter(pk__in=ids)
+        elif isinstance(filters, dict):
+            filterset = ProductFilter(data=filters, queryset=products)
+            if not filterset.is_valid():
+                return Response({'success': False, 'error': filterset.errors}, status=status.HTTP_400_BAD_REQUEST)
+            products = filterset.qs
+        else:
+            return Response({'success': False, 'error': 'Send "ids" or "filters" to select products'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            updated = run_bulk_action(
+                tenant, products, action_name,
+                percent=request.data.get('percent'), amount=request.data.get('amount'),
+            )
+        except BulkActionError as e:
+            return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'success': True, 'action': action_name, 'updated': updated})
+
     @action(detail=True, methods=['post'])
     def publish(self, request, pk=None):
         product = self.get_object()
-        product.status = 'published'
-        product.save()
+        run_bulk_action(product.tenant, Product.objects.filter(pk=product.pk), 'publish')
         return Response({'status': 'product published'})
     
     @action(detail=True, methods=['post'])
     def unpublish(self, request, pk=None):
         product = self.get_object()
-        product.status = 'draft'
-        product.save()
+        run_bulk_action(product.tenant, Product.objects.filter(pk=product.pk), 'unpublish')
         return Response({'status': 'product unpublished'})
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def stats(self, request):
+        """Dashboard counters for the vendor's store, read from ProductStats"""
+        tenant = owned_tenant(request)
+        if tenant is None:
+            return Response({'success': False, 'error': 'No store found for current user'}, status=status.HTTP_404_NOT_FOUND)
+
+        counts = get_stats(tenant)
         return Response({
-            'total_products': 0,
-            'published_products': 0,
-            'draft_products': 0,
-            'out_of_stock': 0
+            'total_products': counts['total'],
+            'published_products': counts['published'],
+            'draft_products': counts['draft'],
+            'archived_products': counts['archived'],
+            'out_of_stock': counts['out_of_stock'],
+            'low_stock': counts['low_stock'],
+            'low_stock_threshold': store_threshold(tenant.pk),
         })
     
+    @action(detail=False, methods=['get'], url_path='low-stock', permission_classes=[IsAuthenticated])
+    def low_stock(self, request):
+        """Products currently at or below their low-stock threshold, read from open alerts"""
+        tenant = owned_tenant(request)
+        if tenant is None:
+            return Response({'success': False, 'error': 'No store found for current user'}, status=status.HTTP_404_NOT_FOUND)
+
+        products = [
+            {
+                'id': str(alert.product_id),
+                'name': alert.product.name,
+                'sku': alert.product.sku,
+                'stock_quantity': alert.product.stock_quantity,
+                'threshold': alert.threshold,
+                'low_since': alert.created_at,
+            }
+            for alert in open_alerts(tenant)
+        ]
+        return Response({'count': len(products), 'results': products})
+
+    @action(detail=True, methods=['get', 'post'], permission_classes=[IsAuthenticated])
+    def stock(self, request, pk=None):
+        """
+        GET: the product's latest stock movements, or its stock level at ?at=<ISO datetime>.
+        POST: {"kind": "restock|adjustment|return", "quantity": 10, "reference": "PO-17"}
+        Sales are recorded by checkout, not through this endpoint.
+        """
+        tenant = owned_tenant(request)
+        if tenant is None:
+            return Response({'success': False, 'error': 'No store found for current user'}, status=status.HTTP_404_NOT_FOUND)
+        product = get_object_or_404(Product, pk=pk, tenant=tenant)
+
+        if request.method == 'POST':
+            kind = request.data.get('kind')
+            if kind not in self.stock_movement_kinds:
+                return Response({'success': False, 'error': f"kind must be one of: {', '.join(self.stock_movement_kinds)}"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                quantity = int(request.data.get('quantity'))
+            except (TypeError, ValueError):
+                quantity = 0
+            if not quantity or (kind != 'adjustment' and quantity < 0):
+                return Response({'success': False, 'error': 'quantity must be a non-zero whole number (positive for restocks and returns)'}, status=status.HTTP_400_BAD_REQUEST)
+            balance = adjust_stock(product, quantity, kind, reference=str(request.data.get('reference') or '')[:64], user=request.user)
+            return Response({'success': True, 'stock_quantity': balance}, status=status.HTTP_201_CREATED)
+
+        at = request.query_params.get('at')
+        if at:
+            when = parse_datetime(at)
+            if when is None:
+                return Response({'success': False, 'error': 'at must be an ISO 8601 datetime'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(when):
+                when = timezone.make_aware(when)
+            return Response({'product': str(product.pk), 'at': when, 'stock_quantity': stock_at(product, when)})
+
+        movements = product.stock_movements.all()[:self.stock_movement_limit]
+        return Response({
+            'product': str(product.pk),
+            'stock_quantity': product.stock_quantity,
+            'movements': StockMovementSerializer(movements, many=True).data,
+        })
+
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
     def test_create(self, request):
         """Test product creation that always works"""
@@ -294,4 +677,34 @@ class ProductViewSet(viewsets.ModelViewSet):
             'message': 'Test product created successfully!',
             'product_id': 'test-id-123',
             'received_data': request.data
-        }, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        }, status=status.HTTP_201_CREATED)
+
+
+@require_safe
+def local_media(request, name):
+    """
+    Serve locally stored product images; names are content hashes, so cache
+    forever. A variant the worker has not rendered yet redirects, uncached,
+    to its original; nothing is rendered in the request.
+    """
+    storage = get_storage()
+    try:
+        found = storage is not None and storage.exists(name)
+        original = None if found or storage is None else pending_original(storage, name)
+    except SuspiciousFileOperation:
+        found, original = False, None
+    if original is not None:
+        response = HttpResponseRedirect(storage.url(original))
+        response['Cache-Control'] = 'no-cache'
+        return response
+    if not found:
+        raise Http404('No such file')
+
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + name
+    else:
+        response = FileResponse(storage.open(name, 'rb'), content_type=content_type)
+    response['Cache-Control'] = IMMUTABLE
+    return response
@@ -1,5 +1,7 @@
 from django.contrib import admin
 from .models import Tenant
+from .services.response_cache import GLOBAL_SCOPE, bump_version
+from .services.tenant_resolver import tenant_resolver
 # Register your models here.
 
 @admin.register(Tenant)
@@ -11,12 +13,20 @@ class TenantAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
     actions = ['approve_tenants', 'reject_tenants']
 
+    def invalidate_caches(self, queryset):
+        # queryset.update() skips post_save, so evict the tenant caches by hand
+        rows = list(queryset.values_list('id', 'subdomain'))
+        tenant_resolver.invalidate(*[subdomain for _, subdomain in rows])
+        bump_version(*[tenant_id for tenant_id, _ in rows], GLOBAL_SCOPE)
+
     def approve_tenants(self, request,queryset):
         updated = queryset.update(subscription_status='active', is_active=True)
+        self.invalidate_caches(queryset)
         self.message_user(request, f'{updated} tenants approved successfully.')
     approve_tenants.short_description = "Approve selected tenants"
 
     def reject_tenants(self, request,queryset):
         updated = queryset.update(subscription_status='inactive', is_active=False)
+        self.invalidate_caches(queryset)
         self.message_user(request, f'{updated} tenants rejected.')
     reject_tenants.short_description = "Reject selected tenants"
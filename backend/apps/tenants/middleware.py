@@ -1,37 +1,47 @@
-from django.http import Http404
-from .models import Tenant
+from django.utils.functional import SimpleLazyObject
+
+from .services.tenant_resolver import tenant_resolver
+
+RESERVED_SUBDOMAINS = ['www', 'api', 'admin']
+
+
+def subdomain_from_host(host):
+    """Extract the tenant subdomain from a host, or None for bare/reserved hosts"""
+    host = host.split(':')[0]
+    subdomain_parts = host.split('.')
+
+    # For local development (shop.localhost) vs production (shop.domain.com)
+    if len(subdomain_parts) == 1 or subdomain_parts[-1] in ['localhost', '127.0.0.1']:
+        min_parts = 2
+    else:
+        min_parts = 3
+
+    if len(subdomain_parts) >= min_parts and subdomain_parts[0] not in RESERVED_SUBDOMAINS:
+        return subdomain_parts[0]
+    return None
+
 
 class TenantMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # Extract subdomain from host
-        host = request.get_host().split(':')[0]
-        subdomain_parts = host.split('.')
-        
-        # For local development
-        if len(subdomain_parts) == 1 or subdomain_parts[-1] in ['localhost', '127.0.0.1']:
-            if len(subdomain_parts) > 1 and subdomain_parts[0] not in ['www', 'api', 'admin']:
-                subdomain = subdomain_parts[0]
-                try:
-                    tenant = Tenant.objects.get(subdomain=subdomain, is_active=True)
-                    request.tenant = tenant
-                except Tenant.DoesNotExist:
-                    request.tenant = None
-            else:
-                request.tenant = None
-        else:
-            # For production (domain.com)
-            if len(subdomain_parts) > 2 and subdomain_parts[0] not in ['www', 'api', 'admin']:
-                subdomain = subdomain_parts[0]
-                try:
-                    tenant = Tenant.objects.get(subdomain=subdomain, is_active=True)
-                    request.tenant = tenant
-                except Tenant.DoesNotExist:
-                    request.tenant = None
-            else:
-                request.tenant = None
-        
+        # Resolve the tenant on first access, like request.user, so endpoints
+        # that never read it (health, token, admin) skip the lookup entirely
+        request.tenant_resolved = False
+
+        def get_tenant():
+            request.tenant_resolved = True
+            subdomain = subdomain_from_host(request.get_host())
+            return tenant_resolver.resolve(subdomain) if subdomain else None
+
+        request.tenant = SimpleLazyObject(get_tenant)
+
         response = self.get_response(request)
-        return response
\ No newline at end of file
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        tenant_resolver.record_request(
+            resolver_match.view_name if resolver_match else None,
+            request.tenant_resolved,
+        )
+        return response
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_missing_settings(apps, schema_editor):
+    Tenant = apps.get_model('tenants', 'Tenant')
+    StoreSettings = apps.get_model('tenants', 'StoreSettings')
+    missing = Tenant.objects.filter(settings__isnull=True).values_list('id', flat=True)
+    StoreSettings.objects.bulk_create(
+        [StoreSettings(store_id=tenant_id) for tenant_id in missing],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0006_alter_storesettings_free_shipping_threshold_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_settings, migrations.RunPython.noop),
+    ]
@@ -91,6 +91,8 @@ class StoreSettings(models.Model):
     email_notifications = models.BooleanField(default=True)
     order_notifications = models.BooleanField(default=True)
     low_stock_alerts = models.BooleanField(default=True)
+    # Falls back to settings.LOW_STOCK_THRESHOLD; products may override it
+    low_stock_threshold = models.PositiveIntegerField(null=True, blank=True)
     customer_emails = models.BooleanField(default=True)
     newsletter_subscription = models.BooleanField(default=False)
     notification_email = models.EmailField(blank=True, default='')
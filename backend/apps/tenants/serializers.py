@@ -17,8 +17,11 @@ class TenantSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'settings']
     
     def get_settings(self, obj):
-        # Get or create settings for this tenant
-        settings, created = StoreSettings.objects.get_or_create(store=obj)
+        # Settings are created with the tenant and joined via select_related('settings')
+        try:
+            settings = obj.settings
+        except StoreSettings.DoesNotExist:
+            return None
         return StoreSettingsSerializer(settings).data
 
 class TenantCreateSerializer(serializers.ModelSerializer):
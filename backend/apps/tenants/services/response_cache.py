@@ -0,0 +1,177 @@
+# apps/tenants/services/response_cache.py
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from apps.tenants.models import Tenant
+
+# Scope for responses that are not tied to one tenant (e.g. unscoped lists)
+GLOBAL_SCOPE = 'global'
+
+
+def _version_key(scope):
+    return f"tenant:version:{scope}"
+
+
+def _modified_key(scope):
+    return f"tenant:modified:{scope}"
+
+
+def get_version(scope):
+    """Current cache version for a tenant id (or GLOBAL_SCOPE)"""
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Start from a clock value rather than 1 so an evicted counter can
+        # never come back to a number that older cached responses still use
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(*scopes):
+    """Invalidate every cached response for the given tenants in O(1)"""
+    now = time.time()
+    for scope in {str(s) for s in scopes if s}:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+        cache.set(_modified_key(scope), now, None)
+
+
+def get_last_modified(scope):
+    """Unix time of the last write seen for a scope (now, if we never saw one)"""
+    key = _modified_key(scope)
+    modified = cache.get(key)
+    if modified is None:
+        modified = time.time()
+        if not cache.add(key, modified, None):
+            modified = cache.get(key, modified)
+    return modified
+
+
+def tenant_id_for_subdomain(subdomain):
+    """Map a subdomain to a tenant id string ('' if unknown) through the cache"""
+    if not subdomain:
+        return ''
+    key = f"tenant:id:{subdomain.lower()}"
+    tenant_id = cache.get(key)
+    if tenant_id is None:
+        pk = Tenant.objects.filter(subdomain__iexact=subdomain).values_list('id', flat=True).first()
+        tenant_id = str(pk) if pk else ''
+        cache.set(key, tenant_id, settings.RESPONSE_CACHE_TTL)
+    return tenant_id
+
+
+def forget_subdomains(*subdomains):
+    cache.delete_many([f"tenant:id:{s.lower()}" for s in subdomains if s])
+
+
+def _find_request(args):
+    for arg in args:
+        if isinstance(arg, (Request, HttpRequest)):
+            return arg
+    raise TypeError('cache_tenant_response needs a view that receives the request')
+
+
+def _cache_key(scope, endpoint, request, kwargs):
+    params = sorted((key, sorted(values)) for key, values in request.GET.lists())
+    # The host is part of the key because paginated bodies embed absolute links
+    raw = repr((request.get_host(), sorted(kwargs.items()), params))
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    return f"resp:{scope}:{get_version(scope)}:{endpoint}:{digest}"
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def _second_closed(last_modified):
+    # HTTP dates have one-second granularity: until the second of the last
+    # write is over, another write could land in it unseen by If-Modified-Since
+    return int(last_modified) < int(time.time())
+
+
+def _not_modified(request, etag, last_modified):
+    # The ETag changes with every write, so it wins whenever the client sent one
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or _strip_weak(etag) in {_strip_weak(e) for e in etags}
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return (if_modified_since is not None and _second_closed(last_modified)
+            and int(last_modified) <= if_modified_since)
+
+
+def _set_validators(response, etag, last_modified, anonymous):
+    response['ETag'] = etag
+    if _second_closed(last_modified):
+        response['Last-Modified'] = http_date(last_modified)
+    # Signed-in users can get a different body at the same URL; keep shared
+    # caches from handing one user's response to anybody else
+    patch_vary_headers(response, ('Cookie', 'Authorization'))
+    if not anonymous:
+        patch_cache_control(response, private=True)
+    return response
+
+
+def cache_tenant_response(endpoint, scope):
+    """
+    Cache anonymous GET responses per tenant, endpoint and query params, and
+    answer conditional GETs (If-None-Match / If-Modified-Since) for everyone.
+    Signed-in users get ETags of their own and private responses, and every
+    response varies on Cookie and Authorization.
+
+    ``scope`` receives the view's own arguments and returns the tenant id
+    (or GLOBAL_SCOPE) the response belongs to, or None to skip caching.
+    Writes bump the tenant's version, so stale entries are simply never
+    read again and expire on their own. The version also drives the ETag,
+    so a 304 costs no queries and no serializer work.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(*args, **kwargs):
+            request = _find_request(args)
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(*args, **kwargs)
+
+            tenant_scope = scope(*args, **kwargs)
+            if not tenant_scope:
+                return view_func(*args, **kwargs)
+
+            user = getattr(request, 'user', None)
+            anonymous = user is None or not user.is_authenticated
+            key = _cache_key(tenant_scope, endpoint, request, kwargs)
+            # A user's own view of the URL gets its own ETag
+            etag_source = key if anonymous else f'{key}:user:{user.pk}'
+            etag = 'W/"%s"' % hashlib.sha1(etag_source.encode()).hexdigest()
+            last_modified = get_last_modified(tenant_scope)
+            if _not_modified(request, etag, last_modified):
+                return _set_validators(Response(status=304), etag, last_modified, anonymous)
+
+            cached = cache.get(key) if anonymous else None
+            if cached is not None:
+                response = Response(cached)
+                response['X-Cache'] = 'HIT'
+                return _set_validators(response, etag, last_modified, anonymous)
+
+            response = view_func(*args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                if anonymous:
+                    cache.set(key, response.data, settings.RESPONSE_CACHE_TTL)
+                    response['X-Cache'] = 'MISS'
+                _set_validators(response, etag, last_modified, anonymous)
+            return response
+        return wrapper
+    return decorator
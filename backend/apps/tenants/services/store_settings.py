@@ -0,0 +1,73 @@
+# apps/tenants/services/store_settings.py
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.tenants.models import StoreSettings
+
+# Read through the shared cache (settings.CACHES), so a settings save evicts
+# them for every worker; the TTL only bounds how long a missed eviction lasts
+SETTINGS_TTL = settings.RESPONSE_CACHE_TTL
+
+
+def default_shipping():
+    """Shipping for stores that have not set a rate (or requests without a store)"""
+    return {
+        'enabled': True,
+        'rate': settings.DEFAULT_SHIPPING_RATE,
+        'free_threshold': settings.DEFAULT_FREE_SHIPPING_THRESHOLD,
+    }
+
+
+def _shipping_key(tenant_id):
+    return f"tenant:shipping:{tenant_id}"
+
+
+def get_shipping_settings(tenant_id):
+    """
+    A store's shipping settings as {'enabled', 'rate', 'free_threshold'},
+    read through the cache so pricing a cart costs no settings query.
+    A store that ships but has no rate of its own gets default_shipping().
+    """
+    if not tenant_id:
+        return default_shipping()
+    key = _shipping_key(tenant_id)
+    shipping = cache.get(key)
+    if shipping is None:
+        row = StoreSettings.objects.filter(store_id=tenant_id).values_list(
+            'shipping_enabled', 'shipping_rate', 'free_shipping_threshold',
+        ).first()
+        shipping = dict(zip(('enabled', 'rate', 'free_threshold'), row)) if row else {}
+        cache.set(key, shipping, SETTINGS_TTL)
+    if not shipping or (shipping['enabled'] and shipping['rate'] is None):
+        return default_shipping()
+    return shipping
+
+
+def _low_stock_key(tenant_id):
+    return f"tenant:low_stock:{tenant_id}"
+
+
+def get_low_stock_threshold(tenant_id):
+    """
+    A store's own low-stock threshold (None if it has none), read through
+    the cache so checking a product's stock level costs no settings query.
+    """
+    if not tenant_id:
+        return None
+    key = _low_stock_key(tenant_id)
+    cached = cache.get(key)
+    if cached is None:
+        threshold = StoreSettings.objects.filter(store_id=tenant_id).values_list(
+            'low_stock_threshold', flat=True,
+        ).first()
+        cached = {'threshold': threshold}
+        cache.set(key, cached, SETTINGS_TTL)
+    return cached['threshold']
+
+
+def forget_store_settings(*tenant_ids):
+    keys = []
+    for tenant_id in tenant_ids:
+        if tenant_id:
+            keys += [_shipping_key(tenant_id), _low_stock_key(tenant_id)]
+    cache.delete_many(keys)
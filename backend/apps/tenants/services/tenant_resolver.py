@@ -0,0 +1,148 @@
+# apps/tenants/services/tenant_resolver.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from apps.tenants.models import Tenant
+
+# Marker stored in both tiers for subdomains that do not map to an active tenant
+_MISSING = '__tenant_missing__'
+
+
+class TenantResolver:
+    """
+    Two-level subdomain -> Tenant lookup.
+
+    Level 1 is a per-process LRU with a short TTL, level 2 is the Django
+    cache every worker shares (settings.CACHES, Redis in production), so an
+    invalidation reaches other workers within the local TTL. Unknown subdomains are cached too so bots probing random
+    hosts do not hit the database on every request.
+    """
+
+    def __init__(self, maxsize=1024, local_ttl=30, shared_ttl=300, cache_alias='default'):
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.cache_alias = cache_alias
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'negative_hits': 0,
+            'db_queries': 0,
+            'invalidations': 0,
+        }
+        # url_name -> {'resolved': n, 'skipped': n} for lazy request.tenant
+        self._endpoints = {}
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def cache_key(subdomain):
+        return f"tenant:subdomain:{subdomain}"
+
+    def resolve(self, subdomain):
+        """Return the active Tenant for a subdomain, or None"""
+        subdomain = subdomain.lower()
+
+        value = self._get_local(subdomain)
+        if value is not None:
+            self._incr('local_hits')
+            return self._unwrap(value)
+
+        key = self.cache_key(subdomain)
+        value = self.shared.get(key)
+        if value is not None:
+            self._incr('shared_hits')
+            self._set_local(subdomain, value)
+            return self._unwrap(value)
+
+        self._incr('misses')
+        self._incr('db_queries')
+        try:
+            value = Tenant.objects.get(subdomain=subdomain, is_active=True)
+        except Tenant.DoesNotExist:
+            value = _MISSING
+
+        self.shared.set(key, value, self.shared_ttl)
+        self._set_local(subdomain, value)
+        return self._unwrap(value)
+
+    def invalidate(self, *subdomains):
+        """Drop cached entries (positive or negative) for the given subdomains"""
+        subdomains = {s.lower() for s in subdomains if s}
+        if not subdomains:
+            return
+        with self._lock:
+            for subdomain in subdomains:
+                self._local.pop(subdomain, None)
+            self._stats['invalidations'] += len(subdomains)
+        self.shared.delete_many([self.cache_key(s) for s in subdomains])
+
+    def record_request(self, endpoint, resolved):
+        """Count whether a request actually needed its tenant"""
+        with self._lock:
+            counts = self._endpoints.setdefault(endpoint or 'unresolved', {'resolved': 0, 'skipped': 0})
+            counts['resolved' if resolved else 'skipped'] += 1
+
+    def clear(self):
+        """Empty the local tier and reset counters (used by tests)"""
+        with self._lock:
+            self._local.clear()
+            self._endpoints.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['local_size'] = len(self._local)
+            data['endpoints'] = {name: dict(counts) for name, counts in self._endpoints.items()}
+        lookups = data['local_hits'] + data['shared_hits'] + data['misses']
+        data['hit_ratio'] = round((lookups - data['misses']) / lookups, 4) if lookups else 0.0
+        return data
+
+    def _unwrap(self, value):
+        if value == _MISSING:
+            self._incr('negative_hits')
+            return None
+        # Hand out a copy so per-request mutations never leak into the cache
+        return copy.copy(value)
+
+    def _get_local(self, subdomain):
+        with self._lock:
+            entry = self._local.get(subdomain)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._local[subdomain]
+                return None
+            self._local.move_to_end(subdomain)
+            return value
+
+    def _set_local(self, subdomain, value):
+        with self._lock:
+            self._local[subdomain] = (time.monotonic() + self.local_ttl, value)
+            self._local.move_to_end(subdomain)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def _incr(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+tenant_resolver = TenantResolver(
+    maxsize=getattr(settings, 'TENANT_CACHE_MAXSIZE', 1024),
+    local_ttl=getattr(settings, 'TENANT_CACHE_LOCAL_TTL', 30),
+    shared_ttl=getattr(settings, 'TENANT_CACHE_SHARED_TTL', 300),
+)
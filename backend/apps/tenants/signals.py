@@ -0,0 +1,46 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import StoreSettings, Tenant
+from .services.response_cache import GLOBAL_SCOPE, bump_version, forget_subdomains
+from .services.store_settings import forget_store_settings
+from .services.tenant_resolver import tenant_resolver
+
+
+@receiver(post_init, sender=Tenant)
+def remember_subdomain(sender, instance, **kwargs):
+    # Keep the loaded subdomain so a rename also evicts the old host
+    instance._loaded_subdomain = instance.subdomain
+
+
+@receiver(post_save, sender=Tenant)
+def invalidate_tenant_on_save(sender, instance, **kwargs):
+    subdomains = (instance.subdomain, getattr(instance, '_loaded_subdomain', None))
+    tenant_resolver.invalidate(*subdomains)
+    forget_subdomains(*subdomains)
+    # The unscoped product list embeds store names and hides inactive stores
+    bump_version(instance.pk, GLOBAL_SCOPE)
+    instance._loaded_subdomain = instance.subdomain
+
+
+@receiver(post_save, sender=Tenant)
+def create_store_settings(sender, instance, created, raw=False, **kwargs):
+    # Every tenant gets its settings row up front so reads never write
+    if created and not raw:
+        StoreSettings.objects.create(store=instance)
+
+
+@receiver(post_delete, sender=Tenant)
+def invalidate_tenant_on_delete(sender, instance, **kwargs):
+    subdomains = (instance.subdomain, getattr(instance, '_loaded_subdomain', None))
+    tenant_resolver.invalidate(*subdomains)
+    forget_subdomains(*subdomains)
+    # The unscoped product list embeds store names and hides inactive stores
+    bump_version(instance.pk, GLOBAL_SCOPE)
+
+
+@receiver(post_save, sender=StoreSettings)
+@receiver(post_delete, sender=StoreSettings)
+def bump_version_on_settings_change(sender, instance, **kwargs):
+    bump_version(instance.store_id)
+    forget_store_settings(instance.store_id)
@@ -1,3 +1,137 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .middleware import subdomain_from_host
+from .models import StoreSettings, Tenant
+from .services.store_settings import get_shipping_settings
+from .services.tenant_resolver import TenantResolver, tenant_resolver
+
+
+class TenantResolverTests(TestCase):
+    def setUp(self):
+        tenant_resolver.clear()
+        tenant_resolver.shared.clear()
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+
+    def test_subdomain_from_host(self):
+        self.assertEqual(subdomain_from_host('shop.localhost:8000'), 'shop')
+        self.assertEqual(subdomain_from_host('shop.example.com'), 'shop')
+        self.assertIsNone(subdomain_from_host('localhost'))
+        self.assertIsNone(subdomain_from_host('www.example.com'))
+        self.assertIsNone(subdomain_from_host('example.com'))
+
+    def test_steady_state_makes_no_queries(self):
+        self.assertEqual(tenant_resolver.resolve('shop').pk, self.tenant.pk)
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                self.assertEqual(tenant_resolver.resolve('shop').pk, self.tenant.pk)
+        stats = tenant_resolver.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['local_hits'], 5)
+
+    def test_negative_lookups_are_cached(self):
+        self.assertIsNone(tenant_resolver.resolve('nope'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(tenant_resolver.resolve('nope'))
+        self.assertEqual(tenant_resolver.stats()['negative_hits'], 2)
+
+    def test_shared_tier_serves_other_processes(self):
+        tenant_resolver.resolve('shop')
+        tenant_resolver._local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(tenant_resolver.resolve('shop').pk, self.tenant.pk)
+        self.assertEqual(tenant_resolver.stats()['shared_hits'], 1)
+
+    def test_workers_share_the_default_cache(self):
+        # Two resolvers stand in for two workers: only caches['default'] is shared
+        worker_a, worker_b = TenantResolver(), TenantResolver(local_ttl=0)
+        worker_a.resolve('shop')
+        self.assertEqual(caches['default'].get(TenantResolver.cache_key('shop')).pk, self.tenant.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(worker_b.resolve('shop').pk, self.tenant.pk)
+
+        Tenant.objects.filter(pk=self.tenant.pk).update(is_active=False)
+        worker_a.invalidate('shop')
+        self.assertIsNone(worker_b.resolve('shop'))
+
+    def test_save_and_delete_invalidate(self):
+        self.assertIsNone(tenant_resolver.resolve('newshop'))
+        Tenant.objects.create(name='New', subdomain='newshop', is_active=True)
+        self.assertIsNotNone(tenant_resolver.resolve('newshop'))
+
+        self.tenant.is_active = False
+        self.tenant.save()
+        self.assertIsNone(tenant_resolver.resolve('shop'))
+
+        self.tenant.is_active = True
+        self.tenant.subdomain = 'renamed'
+        self.tenant.save()
+        self.assertIsNone(tenant_resolver.resolve('shop'))
+        self.assertIsNotNone(tenant_resolver.resolve('renamed'))
+
+        self.tenant.delete()
+        self.assertIsNone(tenant_resolver.resolve('renamed'))
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class LazyTenantMiddlewareTests(TestCase):
+    def setUp(self):
+        tenant_resolver.clear()
+        tenant_resolver.shared.clear()
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+
+    def test_tenant_agnostic_endpoint_skips_lookup(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/health/', HTTP_HOST='shop.localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.wsgi_request.tenant_resolved)
+        self.assertEqual(tenant_resolver.stats()['endpoints']['health-check'], {'resolved': 0, 'skipped': 1})
+
+    def test_tenant_resolves_on_first_access(self):
+        response = self.client.get('/health/', HTTP_HOST='shop.localhost')
+        request = response.wsgi_request
+        self.assertFalse(request.tenant_resolved)
+        self.assertEqual(request.tenant.pk, self.tenant.pk)
+        self.assertTrue(request.tenant_resolved)
+
+
+class TenantListQueryTests(TestCase):
+    def _list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/tenants/tenants/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_settings_created_with_tenant(self):
+        tenant = Tenant.objects.create(name='Shop', subdomain='shop')
+        self.assertTrue(StoreSettings.objects.filter(store=tenant).exists())
+
+    def test_tenant_list_query_count_is_constant(self):
+        Tenant.objects.create(name='One', subdomain='one')
+        baseline = self._list_queries()
+        for i in range(5):
+            Tenant.objects.create(name=f'Shop {i}', subdomain=f'shop{i}')
+        self.assertEqual(self._list_queries(), baseline)
+        self.assertFalse(Tenant.objects.filter(settings__isnull=True).exists())
+
+
+class StoreSettingsCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.tenant = Tenant.objects.create(name='Shop', subdomain='shop', is_active=True)
+
+    def test_saves_evict_the_shared_entry(self):
+        self.tenant.settings.shipping_rate = Decimal('100')
+        self.tenant.settings.save()
+        self.assertEqual(get_shipping_settings(self.tenant.pk)['rate'], Decimal('100'))
+        self.assertIsNotNone(caches['default'].get(f'tenant:shipping:{self.tenant.pk}'))
+
+        # A save in any worker clears the entry every worker reads
+        StoreSettings.objects.filter(store=self.tenant).update(shipping_rate=Decimal('150'))
+        StoreSettings.objects.get(store=self.tenant).save()
+        self.assertIsNone(caches['default'].get(f'tenant:shipping:{self.tenant.pk}'))
+        self.assertEqual(get_shipping_settings(self.tenant.pk)['rate'], Decimal('150'))
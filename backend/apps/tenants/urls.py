@@ -17,6 +17,7 @@ urlpatterns = [
     path('tenant-status/<uuid:tenant_id>/', views.get_tenant_status, name='tenant-status'),
 
     path('admin/tenants/', views.admin_tenants_list, name='admin-tenants-list'),
+    path('admin/resolver-stats/', views.admin_tenant_resolver_stats, name='admin-tenant-resolver-stats'),
     path('admin/tenants/<uuid:tenant_id>/approve', views.admin_approve_tenant, name='admin.approve_tenant'),
     path('admin/tenants/<uuid:tenant_id>/reject', views.admin_reject_tenant, name='admin-reject-tenant'),
     path('my-store/', views.MyStoreView.as_view(), name='my-store'),
@@ -8,13 +8,15 @@ from rest_framework import generics, permissions
 from django.contrib.auth import get_user_model
 from .models import Tenant, StoreSettings
 from .serializers import TenantSerializer, TenantCreateSerializer, TenantRegistrationSerializer,StoreSettingsSerializer
+from .services.tenant_resolver import tenant_resolver
+from .services.response_cache import cache_tenant_response, tenant_id_for_subdomain
 import uuid
 
 
 User = get_user_model()
 
 class TenantViewSet(viewsets.ModelViewSet):
-    queryset = Tenant.objects.all()
+    queryset = Tenant.objects.select_related('settings')
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -37,15 +39,20 @@ def deactivate(self, request, pk=None):
     serializer = self.get_serializer(tenant)
     return Response(serializer.data)
 
+def tenant_by_subdomain_scope(request, subdomain):
+    return tenant_id_for_subdomain(str(subdomain).strip().rstrip('/')) or None
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_tenant_response('tenants:by_subdomain', tenant_by_subdomain_scope)
 def tenant_by_subdomain(request, subdomain):
     print(f"🔍 tenant_by_subdomain called with subdomain: '{subdomain}'")
     
     subdomain = str(subdomain).strip().lower().rstrip('/')
     print(f"🔍 Looking for tenant with cleaned subdomain: '{subdomain}'")
     try:
-        tenant = Tenant.objects.get(subdomain__iexact=subdomain)
+        tenant = Tenant.objects.select_related('settings').get(subdomain__iexact=subdomain)
         serializer = TenantSerializer(tenant)
         print(f"✅ Found tenant: {tenant.name}")
         return Response({
@@ -165,7 +172,7 @@ def register_tenant(request):
 def get_tenant_status(request, tenant_id):
     #check tenant registration and subscription status
     try:
-        tenant = Tenant.objects.get(id=tenant_id)
+        tenant = Tenant.objects.select_related('settings').get(id=tenant_id)
         serializer = TenantSerializer(tenant)
 
         return Response(serializer.data)
@@ -178,10 +185,16 @@ def get_tenant_status(request, tenant_id):
 @permission_classes([IsAdminUser])
 def admin_tenants_list(request):
     """Get all tenants for admin approval"""
-    tenants = Tenant.objects.all().order_by('-created_at')
+    tenants = Tenant.objects.select_related('settings').order_by('-created_at')
     serializer = TenantSerializer(tenants, many=True)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_tenant_resolver_stats(request):
+    """Hit/miss counters for the host-to-tenant resolver in this process"""
+    return Response(tenant_resolver.stats())
+
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def admin_approve_tenant(request, tenant_id):
@@ -229,17 +242,18 @@ class MyStoreView(generics.RetrieveAPIView):
     def get_object(self):
         # Get the store/tenant for current user using owner_email
         user_email = self.request.user.email
+        tenants = Tenant.objects.select_related('settings')
         
         # Find store by owner_email (now properly set during registration)
-        store = Tenant.objects.filter(owner_email=user_email).first()
+        store = tenants.filter(owner_email=user_email).first()
         
         if not store:
             # Fallback: try by email field
-            store = Tenant.objects.filter(email=user_email).first()
+            store = tenants.filter(email=user_email).first()
         
         if not store:
             # If no store found, try to get the first tenant (for testing)
-            store = Tenant.objects.filter(is_active=True).first()
+            store = tenants.filter(is_active=True).first()
             
         if not store:
             from rest_framework.exceptions import NotFound
@@ -3,8 +3,10 @@ Django settings for ecommerce project - PRODUCTION READY
 """
 
 import os
+from decimal import Decimal
 from pathlib import Path
 from decouple import config
+from django.conf import global_settings
 import dj_database_url
 # Generate secure secret key for production
 import secrets
@@ -136,6 +138,57 @@ CLOUDINARY_STORAGE = {
 }
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Shared cache. Response-cache versions, the tenant resolver's second tier
+# and cached store settings are invalidated by whichever worker handles the
+# write, so every worker must read the same cache: set REDIS_URL in any
+# deployment with more than one process. Without it (local development)
+# each process gets its own LocMemCache.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    if not DEBUG:
+        print("⚠️  REDIS_URL is not set: caches are per process and writes only invalidate the worker that made them")
+
+# Tenant resolver cache (per-process LRU + shared cache tier)
+TENANT_CACHE_MAXSIZE = config('TENANT_CACHE_MAXSIZE', default=1024, cast=int)
+TENANT_CACHE_LOCAL_TTL = config('TENANT_CACHE_LOCAL_TTL', default=30, cast=int)
+TENANT_CACHE_SHARED_TTL = config('TENANT_CACHE_SHARED_TTL', default=300, cast=int)
+
+# Tenant-versioned response cache for anonymous storefront reads
+RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', default=300, cast=int)
+
+# Idempotency-Key responses are replayed for this long (seconds); a duplicate
+# that arrives while the first request is still running waits up to
+# IDEMPOTENCY_WAIT_TIMEOUT seconds for it
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+IDEMPOTENCY_WAIT_TIMEOUT = config('IDEMPOTENCY_WAIT_TIMEOUT', default=10, cast=float)
+
+# Shipping for stores that have not set their own rate (and for carts priced
+# without a store): a flat rate, free once the subtotal reaches the threshold
+DEFAULT_SHIPPING_RATE = config('DEFAULT_SHIPPING_RATE', default='199', cast=Decimal)
+DEFAULT_FREE_SHIPPING_THRESHOLD = config('DEFAULT_FREE_SHIPPING_THRESHOLD', default='1999', cast=Decimal)
+
+# A pending M-Pesa order keeps its reserved stock through failed or cancelled
+# payment attempts; release_expired_orders cancels it once it has seen no
+# order or payment activity for this long (seconds)
+ORDER_RESERVATION_TIMEOUT = config('ORDER_RESERVATION_TIMEOUT', default=1800, cast=int)
+
+# Tracked products at or below this stock level count as "low stock"
+LOW_STOCK_THRESHOLD = config('LOW_STOCK_THRESHOLD', default=5, cast=int)
+# Stock movements older than this many days are compacted into daily snapshots
+STOCK_LEDGER_RETENTION_DAYS = config('STOCK_LEDGER_RETENTION_DAYS', default=90, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -167,6 +220,26 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Product images: 'cloudinary' (default) or 'local' content-addressed storage.
+# Product.save() only talks to STORAGES['product_images'].
+PRODUCT_IMAGE_STORAGE = config('PRODUCT_IMAGE_STORAGE', default='cloudinary')
+LOCAL_MEDIA_ROOT = config('LOCAL_MEDIA_ROOT', default=os.path.join(MEDIA_ROOT, 'cas'))
+LOCAL_MEDIA_URL = MEDIA_URL + 'cas/'
+PRODUCT_IMAGE_STORAGES = {
+    'cloudinary': {
+        'BACKEND': 'apps.products.images.CloudinaryImageStorage',
+        'OPTIONS': {'folder': 'products/'},
+    },
+    'local': {
+        'BACKEND': 'apps.products.media.ContentAddressedStorage',
+        'OPTIONS': {'location': LOCAL_MEDIA_ROOT, 'base_url': LOCAL_MEDIA_URL},
+    },
+}
+STORAGES = {**global_settings.STORAGES, 'product_images': PRODUCT_IMAGE_STORAGES[PRODUCT_IMAGE_STORAGE]}
+# Set to an nginx internal location (e.g. '/protected-media/') aliased to
+# LOCAL_MEDIA_ROOT to hand file transfer off via X-Accel-Redirect
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -222,7 +295,7 @@ SESSION_COOKIE_SAMESITE = 'None'
 CSRF_COOKIE_SAMESITE = 'None'
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 CORS_ALLOW_CREDENTIALS = True
-CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken', 'ETag', 'Last-Modified']
 CSRF_COOKIE_HTTPONLY = False 
 CSRF_COOKIE_DOMAIN = '.render.com'
 CORS_ALLOW_HEADERS = [
@@ -233,6 +306,8 @@ CORS_ALLOW_HEADERS = [
     'origin',
     'user-agent',
     'x-requested-with',
+    'if-none-match',
+    'if-modified-since',
 ]
 
 
@@ -7,6 +7,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.http import JsonResponse
+from apps.products.views import local_media
 
 def api_root(request):
     return JsonResponse({
@@ -38,6 +39,9 @@ urlpatterns = [
     path('api/products/', include('apps.products.urls')),
     path('api/orders/', include('apps.orders.urls')),
     path('api/payments/', include('apps.payments.urls')),
+
+    # Content-addressed product images (PRODUCT_IMAGE_STORAGE = 'local')
+    path(settings.LOCAL_MEDIA_URL.lstrip('/') + '<path:name>', local_media, name='local-media'),
 ]
 
 if settings.DEBUG:
@@ -9,6 +9,8 @@ const Checkout = ({ onBack }) => {
     total, 
     subtotal, 
     shippingCost, 
+    freeShippingThreshold,
+    isPriced,
     checkout
   } = useCart();
   
@@ -43,7 +45,7 @@ const Checkout = ({ onBack }) => {
   };
 
   const handlePayment = async () => {
-    if (items.length === 0) return;
+    if (items.length === 0 || !isPriced) return;
     
     if (paymentMethod === 'mpesa' && !mpesaNumber) {
       alert('Please enter your MPesa phone number');
@@ -85,7 +87,7 @@ const Checkout = ({ onBack }) => {
             orderNumber: checkoutResult.orderNumber,
             paymentMethod: 'cash',
             message: 'Order placed successfully! You will pay on delivery.',
-            total: total
+            total: checkoutResult.totalAmount
           } 
         });
       } 
@@ -96,7 +98,7 @@ const Checkout = ({ onBack }) => {
             orderNumber: checkoutResult.orderNumber,
             paymentId: checkoutResult.paymentId,
             paymentMethod: 'mpesa',
-            amount: total,
+            amount: checkoutResult.totalAmount,
             phoneNumber: mpesaNumber
           } 
         });
@@ -106,7 +108,7 @@ const Checkout = ({ onBack }) => {
           state: { 
             orderId: checkoutResult.orderId,
             orderNumber: checkoutResult.orderNumber,
-            amount: total
+            amount: checkoutResult.totalAmount
           } 
         });
       }
@@ -312,9 +314,12 @@ const Checkout = ({ onBack }) => {
                     🚚 Delivery Information
                   </div>
                   <div>
-                    {shippingCost === 0 
-                      ? '🎉 FREE shipping applied (Order above KES 1,999)'
-                      : `Standard delivery: ${formatPrice(shippingCost)} (Free shipping on orders above KES 1,999)`
+                    {shippingCost === null
+                      ? 'Shipping is calculated once your cart is priced'
+                      : shippingCost === 0
+                      ? '🎉 FREE shipping applied'
+                      : `Standard delivery: ${formatPrice(shippingCost)}${freeShippingThreshold !== null
+                          ? ` (Free shipping on orders above ${formatPrice(freeShippingThreshold)})` : ''}`
                     }
                   </div>
                 </div>
@@ -461,7 +466,7 @@ const Checkout = ({ onBack }) => {
                   color: shippingCost > 0 ? '#2c3e50' : '#27ae60',
                   textDecoration: shippingCost === 0 ? 'line-through' : 'none'
                 }}>
-                  {shippingCost > 0 ? formatPrice(shippingCost) : 'Free'}
+                  {shippingCost === null ? 'Calculating…' : shippingCost > 0 ? formatPrice(shippingCost) : 'Free'}
                 </span>
               </div>
               
@@ -474,13 +479,13 @@ const Checkout = ({ onBack }) => {
                 borderTop: '1px solid #e9ecef'
               }}>
                 <span>Total:</span>
-                <span>{formatPrice(total)}</span>
+                <span>{total === null ? 'Calculating…' : formatPrice(total)}</span>
               </div>
             </div>
 
             <button
               onClick={handlePayment}
-              disabled={isProcessing || 
+              disabled={isProcessing || !isPriced ||
                 (paymentMethod === 'mpesa' && !mpesaNumber) || 
                 !shippingAddress.street || 
                 !shippingAddress.city || 
@@ -493,14 +498,14 @@ const Checkout = ({ onBack }) => {
                 width: '100%',
                 padding: '1rem',
                 fontSize: '1.1rem',
-                opacity: (isProcessing || 
+                opacity: (isProcessing || !isPriced ||
                   (paymentMethod === 'mpesa' && !mpesaNumber) || 
                   !shippingAddress.street || 
                   !shippingAddress.city || 
                   !shippingAddress.country ||
                   (shippingAddress.country !== 'Kenya' && paymentMethod === 'mpesa')
                 ) ? 0.7 : 1,
-                cursor: (isProcessing || 
+                cursor: (isProcessing || !isPriced ||
                   (paymentMethod === 'mpesa' && !mpesaNumber) || 
                   !shippingAddress.street || 
                   !shippingAddress.city || 
@@ -517,7 +522,8 @@ const Checkout = ({ onBack }) => {
                   </span>
                 </>
               ) : (
-                paymentMethod === 'cash' ? `Place Order` : `Pay ${formatPrice(total)}`
+                !isPriced ? 'Calculating total…'
+                  : paymentMethod === 'cash' ? `Place Order` : `Pay ${formatPrice(total)}`
               )}
             </button>
 
@@ -527,7 +533,9 @@ const Checkout = ({ onBack }) => {
               fontSize: '0.9rem',
               color: '#7f8c8d',
             }}>
-              {shippingCost === 0 ? '🎉 Free shipping applied!' : 'Standard delivery within 2-3 days'}
+              {shippingCost === null
+                ? 'Shipping is calculated at checkout'
+                : shippingCost === 0 ? '🎉 Free shipping applied!' : 'Standard delivery within 2-3 days'}
             </div>
           </div>
         </div>
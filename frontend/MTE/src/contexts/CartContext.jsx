@@ -1,18 +1,14 @@
-import React, { createContext, useContext, useReducer } from 'react';
+import React, { createContext, useContext, useEffect, useReducer, useState } from 'react';
 import { paymentService } from '../services/paymentService';
 import api from '../services/api';
 
-// Simplified shipping calculation like Kilimall
-const calculateShippingCost = (items, subtotal) => {
-  if (!items || items.length === 0) return 0;
-  
-  // Free shipping for orders above 1999 KES
-  if (subtotal >= 1999) {
-    return 0;
-  }
-  
-  // Standard delivery fee for orders below 1999 KES
-  return 199; // Standard Kilimall-like fee
+// The server prices the cart (products' current prices and the store's
+// shipping rules); the same pricing is applied when the order is placed
+const quoteCart = async (items) => {
+  const response = await api.post('/api/orders/orders/quote/', {
+    items: items.map(item => ({ product: item.product.id, quantity: item.quantity })),
+  });
+  return response.data;
 };
 
 // Create cart item
@@ -127,18 +123,28 @@ const cartReducer = (state, action) => {
   }
 };
 
-// Calculate cart totals including shipping
-const calculateTotals = (items) => {
+// Cart totals; shipping and the total come from the server quote. Until it
+// arrives (or if it failed) they are null: not yet known, never guessed
+const calculateTotals = (items, quote = null) => {
   const itemCount = items.reduce((total, item) => total + item.quantity, 0);
+  if (quote) {
+    return {
+      itemCount,
+      subtotal: parseFloat(quote.subtotal),
+      shippingCost: parseFloat(quote.shipping_cost),
+      freeShippingThreshold: quote.free_shipping_threshold === null ? null : parseFloat(quote.free_shipping_threshold),
+      total: parseFloat(quote.total_amount),
+      isPriced: true,
+    };
+  }
   const subtotal = items.reduce((total, item) => total + item.total, 0);
-  const shippingCost = calculateShippingCost(items, subtotal);
-  const total = subtotal + shippingCost;
-  
-  return { 
-    itemCount, 
+  return {
+    itemCount,
     subtotal,
-    shippingCost,
-    total 
+    shippingCost: null,
+    freeShippingThreshold: null,
+    total: null,
+    isPriced: false,
   };
 };
 
@@ -155,11 +161,24 @@ const CartContext = createContext();
 // Cart Provider
 export const CartProvider = ({ children }) => {
   const [state, dispatch] = useReducer(cartReducer, initialState);
+  const [quote, setQuote] = useState(null);
+
+  // Re-price on the server whenever the cart changes
+  useEffect(() => {
+    setQuote(null);
+    if (state.items.length === 0) return undefined;
+
+    let current = true;
+    quoteCart(state.items)
+      .then(data => { if (current) setQuote(data); })
+      .catch(error => console.error('❌ Could not price cart:', error));
+    return () => { current = false; };
+  }, [state.items]);
 
   // Calculate totals based on current state
   const cartState = {
     ...state,
-    ...calculateTotals(state.items),
+    ...calculateTotals(state.items, quote),
   };
 
   // Cart actions
@@ -264,19 +283,13 @@ const checkout = async (paymentData) => {
       console.log('❌ orders endpoint options failed:', optionsError.response?.data);
     }
 
-    // Prepare order data for backend
+    // Prepare order data for backend; the server prices the order itself,
+    // so only products and quantities are sent
     const orderData = {
       items: state.items.map(item => ({
         product: item.product.id,
-        product_name: item.product.name,
         quantity: item.quantity,
-        price: item.price,
-        total: item.total,
-        vendor: item.vendorId,
       })),
-      subtotal: cartState.subtotal,
-      shipping_cost: cartState.shippingCost,
-      total_amount: cartState.total,
       payment_method: paymentData.paymentMethod,
       customer_name: "Customer Name",
       customer_email: paymentData.email,
@@ -308,6 +321,7 @@ const checkout = async (paymentData) => {
         message: 'Order placed successfully! You will pay on delivery.',
         orderId: order.id,
         orderNumber: order.order_number,
+        totalAmount: order.total_amount,
         paymentMethod: 'cash'
       };
     } 
@@ -326,6 +340,7 @@ const checkout = async (paymentData) => {
         message: 'MPesa payment initiated. Check your phone to complete payment.',
         orderId: order.id,
         orderNumber: order.order_number,
+        totalAmount: order.total_amount,
         paymentId: paymentResponse.data.payment_id,
         paymentMethod: 'mpesa',
         requiresPayment: true
@@ -337,6 +352,7 @@ const checkout = async (paymentData) => {
         message: 'Proceed with card payment',
         orderId: order.id,
         orderNumber: order.order_number,
+        totalAmount: order.total_amount,
         paymentMethod: 'card',
         requiresPayment: true
       };
@@ -9,6 +9,7 @@ const Cart = () => {
     items, 
     subtotal,
     shippingCost,
+    freeShippingThreshold,
     total, 
     itemCount, 
     updateQuantity, 
@@ -247,7 +248,7 @@ const Cart = () => {
             </h2>
 
             {/* Free Shipping Notice */}
-            {subtotal < 1999 && (
+            {freeShippingThreshold !== null && subtotal < freeShippingThreshold && (
               <div style={{
                 padding: '1rem',
                 background: '#e8f5e8',
@@ -260,12 +261,12 @@ const Cart = () => {
                   🚚 Free Shipping Available!
                 </div>
                 <div style={{ fontSize: '0.9rem', color: '#388e3c' }}>
-                  Add {formatPrice(1999 - subtotal)} more to get free shipping
+                  Add {formatPrice(freeShippingThreshold - subtotal)} more to get free shipping
                 </div>
               </div>
             )}
 
-            {subtotal >= 1999 && (
+            {freeShippingThreshold !== null && subtotal >= freeShippingThreshold && (
               <div style={{
                 padding: '1rem',
                 background: '#4caf50',
@@ -292,7 +293,7 @@ const Cart = () => {
                   color: shippingCost > 0 ? '#2c3e50' : '#27ae60',
                   textDecoration: shippingCost === 0 ? 'line-through' : 'none'
                 }}>
-                  {shippingCost > 0 ? formatPrice(shippingCost) : 'Free'}
+                  {shippingCost === null ? 'Calculated at checkout' : shippingCost > 0 ? formatPrice(shippingCost) : 'Free'}
                 </span>
               </div>
               
@@ -306,7 +307,7 @@ const Cart = () => {
               }}>
                 <span style={{ color: '#2c3e50', fontWeight: 700 }}>Total:</span>
                 <span style={{ fontWeight: 700, color: '#2c3e50', fontSize: '1.4rem' }}>
-                  {formatPrice(total)}
+                  {total === null ? 'Calculating…' : formatPrice(total)}
                 </span>
               </div>
             </div>
@@ -330,7 +331,7 @@ const Cart = () => {
                   <span style={{ marginLeft: '0.5rem' }}>Processing...</span>
                 </>
               ) : (
-                `Proceed to checkout - ${formatPrice(total)}`
+                total === null ? 'Proceed to checkout' : `Proceed to checkout - ${formatPrice(total)}`
               )}
             </button>
 
@@ -340,7 +341,9 @@ const Cart = () => {
               fontSize: '0.9rem',
               color: '#7f8c8d',
             }}>
-              {shippingCost === 0 ? '🎉 Free shipping applied!' : 'Standard delivery within 2-3 days'}
+              {shippingCost === null
+                ? 'Shipping is calculated at checkout'
+                : shippingCost === 0 ? '🎉 Free shipping applied!' : 'Standard delivery within 2-3 days'}
             </div>
 
             <div style={{ 